@@ -1,7 +1,16 @@
 import os
+import time
+
+_import_started = time.perf_counter()
+
 from flask import Flask, request, jsonify
 from flask_jwt_extended import JWTManager
-from app.database import init_db_pool
+from app.cli import register_cli
+from app.startup import init_startup
+from app.utils.admission import init_admission_control
+from app.utils.tracing import init_tracing
+from app.utils.profiling import init_profiling
+from app.utils.encoding import init_response_compression
 from flask_cors import CORS
 
 from app.routes.document_routes import document_api_bp
@@ -10,18 +19,33 @@ from app.routes.admin_routes import admin_bp
 
 app = Flask(__name__)
 
-CORS(app)
+# Let the browser dashboard read the list validators, upload offsets and download names
+CORS(app, expose_headers=['ETag', 'Upload-Offset', 'Upload-Length', 'Content-Disposition'])
 
 app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY")
 app.config["JWT_ALGORITHM"] = os.getenv("JWT_ALGORITHM", "HS256")
 jwt = JWTManager(app)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # Max file size = 16MB
 
-with app.app_context():
-    init_db_pool(pool_size=10)
-
 # Register the blueprints
 app.register_blueprint(document_api_bp, url_prefix='/api')
 app.register_blueprint(auth_bp, url_prefix='/auth')
 app.register_blueprint(admin_bp, url_prefix='/admin')
 
+register_cli(app)
+
+# Sampled request tracing; installed first so admission queueing is part of the trace
+init_tracing(app)
+
+# Per-lane concurrency limits with queueing and 503 load shedding
+init_admission_control(app)
+
+# On-demand per-request profiles (X-Profile header); installs nothing unless PROFILING_ENABLED
+init_profiling(app)
+
+# gzip/br for JSON responses above RESPONSE_COMPRESSION_MIN_BYTES
+init_response_compression(app)
+
+# /healthz and /readyz; the pool, plan check, warmup and background workers start off the
+# import path so a slow or unreachable database does not block or crash the boot
+init_startup(app, _import_started)
@@ -0,0 +1,319 @@
+import json
+import click
+from datetime import datetime, timedelta
+from flask.cli import AppGroup
+from app.database import shard_names
+from app.schema import apply_migrations, verify_query_plans, benchmark_hot_queries
+from app.services.upload_session_services import cleanup_expired_upload_sessions
+from app.services.storage_services import reshard_local_documents
+from app.services.preview_services import requeue_pending_previews
+from app.services.compression_services import recompress_documents
+from app.services.document_services import UPLOAD_JOURNAL, apply_upload_journal
+from app.services.stats_services import rebuild_document_stats
+from app.services.integrity_services import verify_document_integrity, INTEGRITY_MAX_BYTES_PER_SECOND
+from app.utils.encoding import benchmark_encodings, benchmark_endpoint
+from app.services.shard_services import move_application, abort_move, cleanup_env, list_shard_map, init_shard_ids
+from app.services.archive_services import (
+    archive_deleted_documents, restore_archived_documents,
+    ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE, ARCHIVE_MAX_ROWS_PER_SECOND, ARCHIVE_MAX_REPLICA_LAG_SECONDS
+)
+
+db_cli = AppGroup('db', help='Schema migrations and query plan checks.')
+uploads_cli = AppGroup('uploads', help='Resumable upload and upload journal maintenance.')
+storage_cli = AppGroup('storage', help='Document storage maintenance.')
+stats_cli = AppGroup('stats', help='Precomputed document statistics.')
+archive_cli = AppGroup('archive', help='Archival of soft-deleted documents.')
+shards_cli = AppGroup('shards', help='Database shards of the per-application tables.')
+responses_cli = AppGroup('responses', help='List response formats and compression.')
+
+shard_option = click.option('--shard', 'shard', default=None, help='Only this database shard (default: every shard).')
+
+
+def selected_shards(shard):
+    if shard is None:
+        return shard_names()
+    if shard not in shard_names():
+        raise click.BadParameter(f"unknown shard; configured: {', '.join(shard_names())}", param_hint='--shard')
+    return [shard]
+
+
+@db_cli.command('upgrade')
+def db_upgrade():
+    """Apply pending schema migrations to the primary and every shard."""
+    for shard in shard_names():
+        applied = apply_migrations(shard=shard)
+        click.echo(f"[{shard}] " + (f"Applied {len(applied)} migration(s): {', '.join(applied)}" if applied else "Schema is up to date."))
+
+
+@db_cli.command('verify-plans')
+@click.option('--strict', is_flag=True, help='Exit with an error if any hot query does a full scan.')
+def db_verify_plans(strict):
+    """EXPLAIN every registered hot query and report full scans."""
+    problems = verify_query_plans(mode='warn')
+    if problems:
+        click.echo(f"{len(problems)} hot query plan(s) need an index.")
+        if strict:
+            raise SystemExit(1)
+    else:
+        click.echo("All hot queries use an index.")
+
+
+@db_cli.command('bench-statements')
+@click.option('--iterations', default=1000, show_default=True, help='Executions per query and mode.')
+def db_bench_statements(iterations):
+    """Compare text and prepared execution of every hot query."""
+    def fmt(value):
+        return "n/a" if value is None else f"{value:.1f}"
+    click.echo(f"{'query':<28} {'mode':<9} {'wall us':>9} {'client cpu us':>14} {'server us':>10} {'server cpu us':>14} {'wall vs text':>13}")
+    text_wall = {}
+    for row in benchmark_hot_queries(iterations=iterations):
+        if row['mode'] == "text":
+            text_wall[row['query']] = row['wall_us']
+            change = ""
+        else:
+            change = f"{(row['wall_us'] / text_wall[row['query']] - 1) * 100:+.1f}%" if text_wall.get(row['query']) else "n/a"
+        click.echo(f"{row['query']:<28} {row['mode']:<9} {fmt(row['wall_us']):>9} {fmt(row['client_cpu_us']):>14} "
+                   f"{fmt(row['server_us']):>10} {fmt(row['server_cpu_us']):>14} {change:>13}")
+
+
+@uploads_cli.command('cleanup-sessions')
+def uploads_cleanup_sessions():
+    """Remove expired resumable upload sessions from the staging folder."""
+    click.echo(f"Removed {cleanup_expired_upload_sessions()} expired session(s).")
+
+
+@uploads_cli.command('apply-journal')
+def uploads_apply_journal():
+    """Insert every journaled upload into ds_document now."""
+    if UPLOAD_JOURNAL is None:
+        click.echo("Upload journal is disabled (UPLOAD_JOURNAL_MODE=off).")
+        return
+    if not UPLOAD_JOURNAL.try_acquire_applier():
+        click.echo("Another process is applying the journal.")
+        raise SystemExit(1)
+    consumed = 0
+    while True:
+        batch = apply_upload_journal()
+        if not batch:
+            break
+        consumed += batch
+    UPLOAD_JOURNAL.compact()
+    click.echo(f"Applied {consumed} journal record(s).")
+
+
+@storage_cli.command('reshard')
+@click.option('--workers', default=8, show_default=True, help='Parallel file moves.')
+@click.option('--batch-size', default=500, show_default=True, help='Documents per database batch.')
+@click.option('--dry-run', is_flag=True, help='Report what would move without changing anything.')
+@shard_option
+def storage_reshard(workers, batch_size, dry_run, shard):
+    """Move local documents into the configured shard layout."""
+    for name in selected_shards(shard):
+        stats = reshard_local_documents(workers=workers, batch_size=batch_size, dry_run=dry_run, shard=name)
+        click.echo(f"[{name}] {'Would move' if dry_run else 'Moved'} {stats['moved']} document(s); "
+                   f"{stats['unchanged']} already in place, {stats['missing']} missing, "
+                   f"{stats['skipped']} changed meanwhile, {stats['failed']} failed.")
+
+
+@storage_cli.command('requeue-previews')
+@click.option('--limit', default=1000, show_default=True, help='Maximum documents to queue.')
+def storage_requeue_previews(limit):
+    """Queue thumbnail/preview generation for documents still marked pending."""
+    queued = requeue_pending_previews(limit=limit)
+    click.echo(f"Queued {queued} document(s).")
+
+
+@storage_cli.command('recompress')
+@click.option('--workers', default=4, show_default=True, help='Parallel compression workers.')
+@click.option('--batch-size', default=200, show_default=True, help='Documents per database batch.')
+@click.option('--dry-run', is_flag=True, help='Count candidates without changing anything.')
+@shard_option
+def storage_recompress(workers, batch_size, dry_run, shard):
+    """Compress existing local documents whose type now has a compression policy."""
+    for name in selected_shards(shard):
+        stats = recompress_documents(workers=workers, batch_size=batch_size, dry_run=dry_run, shard=name)
+        click.echo(f"[{name}] {'Would compress' if dry_run else 'Compressed'} {stats['compressed']} document(s); "
+                   f"{stats['kept']} kept raw, {stats['skipped']} changed meanwhile, {stats['failed']} failed.")
+
+
+@storage_cli.command('verify')
+@click.option('--workers', default=4, show_default=True, help='Parallel storage reads.')
+@click.option('--batch-size', default=500, show_default=True, help='Documents per database batch.')
+@click.option('--max-bytes-per-second', default=INTEGRITY_MAX_BYTES_PER_SECOND, show_default=True,
+              help='Read bandwidth across all workers; 0 for unlimited.')
+@click.option('--hashes/--no-hashes', default=True, show_default=True, help='Read contents and check hashes.')
+@click.option('--resume/--restart', default=True, show_default=True, help='Continue the last unfinished run.')
+@click.option('--report', 'report_path', default=None, help='Also append issues to this JSON-lines file.')
+@click.option('--pause', default=0.0, show_default=True, help='Seconds to sleep between batches.')
+@shard_option
+def storage_verify(workers, batch_size, max_bytes_per_second, hashes, resume, report_path, pause, shard):
+    """Check that every document's file exists and matches its size and hash."""
+    for name in selected_shards(shard):
+        def progress(run):
+            click.echo(f"[{name}] Run {run['id']}: verified up to document id {run['last_id']} of {run['max_id']}; "
+                       f"{run['checked']} checked, {run['checked'] - run['ok']} issue(s).")
+        run = verify_document_integrity(workers=workers, batch_size=batch_size, max_bytes_per_second=max_bytes_per_second,
+                                        verify_hashes=hashes, resume=resume, report_path=report_path,
+                                        pause_seconds=pause, progress=progress, shard=name)
+        click.echo(f"[{name}] Run {run['id']} completed: {run['ok']} ok, {run['missing']} missing, {run['size_mismatch']} size "
+                   f"mismatch(es), {run['hash_mismatch']} hash mismatch(es), {run['unreadable']} unreadable; "
+                   f"{run['hashes_recorded']} hash(es) recorded.")
+
+
+@stats_cli.command('rebuild')
+@click.option('--pause', default=0.0, show_default=True, help='Seconds to sleep between transactions.')
+def stats_rebuild(pause):
+    """Recompute the document stats tables from ds_document."""
+    result = rebuild_document_stats(pause_seconds=pause)
+    click.echo(f"Rebuilt {result['scopes']} module/env scope(s) and {result['windows']} daily window(s).")
+
+
+@archive_cli.command('run')
+@click.option('--older-than-days', default=ARCHIVE_AFTER_DAYS, show_default=True, help='Minimum age of the deletion.')
+@click.option('--batch-size', default=ARCHIVE_BATCH_SIZE, show_default=True, help='Rows moved per transaction.')
+@click.option('--max-rows-per-second', default=ARCHIVE_MAX_ROWS_PER_SECOND, show_default=True, help='0 for unlimited.')
+@click.option('--max-replica-lag', default=ARCHIVE_MAX_REPLICA_LAG_SECONDS, show_default=True,
+              help='Pause while a replica is further behind than this many seconds.')
+@click.option('--limit', default=None, type=int, help='Stop after about this many rows per shard.')
+@shard_option
+def archive_run(older_than_days, batch_size, max_rows_per_second, max_replica_lag, limit, shard):
+    """Move old soft-deleted documents into ds_document_archive."""
+    busy = False
+    for name in selected_shards(shard):
+        archived = archive_deleted_documents(older_than_days=older_than_days, batch_size=batch_size,
+                                             max_rows_per_second=max_rows_per_second,
+                                             max_replica_lag_seconds=max_replica_lag, max_rows=limit, shard=name)
+        if archived is None:
+            click.echo(f"[{name}] Another process is archiving.")
+            busy = True
+            continue
+        click.echo(f"[{name}] Archived {archived} document(s).")
+    if busy:
+        raise SystemExit(1)
+
+
+@archive_cli.command('restore')
+@click.argument('ids', nargs=-1, type=int, required=True)
+def archive_restore(ids):
+    """Move archived documents back into ds_document."""
+    response, status_code = restore_archived_documents(list(ids))
+    if status_code != 200:
+        click.echo(response['error'])
+        raise SystemExit(1)
+    click.echo(f"Restored {len(response['restored'])} document(s); not archived: {response['notFound'] or 'none'}.")
+
+
+@shards_cli.command('list')
+def shards_list():
+    """Show the configured shards and the applications mapped to them."""
+    click.echo(f"Shards: {', '.join(shard_names())}")
+    entries = list_shard_map()
+    if not entries:
+        click.echo("No applications are mapped; all are on the default shard.")
+    for entry in entries:
+        moving = f" -> {entry['target']}" if entry['target'] else ""
+        click.echo(f"{entry['env_id']:>8}  {entry['shard']}{moving}  ({entry['state']})")
+
+
+@shards_cli.command('init')
+def shards_init():
+    """Move every shard's id counters above the highest existing id."""
+    next_ids = init_shard_ids()
+    if not next_ids:
+        click.echo("DB_SHARDS is not set.")
+        return
+    for table, next_id in next_ids.items():
+        click.echo(f"{table}: ids continue from {next_id}.")
+
+
+@shards_cli.command('move')
+@click.argument('env_id', type=int)
+@click.argument('target')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows compared and copied per range.')
+@click.option('--pause', default=0.0, show_default=True, help='Seconds to sleep between ranges.')
+@click.option('--max-passes', default=3, show_default=True, help='Copy passes before writes are frozen.')
+def shards_move(env_id, target, batch_size, pause, max_passes):
+    """Move an application's rows to another shard while it stays online."""
+    def progress(stage, copied):
+        click.echo(f"{stage}: copied {copied} row(s).")
+    try:
+        result = move_application(env_id, target, batch_size=batch_size, pause_seconds=pause,
+                                  max_passes=max_passes, progress=progress)
+    except (ValueError, RuntimeError) as e:
+        click.echo(str(e))
+        raise SystemExit(1)
+    if result is None:
+        click.echo(f"Another process is moving application {env_id}.")
+        raise SystemExit(1)
+    click.echo(f"Application {env_id} is on '{result['target']}' (was '{result['source']}'); {result['copied']} row(s) copied.")
+
+
+@shards_cli.command('abort')
+@click.argument('env_id', type=int)
+def shards_abort(env_id):
+    """Return an application to its current shard after an interrupted move."""
+    if abort_move(env_id):
+        click.echo(f"Move of application {env_id} aborted; run `flask shards cleanup {env_id}` to remove partial copies.")
+    else:
+        click.echo(f"Application {env_id} was not being moved.")
+
+
+@shards_cli.command('cleanup')
+@click.argument('env_id', type=int)
+@click.option('--batch-size', default=1000, show_default=True, help='Rows deleted per statement.')
+def shards_cleanup(env_id, batch_size):
+    """Delete an application's rows from the shards that do not own it."""
+    try:
+        deleted = cleanup_env(env_id, batch_size=batch_size)
+    except RuntimeError as e:
+        click.echo(str(e))
+        raise SystemExit(1)
+    click.echo(f"Deleted {deleted} row(s).")
+
+
+def sample_document_rows(count):
+    # Shaped like an admin documents list page
+    created = datetime(2024, 5, 1, 9, 30)
+    return [{
+        'id': 100000 + n,
+        'env_id': 3 + n % 4,
+        'type': ('invoice', 'photo', 'contract', 'id_proof')[n % 4],
+        'parent_id': None,
+        'ref_id': f'REF-{20240000 + n // 3}',
+        'module_id': ('claims', 'onboarding')[n % 2],
+        'status': 'active',
+        'createdAt': (created + timedelta(minutes=7 * n)).isoformat(),
+        'updatedAt': (created + timedelta(minutes=7 * n + 2)).isoformat(),
+        'archived': 0
+    } for n in range(count)]
+
+
+@responses_cli.command('bench')
+@click.option('--rows', default=100, show_default=True, help='Rows per page for the offline comparison.')
+@click.option('--iterations', default=200, show_default=True, help='Repetitions per format and encoding.')
+@click.option('--url', default=None, help='List endpoint of a running server to measure end to end instead.')
+@click.option('--token', default=None, help='Bearer token for --url.')
+@click.option('--body', default=None, help='JSON body to POST to --url; GET when omitted.')
+def responses_bench(rows, iterations, url, token, body):
+    """Compare payload size and latency of the list formats and encodings."""
+    if url:
+        if not token:
+            raise click.BadParameter('required with --url', param_hint='--token')
+        results = benchmark_endpoint(url, token, json.loads(body) if body else None, iterations=iterations)
+        click.echo(f"{'format':<7} {'encoding':<9} {'bytes':>9} {'mean ms':>9} {'p95 ms':>9}")
+        for row in results:
+            click.echo(f"{row['format']:<7} {row['encoding']:<9} {row['bytes']:>9} {row['mean_ms']:>9.2f} {row['p95_ms']:>9.2f}")
+        return
+    click.echo(f"{'format':<7} {'encoding':<9} {'bytes':>9} {'encode us':>10}")
+    for row in benchmark_encodings(sample_document_rows(rows), iterations=iterations):
+        click.echo(f"{row['format']:<7} {row['encoding']:<9} {row['bytes']:>9} {row['encode_us']:>10.1f}")
+
+
+def register_cli(app):
+    app.cli.add_command(db_cli)
+    app.cli.add_command(uploads_cli)
+    app.cli.add_command(storage_cli)
+    app.cli.add_command(stats_cli)
+    app.cli.add_command(archive_cli)
+    app.cli.add_command(shards_cli)
+    app.cli.add_command(responses_cli)
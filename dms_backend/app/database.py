@@ -1,38 +1,100 @@
 import mysql.connector
 from mysql.connector import Error
 from mysql.connector import pooling
+from mysql.connector.errors import PoolError
 import os # Import the os module to access environment variables
-from dotenv import load_dotenv
+import threading
+import time
+import weakref
+from collections import OrderedDict, namedtuple
+from app.utils.tracing import span
+from app.utils import metrics
 
-load_dotenv()  # Load environment variables from .env file
+# Environment variables (.env) are loaded by main.py or the flask CLI before the app is imported.
+# Connections in the primary pool (and in each replica pool)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+# After a failed attempt to create the primary pool, the next checkout retries after this long.
+DB_POOL_RETRY_SECONDS = float(os.getenv('DB_POOL_RETRY_SECONDS', '5'))
 
-# Database connection details are now read from environment variables
-DB_CONFIG = {
-    'host': os.getenv('DB_HOST'),
-    'database': os.getenv('DB_NAME'), 
-    'user': os.getenv('DB_USER'), 
-    'password': os.getenv('DB_PASSWORD')
-}
+# Read replicas share the primary's database and credentials.
+# DB_REPLICA_HOSTS is a comma separated list of host or host:port entries.
+DB_REPLICA_HOSTS = [h.strip() for h in os.getenv('DB_REPLICA_HOSTS', '').split(',') if h.strip()]
+# Reads for a user who wrote within this many seconds go to the primary (read-your-writes).
+DB_REPLICA_STICKY_SECONDS = float(os.getenv('DB_REPLICA_STICKY_SECONDS', '5'))
+# How long a failing replica is skipped before it is tried again.
+DB_REPLICA_RETRY_SECONDS = float(os.getenv('DB_REPLICA_RETRY_SECONDS', '30'))
 
-# You can also add a check to ensure critical variables are set
-if not all([DB_CONFIG['host'], DB_CONFIG['database'], DB_CONFIG['user']]):
-    raise ValueError("Missing one or more critical database environment variables (DB_HOST, DB_NAME, DB_USER)")
+# Reuse server-side prepared statements per pooled connection ('on' or 'off').
+# Pools then skip the session reset on return (it would drop the statements) and
+# close_db_connection rolls back instead.
+DB_PREPARED_STATEMENTS = os.getenv('DB_PREPARED_STATEMENTS', 'on').lower() == 'on'
+# Statement shapes kept per connection; the least recently used is closed beyond this.
+DB_PREPARED_STATEMENT_CACHE_SIZE = int(os.getenv('DB_PREPARED_STATEMENT_CACHE_SIZE', '64'))
 
-# Global variable for the connection pool
+# Shards for the per-application tables (see app/sharding.py). The primary is always the
+# 'default' shard. DB_SHARDS is a comma separated list of name=host[:port]/database entries
+# that share the primary's credentials. Only append to it: an entry's position fixes the
+# auto-increment offset of ids created on that shard.
+DEFAULT_SHARD = 'default'
+DB_SHARDS = [s.strip() for s in os.getenv('DB_SHARDS', '').split(',') if s.strip()]
+# Ids are interleaved across shards (id % stride identifies the shard that created it), so
+# rows keep their ids when an application moves. The number of shards is limited to this.
+DB_SHARD_ID_STRIDE = int(os.getenv('DB_SHARD_ID_STRIDE', '8'))
+
+# Global variable for the connection pool, created on first use (see _ensure_primary_pool)
 db_connection_pool = None
+_pool_lock = threading.RLock()
+_pool_retry_at = 0.0
+db_pool_error = None
+
+# One entry per replica: {'name', 'config', 'pool', 'pool_size', 'down_until'}
+db_replica_pools = []
+_replica_lock = threading.Lock()
+_replica_cursor = 0
+
+# sticky_key -> monotonic time of that key's last write on the primary
+_recent_writes = {}
+
+# One entry per extra shard: {'name', 'config', 'pool', 'pool_size', 'offset', 'down_until'}
+db_shard_pools = {}
+# physical connection -> connection_id the id interleaving was set for
+_interleaved_connections = weakref.WeakKeyDictionary()
+
+def get_db_config():
+    """
+    Reads the connection details from the environment.
 
-def init_db_pool(pool_name='my_app_pool', pool_size=5):
+    Raises:
+        ValueError: If DB_HOST, DB_NAME or DB_USER is missing.
     """
-    Initializes the database connection pool.
-    This should be called once when the application starts.
+    config = {
+        'host': os.getenv('DB_HOST'),
+        'database': os.getenv('DB_NAME'),
+        'user': os.getenv('DB_USER'),
+        'password': os.getenv('DB_PASSWORD')
+    }
+    if not all([config['host'], config['database'], config['user']]):
+        raise ValueError("Missing one or more critical database environment variables (DB_HOST, DB_NAME, DB_USER)")
+    return config
+
+def init_db_pool(pool_name='my_app_pool', pool_size=DB_POOL_SIZE):
+    """
+    Initializes the database connection pool. Called on the first checkout (or by the
+    startup warmup); raises if the pool cannot be created.
     """
+    with _pool_lock:
+        _init_db_pools(pool_name, pool_size)
+
+def _init_db_pools(pool_name, pool_size):
     global db_connection_pool
+    db_config = get_db_config()
     if db_connection_pool is None:
         try:
             db_connection_pool = pooling.MySQLConnectionPool(
                 pool_name=pool_name,
                 pool_size=pool_size, # Number of connections in the pool
-                **DB_CONFIG
+                pool_reset_session=not DB_PREPARED_STATEMENTS,
+                **db_config
             )
             print(f"Database connection pool '{pool_name}' initialized with size {pool_size}.")
         except Error as e:
@@ -40,17 +102,233 @@ def init_db_pool(pool_name='my_app_pool', pool_size=5):
             db_connection_pool = None # Ensure pool is None if initialization fails
             raise # Re-raise the exception to indicate a critical startup failure
 
+    if not db_replica_pools:
+        for index, host in enumerate(DB_REPLICA_HOSTS):
+            replica_host, _, replica_port = host.partition(':')
+            config = dict(db_config, host=replica_host)
+            if replica_port:
+                config['port'] = int(replica_port)
+            replica = {
+                'name': f"{pool_name}_replica{index}",
+                'config': config,
+                'pool': None,
+                'pool_size': pool_size,
+                'down_until': 0.0
+            }
+            # A replica that is down at boot must not stop the app; it is retried on first use.
+            _open_replica_pool(replica)
+            db_replica_pools.append(replica)
+
+    if DB_SHARDS and not db_shard_pools:
+        if len(DB_SHARDS) >= DB_SHARD_ID_STRIDE:
+            raise ValueError(f"DB_SHARDS lists {len(DB_SHARDS)} shards; DB_SHARD_ID_STRIDE allows {DB_SHARD_ID_STRIDE - 1}.")
+        for index, entry in enumerate(DB_SHARDS):
+            name, _, location = entry.partition('=')
+            address, _, database = location.partition('/')
+            shard_host, _, shard_port = address.partition(':')
+            if not name or not shard_host or not database or name == DEFAULT_SHARD:
+                raise ValueError(f"Invalid DB_SHARDS entry '{entry}'; expected name=host[:port]/database.")
+            config = dict(db_config, host=shard_host, database=database)
+            if shard_port:
+                config['port'] = int(shard_port)
+            shard = {
+                'name': name,
+                'config': config,
+                'pool': None,
+                'pool_size': pool_size,
+                'offset': index + 2,  # The default shard has offset 1
+                'down_until': 0.0
+            }
+            # Like replicas, a shard that is down at boot is retried on first use
+            _open_shard_pool(shard)
+            db_shard_pools[name] = shard
+
+
+def _ensure_primary_pool():
+    """
+    Creates the primary pool on first use. A failure is remembered in db_pool_error and not
+    retried for DB_POOL_RETRY_SECONDS, so a database outage does not stall every request.
+    """
+    global _pool_retry_at, db_pool_error
+    if db_connection_pool is not None:
+        return db_connection_pool
+    with _pool_lock:
+        if db_connection_pool is None and time.monotonic() >= _pool_retry_at:
+            try:
+                init_db_pool()
+                db_pool_error = None
+            except (Error, ValueError) as e:
+                db_pool_error = str(e)
+                _pool_retry_at = time.monotonic() + DB_POOL_RETRY_SECONDS
+    return db_connection_pool
+
+def _open_replica_pool(replica):
+    """
+    Creates the pool for a replica entry, marking the replica down on failure.
+    """
+    try:
+        replica['pool'] = pooling.MySQLConnectionPool(
+            pool_name=replica['name'],
+            pool_size=replica['pool_size'],
+            pool_reset_session=not DB_PREPARED_STATEMENTS,
+            **replica['config']
+        )
+        print(f"Replica connection pool '{replica['name']}' initialized for {replica['config']['host']}.")
+    except Error as e:
+        print(f"WARNING: Replica '{replica['name']}' unavailable, reads fall back to primary: {e}")
+        replica['down_until'] = time.monotonic() + DB_REPLICA_RETRY_SECONDS
+    return replica['pool']
+
+
+def _open_shard_pool(shard):
+    """
+    Creates the pool for a shard entry, marking the shard down on failure.
+    """
+    try:
+        shard['pool'] = pooling.MySQLConnectionPool(
+            pool_name=f"shard_{shard['name']}",
+            pool_size=shard['pool_size'],
+            pool_reset_session=not DB_PREPARED_STATEMENTS,
+            **shard['config']
+        )
+        print(f"Shard connection pool '{shard['name']}' initialized for {shard['config']['host']}/{shard['config']['database']}.")
+    except Error as e:
+        print(f"WARNING: Shard '{shard['name']}' unavailable, retrying in {DB_REPLICA_RETRY_SECONDS}s: {e}")
+        shard['down_until'] = time.monotonic() + DB_REPLICA_RETRY_SECONDS
+    return shard['pool']
+
+
+def shard_names():
+    """
+    Returns the names of all shards, the default shard first.
+    """
+    return [DEFAULT_SHARD] + [entry.partition('=')[0].strip() for entry in DB_SHARDS]
+
+
+def _interleave_ids(conn, offset):
+    """
+    Makes auto-increment ids created on conn follow offset + k * DB_SHARD_ID_STRIDE. The
+    setting lasts for the session, so it is made once per physical connection unless pools
+    reset sessions on return.
+    """
+    physical = getattr(conn, '_cnx', conn)
+    connection_id = getattr(physical, 'connection_id', None)
+    if DB_PREPARED_STATEMENTS and _interleaved_connections.get(physical) == connection_id:
+        return
+    cursor = physical.cursor()
+    try:
+        cursor.execute("SET SESSION auto_increment_increment = %s, auto_increment_offset = %s",
+                       (DB_SHARD_ID_STRIDE, offset))
+    finally:
+        cursor.close()
+    _interleaved_connections[physical] = connection_id
+
+
+def _get_shard_connection(name):
+    shard = db_shard_pools.get(name)
+    if shard is None:
+        print(f"ERROR: Unknown shard '{name}'.")
+        return None
+    if shard['down_until'] > time.monotonic():
+        return None
+    if shard['pool'] is None and _open_shard_pool(shard) is None:
+        return None
+    try:
+        conn = shard['pool'].get_connection()
+        if conn.is_connected():
+            _interleave_ids(conn, shard['offset'])
+            return conn
+    except Error as e:
+        print(f"Error getting connection from shard '{name}': {e}")
+    return None
+
+
+def mark_primary_write(sticky_key):
+    """
+    Records that sticky_key (usually a user id) just wrote to the primary, so its reads
+    stay on the primary until replicas have had time to catch up.
+    """
+    if sticky_key is None or not db_replica_pools:
+        return
+    now = time.monotonic()
+    with _replica_lock:
+        _recent_writes[sticky_key] = now
+        if len(_recent_writes) > 10000:
+            cutoff = now - DB_REPLICA_STICKY_SECONDS
+            for key in [k for k, t in _recent_writes.items() if t < cutoff]:
+                del _recent_writes[key]
+
+
+def _is_sticky(sticky_key):
+    if sticky_key is None:
+        return False
+    last_write = _recent_writes.get(sticky_key)
+    return last_write is not None and time.monotonic() - last_write < DB_REPLICA_STICKY_SECONDS
+
+
+def _get_replica_connection():
+    """
+    Gets a connection from the next healthy replica in round-robin order.
+    Returns None when no replica can serve the read.
+    """
+    global _replica_cursor
+    with _replica_lock:
+        start = _replica_cursor
+        _replica_cursor = (_replica_cursor + 1) % len(db_replica_pools)
+
+    for step in range(len(db_replica_pools)):
+        replica = db_replica_pools[(start + step) % len(db_replica_pools)]
+        if replica['down_until'] > time.monotonic():
+            continue
+        if replica['pool'] is None and _open_replica_pool(replica) is None:
+            continue
+        try:
+            conn = replica['pool'].get_connection()
+        except PoolError:
+            continue # Replica is busy, not broken
+        except Error as e:
+            print(f"WARNING: Replica '{replica['name']}' failed, skipping for {DB_REPLICA_RETRY_SECONDS}s: {e}")
+            replica['down_until'] = time.monotonic() + DB_REPLICA_RETRY_SECONDS
+            continue
+        if conn.is_connected():
+            return conn
+        conn.close()
+        replica['down_until'] = time.monotonic() + DB_REPLICA_RETRY_SECONDS
+    return None
+
 
-def get_db_connection():
+def get_db_connection(read_only=False, sticky_key=None, shard=None):
     """
     Gets a connection from the pool.
+
+    Args:
+        read_only (bool): If True, the connection may come from a read replica.
+        sticky_key: Identifies the caller (usually the user id) for read-your-writes.
+                    Reads for a key that wrote recently are served by the primary.
+        shard (str): Shard to connect to; None or 'default' is the primary. Replicas only
+                     serve the default shard.
     """
-    if db_connection_pool is None:
-        print("CRITICAL: Database connection pool not initialized.")
+    with span("db.pool_checkout"):
+        if shard is not None and shard != DEFAULT_SHARD:
+            _ensure_primary_pool()  # Creates the shard pools too
+            return _get_shard_connection(shard)
+        return _checkout_connection(read_only, sticky_key)
+
+def _checkout_connection(read_only, sticky_key):
+    pool = _ensure_primary_pool()
+    if read_only and db_replica_pools and not _is_sticky(sticky_key):
+        conn = _get_replica_connection()
+        if conn:
+            return conn
+
+    if pool is None:
+        print(f"CRITICAL: Database connection pool not initialized: {db_pool_error}")
         return None
     try:
-        conn = db_connection_pool.get_connection()
+        conn = pool.get_connection()
         if conn.is_connected():
+            if DB_SHARDS:
+                _interleave_ids(conn, 1)
             return conn
     except Error as e:
         print(f"Error getting connection from pool: {e}")
@@ -71,5 +349,143 @@ def close_db_connection(conn, cursor=None):
     if cursor:
         cursor.close()
     if conn and conn.is_connected():
+        if DB_PREPARED_STATEMENTS:
+            # Stands in for the pool's session reset: end any open transaction or snapshot
+            try:
+                conn.rollback()
+            except Error as e:
+                print(f"WARNING: Rollback before returning a connection failed: {e}")
         conn.close()  # This line returns the connection to the pool
 
+# --- Prepared statement registry ---
+
+StatementResult = namedtuple('StatementResult', ['rows', 'lastrowid', 'rowcount'])
+
+# physical connection -> {'connection_id', 'statements': OrderedDict(sql -> (cursor, sql))}
+_statement_registries = weakref.WeakKeyDictionary()
+_statement_registry_lock = threading.Lock()
+
+def _statement_registry(physical):
+    """
+    Returns the statement cache of a physical connection, emptied if the connection was
+    reconnected (the server drops prepared statements with the session).
+    """
+    connection_id = getattr(physical, 'connection_id', None)
+    with _statement_registry_lock:
+        registry = _statement_registries.get(physical)
+        if registry is None or registry['connection_id'] != connection_id:
+            if registry is not None:
+                metrics.incr('prepared_statements.invalidations', len(registry['statements']))
+            registry = {'connection_id': connection_id, 'statements': OrderedDict()}
+            _statement_registries[physical] = registry
+        return registry
+
+def _prepared_statement(physical, sql):
+    statements = _statement_registry(physical)['statements']
+    entry = statements.get(sql)
+    if entry is not None:
+        statements.move_to_end(sql)
+        metrics.incr('prepared_statements.hits')
+        return entry
+    metrics.incr('prepared_statements.misses')
+    # The cursor prepares on first execute and reuses the handle while it is handed the
+    # very same string object, so the registry keeps the first copy of the text.
+    entry = (physical.cursor(prepared=True, dictionary=True), sql)
+    statements[sql] = entry
+    while len(statements) > DB_PREPARED_STATEMENT_CACHE_SIZE:
+        _, (evicted_cursor, _) = statements.popitem(last=False)
+        metrics.incr('prepared_statements.evictions')
+        try:
+            evicted_cursor.close()  # Deallocates the server-side statement
+        except Error as e:
+            print(f"WARNING: Failed to close evicted prepared statement: {e}")
+    return entry
+
+def run_statement(conn, sql, params=None):
+    """
+    Executes one statement on conn and returns its complete result. With
+    DB_PREPARED_STATEMENTS on, each distinct SQL text is prepared once per pooled connection
+    with the binary protocol and its handle reused on later calls; otherwise a plain
+    dictionary cursor is used.
+
+    Args:
+        conn: A connection from get_db_connection().
+        sql (str): Statement with %s placeholders.
+        params (tuple|list): Values for the placeholders.
+
+    Returns:
+        StatementResult: rows (list of dicts, empty for writes), lastrowid and rowcount.
+    """
+    if not DB_PREPARED_STATEMENTS:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall() if cursor.with_rows else []
+            return StatementResult(rows, cursor.lastrowid, cursor.rowcount)
+        finally:
+            cursor.close()
+
+    physical = getattr(conn, '_cnx', conn)  # The MySQL connection inside a pooled handle
+    cursor, statement = _prepared_statement(physical, sql)
+    try:
+        cursor.execute(statement, params or ())
+    except Error:
+        # Unknown handle or a broken statement: forget it so the next call prepares afresh
+        _statement_registry(physical)['statements'].pop(sql, None)
+        raise
+    rows = cursor.fetchall() if cursor.description else []
+    return StatementResult(rows, cursor.lastrowid, cursor.rowcount)
+
+def get_replica_lags():
+    """
+    Returns {replica name: seconds behind the primary} for every configured replica. The
+    value is None when it cannot be read (replica down, replication stopped, or the user
+    lacks the REPLICATION CLIENT privilege).
+    """
+    lags = {}
+    for replica in db_replica_pools:
+        lags[replica['name']] = None
+        if replica['pool'] is None:
+            continue
+        try:
+            conn = replica['pool'].get_connection()
+        except Error:
+            continue
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+            status = cursor.fetchone()
+            if status:
+                lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+                lags[replica['name']] = int(lag) if lag is not None else None
+        except Error:
+            pass
+        finally:
+            close_db_connection(conn, cursor)
+    return lags
+
+def check_database(shard=None):
+    """
+    Checks out a primary (or shard) connection and runs a trivial query.
+
+    Returns:
+        tuple: (ok, detail) where detail explains a failure.
+    """
+    conn = get_db_connection(shard=shard)
+    if not conn:
+        return False, db_pool_error or "No connection available from the pool."
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT 1")
+        cursor.fetchall()
+        return True, None
+    except Error as e:
+        return False, str(e)
+    finally:
+        close_db_connection(conn, cursor)
+
+def prepared_statement_count():
+    with _statement_registry_lock:
+        return sum(len(registry['statements']) for registry in list(_statement_registries.values()))
+
+metrics.register_gauge('prepared_statements.cached', prepared_statement_count)
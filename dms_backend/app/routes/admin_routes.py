@@ -1,5 +1,5 @@
-from flask import Blueprint, jsonify, request
-from flask_jwt_extended import jwt_required
+from flask import Blueprint, jsonify, request, Response
+from app.utils.request_utils import traced_jwt_required
 from app.services.admin_services import (
     get_user_details,
     get_app_config_details,
@@ -16,70 +16,175 @@ from app.services.admin_services import ( # Import the new list service function
     get_app_configs_list_service
 )
 
+from app.services.stats_services import get_document_stats, start_stats_rebuild
+from app.services.integrity_services import get_integrity_report
+from app.services.archive_services import restore_archived_documents
+from app.utils.metrics import snapshot as metrics_snapshot
+from app.utils import profiling
+
 admin_bp = Blueprint('admin_routes', __name__)
 
 def list_route_wrapper(service_function):
+    # GET takes the same filters as query parameters so browsers and proxies can revalidate
+    if request.method == 'GET':
+        return service_function(request.args.to_dict())
     request_data, error_response, status_code = get_request_data()
     if error_response:
         return jsonify(error_response), status_code
     return service_function(request_data)
 
 def details_route_wrapper(service_function):
-    data = request.get_json()
+    if request.method == 'GET':
+        data = request.args.to_dict()
+        # Batch details also take repeated ids parameters (?ids=1&ids=2)
+        if len(request.args.getlist('ids')) > 1:
+            data['ids'] = ','.join(request.args.getlist('ids'))
+    else:
+        data = request.get_json()
     response, status_code = service_function(data)
     return response, status_code
 
 # --- Users Endpoints ---
-@admin_bp.route('/users/list', methods=['POST'])
-@jwt_required()
+@admin_bp.route('/users/list', methods=['GET', 'POST'])
+@traced_jwt_required()
 def admin_users_list():
     return list_route_wrapper(get_users_list_service)
 
-@admin_bp.route('/users/details', methods=['POST'])
-@jwt_required()
+@admin_bp.route('/users/details', methods=['GET', 'POST'])
+@traced_jwt_required()
 def admin_users_details():
     return details_route_wrapper(get_user_details)
 
 # --- Documents Endpoints ---
-@admin_bp.route('/documents/list', methods=['POST'])
-@jwt_required()
+@admin_bp.route('/documents/list', methods=['GET', 'POST'])
+@traced_jwt_required()
 def admin_documents_list():
     return list_route_wrapper(get_documents_list_service)
 
-@admin_bp.route('/documents/details', methods=['POST'])
-@jwt_required()
+@admin_bp.route('/documents/details', methods=['GET', 'POST'])
+@traced_jwt_required()
 def admin_documents_details():
     return details_route_wrapper(get_upload_detail_services)
 
 # --- Access Logs Endpoints ---
-@admin_bp.route('/access_logs/list', methods=['POST'])
-@jwt_required()
+@admin_bp.route('/access_logs/list', methods=['GET', 'POST'])
+@traced_jwt_required()
 def admin_access_logs_list():
     return list_route_wrapper(get_access_logs_list_service)
 
-@admin_bp.route('/access_logs/details', methods=['POST'])
-@jwt_required()
+@admin_bp.route('/access_logs/details', methods=['GET', 'POST'])
+@traced_jwt_required()
 def admin_access_logs_details():
     return details_route_wrapper(get_access_log_details)
 
 # --- Document Master Endpoints ---
-@admin_bp.route('/document_master/list', methods=['POST'])
-@jwt_required()
+@admin_bp.route('/document_master/list', methods=['GET', 'POST'])
+@traced_jwt_required()
 def admin_document_master_list():
     return list_route_wrapper(get_document_master_list_service)
 
-@admin_bp.route('/document_master/details', methods=['POST'])
-@jwt_required()
+@admin_bp.route('/document_master/details', methods=['GET', 'POST'])
+@traced_jwt_required()
 def admin_document_master_details():
     return details_route_wrapper(get_ds_master_details)
 
 # --- Application Config Endpoints ---
-@admin_bp.route('/application_config/list', methods=['POST'])
-@jwt_required()
+@admin_bp.route('/application_config/list', methods=['GET', 'POST'])
+@traced_jwt_required()
 def admin_application_config_list():
     return list_route_wrapper(get_app_configs_list_service)
 
-@admin_bp.route('/application_config/details', methods=['POST'])
-@jwt_required()
+@admin_bp.route('/application_config/details', methods=['GET', 'POST'])
+@traced_jwt_required()
 def admin_application_config_details():
     return details_route_wrapper(get_app_config_details)
+
+# --- Metrics Endpoint ---
+@admin_bp.route('/metrics', methods=['GET'])
+@traced_jwt_required()
+def admin_metrics():
+    return jsonify(metrics_snapshot()), 200
+
+# --- Stats Endpoints ---
+@admin_bp.route('/stats', methods=['GET'])
+@traced_jwt_required()
+def admin_stats():
+    response, status_code = get_document_stats(request.args.to_dict())
+    return jsonify(response), status_code
+
+@admin_bp.route('/stats/rebuild', methods=['POST'])
+@traced_jwt_required()
+def admin_stats_rebuild():
+    if not start_stats_rebuild():
+        return jsonify({'message': 'A stats rebuild is already running.'}), 409
+    return jsonify({'message': 'Stats rebuild started.'}), 202
+
+# --- Integrity Verification Endpoint ---
+@admin_bp.route('/integrity', methods=['GET'])
+@traced_jwt_required()
+def admin_integrity():
+    response, status_code = get_integrity_report(request.args.to_dict())
+    return jsonify(response), status_code
+
+# --- Archive Endpoint ---
+@admin_bp.route('/documents/restore', methods=['POST'])
+@traced_jwt_required()
+def admin_documents_restore():
+    request_data, error_response, status_code = get_request_data()
+    if error_response:
+        return jsonify(error_response), status_code
+    response, status_code = restore_archived_documents(request_data.get('ids') or [])
+    return jsonify(response), status_code
+
+# --- Profiling Endpoints ---
+@admin_bp.route('/profile/sample', methods=['GET'])
+@traced_jwt_required()
+def admin_profile_sample():
+    if not profiling.PROFILING_ENABLED:
+        return jsonify({'message': 'Profiling is disabled.'}), 404
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        interval_ms = float(request.args.get('interval_ms', profiling.PROFILE_DEFAULT_INTERVAL_MS))
+    except ValueError:
+        return jsonify({'message': "'seconds' and 'interval_ms' must be numbers."}), 400
+    if not 0 < seconds <= profiling.PROFILE_MAX_SECONDS:
+        return jsonify({'message': f"'seconds' must be between 0 and {profiling.PROFILE_MAX_SECONDS:g}."}), 400
+    stacks = profiling.sample_stacks(seconds, interval_ms)
+    if stacks is None:
+        return jsonify({'message': 'Another sampling run is in progress.'}), 409
+    return Response(stacks, mimetype='text/plain', headers={
+        'Content-Disposition': 'attachment; filename="profile.collapsed"'
+    })
+
+@admin_bp.route('/profile/token', methods=['POST'])
+@traced_jwt_required()
+def admin_profile_token():
+    if not profiling.PROFILING_ENABLED:
+        return jsonify({'message': 'Profiling is disabled.'}), 404
+    request_data, error_response, status_code = get_request_data()
+    if error_response:
+        return jsonify(error_response), status_code
+    path = request_data.get('path')
+    if not isinstance(path, str) or not path.startswith('/'):
+        return jsonify({'message': "'path' must be the request path to profile, such as /api/document/list."}), 400
+    try:
+        ttl_seconds = int(request_data.get('ttl_seconds', 300))
+    except (TypeError, ValueError):
+        return jsonify({'message': "'ttl_seconds' must be an integer."}), 400
+    token, expires = profiling.create_profile_token(path, ttl_seconds)
+    return jsonify({'header': profiling.PROFILE_HEADER, 'value': token, 'path': path, 'expiresAt': expires}), 200
+
+@admin_bp.route('/profile/requests/<profile_id>', methods=['GET'])
+@traced_jwt_required()
+def admin_profile_request(profile_id):
+    if not profiling.PROFILING_ENABLED:
+        return jsonify({'message': 'Profiling is disabled.'}), 404
+    raw = request.args.get('format') == 'pstats'
+    profile = profiling.load_request_profile(profile_id, raw=raw)
+    if profile is None:
+        return jsonify({'message': 'Profile not found.'}), 404
+    if raw:
+        return Response(profile, mimetype='application/octet-stream', headers={
+            'Content-Disposition': f'attachment; filename="{profile_id}.prof"'
+        })
+    return Response(profile, mimetype='text/plain')
@@ -1,10 +1,18 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token
-from app.database import get_db_connection, get_db_cursor, close_db_connection
+from app.database import get_db_connection, close_db_connection, run_statement
+from app.schema import register_hot_query
+from app.utils.tracing import span
 import bcrypt
 
 auth_bp = Blueprint('auth_routes', __name__)
 
+LOGIN_QUERY = register_hot_query(
+    "login",
+    "SELECT id, username, password, first_name FROM ds_user WHERE username = %s AND deleted = 0 AND status = 'active'",
+    ("sample",)
+)
+
 @auth_bp.route('/login', methods=['POST'])
 def login():
     """
@@ -17,17 +25,14 @@ def login():
         return jsonify({"msg": "Missing username or password"}), 400
 
     conn = None
-    cursor = None
     try:
         conn = get_db_connection()
         if not conn:
             return jsonify({"msg": "Database connection error"}), 500
-        cursor = get_db_cursor(conn)
-        
         # Query ds_user table to get the hashed password, user_id, and username
-        select_query = "SELECT id, username, password, first_name FROM ds_user WHERE username = %s AND deleted = 0 AND status = 'active'"
-        cursor.execute(select_query, (username,))
-        user_record = cursor.fetchone()
+        with span("db.login_query"):
+            rows = run_statement(conn, LOGIN_QUERY, (username,)).rows
+        user_record = rows[0] if rows else None
 
         if user_record:
             stored_hashed_password = user_record['password']
@@ -36,7 +41,9 @@ def login():
             first_name = user_record['first_name']
 
             # Verify the provided password against the stored hash
-            if bcrypt.checkpw(password.encode('utf-8'), stored_hashed_password.encode('utf-8')):
+            with span("auth.password_check"):
+                password_ok = bcrypt.checkpw(password.encode('utf-8'), stored_hashed_password.encode('utf-8'))
+            if password_ok:
                 # Credentials are valid, create and return JWT
                 access_token = create_access_token(
                     identity=username, # The identity usually is something unique like username
@@ -52,4 +59,4 @@ def login():
         print(f"ERROR: Login failed due to unexpected error: {e}")
         return jsonify({"msg": "An internal error occurred during login"}), 500
     finally:
-        close_db_connection(conn, cursor)
\ No newline at end of file
+        close_db_connection(conn)
\ No newline at end of file
@@ -1,14 +1,32 @@
-from flask import Blueprint, jsonify
-from flask_jwt_extended import jwt_required
-from app.services.document_services import delete_document_service, list_documents_service, handle_file_upload, log_api_operation
-from app.utils.request_utils import get_request_context, parse_request_data
+from flask import Blueprint, Response, jsonify, request
+from flask_jwt_extended import get_jwt
+from app.services.document_services import (
+    delete_document_service,
+    list_documents_service,
+    handle_file_upload,
+    log_api_operation,
+    get_document_download,
+    iter_file_chunks,
+    open_document_event_stream
+)
+from app.services.zip_services import get_zip_documents, stream_zip
+from app.services.upload_session_services import (
+    create_upload_session,
+    get_upload_session_status,
+    append_upload_chunk,
+    finalize_upload_session,
+    abort_upload_session
+)
+from app.utils.request_utils import get_request_context, parse_request_data, traced_jwt_required
+from app.utils.encoding import list_json_response
 
 document_api_bp = Blueprint('document_routes', __name__) # Updated Blueprint name for consistency
 
-def handle_request_with_logging(service_function, is_file_upload=False):
+def handle_request_with_logging(service_function, is_file_upload=False, list_field=None):
     """
     A helper function to orchestrate common request parsing,
     service function calling, and access logging for API endpoints.
+    list_field names the response list that may be sent in the table format.
     """
     # Get common request context
     req_context = get_request_context()
@@ -30,23 +48,159 @@ def handle_request_with_logging(service_function, is_file_upload=False):
     # Log the API operation
     log_api_operation(claims, req_context, response_data, request_body_for_logging, log_env_id)
 
+    if list_field:
+        return list_json_response(response_data, list_field), response_data.get("responseCode", 500)
     return jsonify(response_data), response_data.get("responseCode", 500)
 
 
 @document_api_bp.route('/document/delete', methods=['DELETE'])
-@jwt_required()
+@traced_jwt_required()
 def delete_document_route():
     """Handles the DELETE /api/document/delete endpoint."""
     return handle_request_with_logging(delete_document_service)
 
 @document_api_bp.route("/document/list", methods=["POST"]) # Changed from /get-documents to /document/list
-@jwt_required()
+@traced_jwt_required()
 def list_documents_route(): # Renamed function for clarity
     """Handles the POST /api/document/list endpoint."""
-    return handle_request_with_logging(list_documents_service) # Still calls list_documents_service
+    return handle_request_with_logging(list_documents_service, list_field="responseData") # Still calls list_documents_service
 
 @document_api_bp.route("/document/upload", methods=["POST"]) # Changed from /upload to /document/upload
-@jwt_required()
+@traced_jwt_required()
 def upload_file_route():
     """Handles the POST /api/document/upload endpoint."""
-    return handle_request_with_logging(handle_file_upload, is_file_upload=True)
\ No newline at end of file
+    return handle_request_with_logging(handle_file_upload, is_file_upload=True)
+@document_api_bp.route("/document/download", methods=["POST"])
+@traced_jwt_required()
+def download_document_route():
+    """
+    Handles the POST /api/document/download endpoint. Files stored gzip-compressed are sent
+    as-is with Content-Encoding: gzip to clients that accept it, and decompressed otherwise.
+    """
+    req_context = get_request_context()
+    request_data, request_body_for_logging, log_env_id = parse_request_data()
+    response_data = get_document_download(
+        request_data,
+        req_context["user_id"],
+        accept_gzip=request.accept_encodings["gzip"] > 0
+    )
+    download = response_data.pop("download", None)
+    log_api_operation(req_context["claims"], req_context, response_data, request_body_for_logging, log_env_id)
+    if not download:
+        return jsonify(response_data), response_data.get("responseCode", 500)
+
+    response = Response(iter_file_chunks(download["stream"]), mimetype=download["mimetype"])
+    response.headers["Content-Disposition"] = f'attachment; filename="{download["filename"]}"'
+    response.headers["Vary"] = "Accept-Encoding"
+    if download["content_length"] is not None:
+        response.headers["Content-Length"] = str(download["content_length"])
+    if download["content_encoding"]:
+        response.headers["Content-Encoding"] = download["content_encoding"]
+    return response
+
+@document_api_bp.route("/document/download/zip", methods=["POST"])
+@traced_jwt_required()
+def download_zip_route():
+    """
+    Handles the POST /api/document/download/zip endpoint: every document of a reference, or
+    the listed ids, as one ZIP archive streamed while it is built.
+    """
+    req_context = get_request_context()
+    request_data, request_body_for_logging, log_env_id = parse_request_data()
+    response_data = get_zip_documents(request_data, req_context["user_id"])
+    documents = response_data.pop("documents", None)
+    filename = response_data.pop("filename", None)
+    log_api_operation(req_context["claims"], req_context, response_data, request_body_for_logging, log_env_id)
+    if not documents:
+        return jsonify(response_data), response_data.get("responseCode", 500)
+
+    response = Response(stream_zip(documents), mimetype="application/zip")
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+
+@document_api_bp.route("/document/events", methods=["GET"])
+@traced_jwt_required()
+def document_events_route():
+    """
+    Handles GET /api/document/events: a server-sent events stream of uploads and deletes for
+    one (module, application_id, reference_id), resumable with Last-Event-ID.
+    """
+    stream, error_response = open_document_event_stream(
+        request.args.to_dict(),
+        request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    )
+    if error_response:
+        return jsonify(error_response), error_response["responseCode"]
+    response = Response(stream, mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-store"
+    response.headers["X-Accel-Buffering"] = "no"  # Keep nginx from buffering the stream
+    return response
+
+
+# --- Resumable Upload Sessions ---
+
+def upload_session_response(response_data):
+    """
+    Returns a session response with tus-style Upload-Offset/Upload-Length headers.
+    """
+    response = jsonify(response_data)
+    response.status_code = response_data.get("responseCode", 500)
+    session_status = response_data.get("responseData") or {}
+    if "offset" in session_status:
+        response.headers["Upload-Offset"] = str(session_status["offset"])
+        response.headers["Upload-Length"] = str(session_status["length"])
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+def handle_session_request_with_logging(service_function, session_id):
+    """Calls a session service that takes no body and logs the operation."""
+    req_context = get_request_context()
+    response_data = service_function(session_id, req_context["user_id"])
+    log_api_operation(req_context["claims"], req_context, response_data, {"session_id": session_id}, None)
+    return upload_session_response(response_data)
+
+@document_api_bp.route("/document/upload/session", methods=["POST"])
+@traced_jwt_required()
+def create_upload_session_route():
+    """Handles the POST /api/document/upload/session endpoint."""
+    return handle_request_with_logging(create_upload_session)
+
+@document_api_bp.route("/document/upload/session/<session_id>", methods=["GET"]) # HEAD is answered as well
+@traced_jwt_required()
+def upload_session_status_route(session_id):
+    """Reports the current offset of an upload session so the client can resume."""
+    return upload_session_response(get_upload_session_status(session_id, get_jwt().get("user_id")))
+
+@document_api_bp.route("/document/upload/session/<session_id>", methods=["PATCH"])
+@traced_jwt_required()
+def upload_session_chunk_route(session_id):
+    """Appends the raw request body at the offset given in the Upload-Offset header."""
+    try:
+        offset = int(request.headers.get("Upload-Offset", ""))
+    except ValueError:
+        return upload_session_response({
+            "responseCode": 400,
+            "responseStatus": "error",
+            "responseMessage": "Missing or invalid Upload-Offset header."
+        })
+    if request.mimetype not in ("application/offset+octet-stream", "application/octet-stream"):
+        return upload_session_response({
+            "responseCode": 415,
+            "responseStatus": "error",
+            "responseMessage": "Chunks must be sent as application/offset+octet-stream."
+        })
+    return upload_session_response(append_upload_chunk(session_id, offset, request.stream, get_jwt().get("user_id")))
+
+@document_api_bp.route("/document/upload/session/<session_id>/finalize", methods=["POST"])
+@traced_jwt_required()
+def finalize_upload_session_route(session_id):
+    """Completes an upload session and stores the document."""
+    return handle_session_request_with_logging(finalize_upload_session, session_id)
+
+@document_api_bp.route("/document/upload/session/<session_id>", methods=["DELETE"])
+@traced_jwt_required()
+def abort_upload_session_route(session_id):
+    """Cancels an upload session."""
+    return handle_session_request_with_logging(abort_upload_session, session_id)
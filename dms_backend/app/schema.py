@@ -0,0 +1,201 @@
+import os
+import time
+from datetime import datetime
+from mysql.connector import Error
+from app.database import get_db_connection, get_db_cursor, close_db_connection
+
+# Versioned .sql files, applied in file name order (0001_..., 0002_...)
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations")
+
+# Plan types that mean MySQL reads the whole table or the whole index
+FULL_SCAN_TYPES = {"ALL", "index"}
+
+# name -> (sql, sample_params)
+HOT_QUERIES = {}
+
+
+def register_hot_query(name, sql, sample_params):
+    """
+    Registers a query that runs on a hot path so its plan is checked by verify_query_plans.
+
+    Args:
+        name (str): Unique, human readable name of the query.
+        sql (str): The parameterized SQL text exactly as the service executes it.
+        sample_params (tuple): Representative parameters used to EXPLAIN the query.
+    """
+    HOT_QUERIES[name] = (sql, sample_params)
+    return sql
+
+
+def _read_migration_statements(path):
+    """
+    Splits a migration file into statements, dropping '--' comment lines.
+    """
+    with open(path, encoding="utf-8") as f:
+        lines = [line for line in f if not line.strip().startswith("--")]
+    return [stmt.strip() for stmt in "".join(lines).split(";") if stmt.strip()]
+
+
+def list_migrations():
+    """
+    Returns the (version, path) pairs shipped with the backend, oldest first.
+    """
+    migrations = []
+    for file_name in sorted(os.listdir(MIGRATIONS_DIR)):
+        if file_name.endswith(".sql"):
+            migrations.append((file_name[:-4], os.path.join(MIGRATIONS_DIR, file_name)))
+    return migrations
+
+
+def apply_migrations(shard=None):
+    """
+    Applies every migration not yet recorded in ds_schema_migrations of the primary, or of
+    the given shard.
+
+    Returns:
+        list: The versions applied by this call.
+    """
+    conn = get_db_connection(shard=shard)
+    if not conn:
+        raise RuntimeError(f"Failed to connect to the database{f' shard {shard}' if shard else ''} for migrations.")
+    cursor = get_db_cursor(conn)
+    applied_now = []
+    try:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ds_schema_migrations (
+                version VARCHAR(100) PRIMARY KEY,
+                applied_at DATETIME NOT NULL
+            )
+        """)
+        cursor.execute("SELECT version FROM ds_schema_migrations")
+        applied = {row['version'] for row in cursor.fetchall()}
+
+        for version, path in list_migrations():
+            if version in applied:
+                continue
+            print(f"Applying migration {version}...")
+            for statement in _read_migration_statements(path):
+                cursor.execute(statement)
+            cursor.execute(
+                "INSERT INTO ds_schema_migrations (version, applied_at) VALUES (%s, %s)",
+                (version, datetime.utcnow())
+            )
+            conn.commit()
+            applied_now.append(version)
+        return applied_now
+    except Error as e:
+        conn.rollback()
+        print(f"ERROR: Migration failed: {e}")
+        raise
+    finally:
+        close_db_connection(conn, cursor)
+
+
+def verify_query_plans(mode="warn"):
+    """
+    Runs EXPLAIN on every registered hot query and reports the ones that would scan a whole
+    table or index.
+
+    Args:
+        mode (str): 'warn' prints problems, 'fail' raises RuntimeError, 'off' skips the check.
+
+    Returns:
+        list: (name, table, plan_type) tuples for every full scan found.
+    """
+    if mode == "off" or not HOT_QUERIES:
+        return []
+
+    conn = get_db_connection()
+    if not conn:
+        print("WARNING: Skipping query plan verification, database connection unavailable.")
+        return []
+    cursor = get_db_cursor(conn)
+    problems = []
+    try:
+        for name, (sql, sample_params) in HOT_QUERIES.items():
+            cursor.execute(f"EXPLAIN {sql}", sample_params)
+            for row in cursor.fetchall():
+                if row.get('type') in FULL_SCAN_TYPES:
+                    problems.append((name, row.get('table'), row.get('type')))
+    except Error as e:
+        print(f"WARNING: Query plan verification failed to run: {e}")
+        return []
+    finally:
+        close_db_connection(conn, cursor)
+
+    for name, table, plan_type in problems:
+        print(f"WARNING: Hot query '{name}' does a full scan (type={plan_type}) on table '{table}'.")
+    if problems and mode == "fail":
+        raise RuntimeError(f"{len(problems)} hot queries would do a full scan; run 'flask db upgrade'.")
+    return problems
+
+
+def _server_statement_time(conn):
+    """
+    Returns (wait_ps, cpu_ps) of all statements run so far by this session, from
+    performance_schema, or None when it is unavailable (CPU time needs MySQL 8.0.28+).
+    """
+    cursor = get_db_cursor(conn)
+    try:
+        cursor.execute("""
+            SELECT SUM(SUM_TIMER_WAIT) AS wait_ps, SUM(SUM_CPU_TIME) AS cpu_ps
+            FROM performance_schema.events_statements_summary_by_thread_by_event_name
+            WHERE THREAD_ID = PS_CURRENT_THREAD_ID()
+        """)
+        row = cursor.fetchone()
+        if not row or row['wait_ps'] is None:
+            return None
+        return int(row['wait_ps']), int(row['cpu_ps'] or 0)
+    except Error:
+        return None
+    finally:
+        cursor.close()
+
+
+def benchmark_hot_queries(iterations=1000):
+    """
+    Runs every registered hot query with its sample parameters, first as text through a
+    dictionary cursor and then as a reused server-side prepared statement, on one primary
+    connection.
+
+    Returns:
+        list: One dict per (query, mode) with per-execution 'wall_us', 'client_cpu_us' and,
+              when performance_schema allows, 'server_us' and 'server_cpu_us'.
+    """
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("Failed to connect to the database for the benchmark.")
+    physical = getattr(conn, '_cnx', conn)
+    text_cursor = get_db_cursor(conn)
+    prepared_cursor = physical.cursor(prepared=True, dictionary=True)
+    results = []
+    try:
+        for name, (sql, sample_params) in HOT_QUERIES.items():
+            for mode, cursor in (("text", text_cursor), ("prepared", prepared_cursor)):
+                cursor.execute(sql, sample_params)  # Warm up (and prepare) outside the timing
+                cursor.fetchall()
+                server_before = _server_statement_time(conn)
+                cpu_start, wall_start = time.process_time(), time.perf_counter()
+                for _ in range(iterations):
+                    cursor.execute(sql, sample_params)
+                    cursor.fetchall()
+                cpu, wall = time.process_time() - cpu_start, time.perf_counter() - wall_start
+                server_after = _server_statement_time(conn)
+                result = {
+                    "query": name,
+                    "mode": mode,
+                    "wall_us": wall / iterations * 1e6,
+                    "client_cpu_us": cpu / iterations * 1e6,
+                    "server_us": None,
+                    "server_cpu_us": None
+                }
+                if server_before and server_after:
+                    result["server_us"] = (server_after[0] - server_before[0]) / iterations / 1e6
+                    result["server_cpu_us"] = (server_after[1] - server_before[1]) / iterations / 1e6
+                results.append(result)
+            conn.rollback()
+    finally:
+        prepared_cursor.close()
+        close_db_connection(conn, text_cursor)
+    return results
+
@@ -1,12 +1,51 @@
 from app.database import get_db_connection
 from flask import jsonify
-from app.database import get_db_connection, close_db_connection
-from flask import jsonify, request
+from app.database import get_db_connection, close_db_connection, run_statement, DEFAULT_SHARD, shard_names
+from app.sharding import is_sharded, shards_for_query, scatter, ownership_filter, shard_map_version
+from flask import jsonify, request, make_response
 from mysql.connector import Error
 from typing import Union, List, Tuple, Optional
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 import json # Import json for response data
+import hashlib
+import os
+from app.utils.tracing import span
+from app.utils.encoding import list_json_response
+from app.services.archive_services import ARCHIVE_TABLE
+
+# Tables the API only inserts into; a new row moves MAX(id), so they need no change counter
+APPEND_ONLY_TABLES = {'ds_access_log'}
+# Ids accepted by one batch details request
+MAX_DETAIL_IDS = int(os.getenv("ADMIN_DETAILS_MAX_IDS", "100"))
+# IN lists are padded to the next of these lengths, so a table's batch queries share a few
+# prepared statements instead of filling each connection's statement LRU with one per length
+DETAIL_ID_BUCKETS = sorted({size for size in (1, 4, 16, 64) if size < MAX_DETAIL_IDS} | {MAX_DETAIL_IDS})
+
+def locate_shard(table_name, entity_id):
+    """
+    Finds the shard holding the row of a sharded table with the given id (ids are unique
+    across shards).
+
+    Returns:
+        Optional[str]: The shard name, or None if no shard has the row.
 
-def get_entity_details(data, id_field, table_name, not_found_message="Entity not found"):
+    Raises:
+        RuntimeError: If a shard cannot be reached.
+    """
+    def lookup(shard):
+        conn = get_db_connection(read_only=True, shard=shard)
+        if not conn:
+            raise RuntimeError(f"Failed to connect to shard '{shard}'.")
+        try:
+            return bool(run_statement(conn, f"SELECT id FROM {table_name} WHERE id = %s", (entity_id,)).rows)
+        finally:
+            close_db_connection(conn)
+
+    found = scatter(lookup, shard_names())
+    return next((shard for shard, present in found.items() if present), None)
+
+def get_entity_details(data, id_field, table_name, not_found_message="Entity not found", sharded=False):
     """
     Generic function to fetch entity details from database
     
@@ -15,32 +54,138 @@ def get_entity_details(data, id_field, table_name, not_found_message="Entity not
         id_field (str): The name of the ID field in the request data
         table_name (str): Database table to query
         not_found_message (str): Custom message for when entity isn't found
+        sharded (bool): True for tables partitioned by env_id (see app/sharding.py)
         
     Returns:
         tuple: (response, status_code)
     """
+    if data and 'ids' in data:
+        return get_entity_details_batch(data['ids'], table_name, not_found_message, sharded)
     if not data or id_field not in data:
         return jsonify({'message': f'{id_field} is required in request body'}), 400
 
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute(f"SELECT * FROM {table_name} WHERE id = %s", (data[id_field],))
-    entity = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    shard = DEFAULT_SHARD
+    if sharded and is_sharded():
+        try:
+            with span("db.details_locate"):
+                shard = locate_shard(table_name, data[id_field])
+        except (Error, RuntimeError) as e:
+            print(f"Error locating {table_name} row: {e}")
+            return jsonify({'message': 'Failed to connect to the database.'}), 500
+        if shard is None:
+            return jsonify({'message': not_found_message}), 404
+
+    conn = get_db_connection(read_only=True, shard=shard)
+    if not conn:
+        return jsonify({'message': 'Failed to connect to the database.'}), 500
+    try:
+        # Cheap validator lookup first so an unchanged row is answered without reading it
+        with span("db.details_watermark"):
+            rows = run_statement(conn, f"SELECT id, createdAt, updatedAt FROM {table_name} WHERE id = %s", (data[id_field],)).rows
+        watermark = rows[0] if rows else None
+        if not watermark:
+            return jsonify({'message': not_found_message}), 404
+        etag = build_etag(table_name, watermark['id'], watermark['createdAt'], watermark['updatedAt'])
+        if request.if_none_match.contains_weak(etag):
+            return not_modified_response(etag)
+
+        with span("db.details"):
+            rows = run_statement(conn, f"SELECT * FROM {table_name} WHERE id = %s", (data[id_field],)).rows
+        entity = rows[0] if rows else None
+    finally:
+        close_db_connection(conn)
 
     if entity:
-        return jsonify(entity), 200
+        return with_etag(jsonify(entity), etag), 200
     else:
         return jsonify({'message': not_found_message}), 404
 
+def parse_detail_ids(ids) -> Tuple[Optional[List[int]], Optional[str]]:
+    """
+    Normalizes the 'ids' of a batch details request: a list, or a comma separated string
+    as sent in a query parameter. Duplicates are dropped and request order is kept.
+
+    Returns:
+        tuple: (ids, error_message)
+    """
+    if isinstance(ids, str):
+        ids = [part for part in ids.split(',') if part.strip()]
+    elif isinstance(ids, (int, float)) and not isinstance(ids, bool):
+        ids = [ids]
+    if not isinstance(ids, list) or not ids:
+        return None, "'ids' must be a non-empty list of ids."
+    try:
+        ids = list(dict.fromkeys(int(str(entity_id).strip()) for entity_id in ids))
+    except ValueError:
+        return None, "'ids' must contain integers only."
+    if len(ids) > MAX_DETAIL_IDS:
+        return None, f"At most {MAX_DETAIL_IDS} ids can be requested at once."
+    return ids, None
+
+def pad_id_list(ids: List[int]) -> List[int]:
+    """
+    Repeats the last id until the list has a DETAIL_ID_BUCKETS length; duplicates in an IN
+    list do not change its result.
+    """
+    size = next((bucket for bucket in DETAIL_ID_BUCKETS if bucket >= len(ids)), len(ids))
+    return ids + [ids[-1]] * (size - len(ids))
+
+def get_entity_details_batch(ids, table_name, not_found_message="Entity not found", sharded=False):
+    """
+    Fetches several rows of a table with one WHERE id IN (...) query on one connection (one
+    per shard for sharded tables once DB_SHARDS is set).
+
+    Args:
+        ids: List of ids, or a comma separated string of ids; at most MAX_DETAIL_IDS.
+
+    Returns:
+        tuple: (response, status_code). The body maps every requested id to
+               {'found': True, 'data': row} or {'found': False, 'message': not_found_message}.
+    """
+    ids, error = parse_detail_ids(ids)
+    if error:
+        return jsonify({'message': error}), 400
+    padded_ids = pad_id_list(ids)
+    placeholders = ", ".join(["%s"] * len(padded_ids))
+
+    def fetch(shard):
+        conn = get_db_connection(read_only=True, shard=shard)
+        if not conn:
+            raise RuntimeError(f"Failed to connect to shard '{shard}'.")
+        try:
+            return run_statement(conn, f"SELECT * FROM {table_name} WHERE id IN ({placeholders})", padded_ids).rows
+        finally:
+            close_db_connection(conn)
+
+    shards = shard_names() if sharded and is_sharded() else [DEFAULT_SHARD]
+    try:
+        with span("db.details_batch"):
+            found = {row['id']: row for rows in scatter(fetch, shards).values() for row in rows}
+    except (Error, RuntimeError) as e:
+        print(f"Error fetching {table_name} details: {e}")
+        return jsonify({'message': 'Failed to connect to the database.'}), 500
+
+    etag = build_etag(table_name, *(
+        f"{entity_id}:{found[entity_id]['createdAt']}:{found[entity_id]['updatedAt']}" if entity_id in found else f"{entity_id}:-"
+        for entity_id in ids
+    ))
+    if request.if_none_match.contains_weak(etag):
+        return not_modified_response(etag)
+    items = {
+        str(entity_id): {'found': True, 'data': found[entity_id]} if entity_id in found
+        else {'found': False, 'message': not_found_message}
+        for entity_id in ids
+    }
+    return with_etag(jsonify({'items': items}), etag), 200
+
 # Now refactor the existing functions to use the generic function
 def get_access_log_details(data):
     return get_entity_details(
         data, 
         'access_log_id', 
         'ds_access_log', 
-        'Log not found'
+        'Log not found',
+        sharded=True
     )
     
 def get_app_config_details(data):
@@ -60,11 +205,14 @@ def get_ds_master_details(data):
     )
 
 def get_upload_detail_services(data):
+    # Set 'archived' to look the document up in the archive
+    archived = data and str(data.get('archived', '')).lower() in ('1', 'true')
     return get_entity_details(
         data, 
         'upload_id', 
-        'ds_document', 
-        'File details not found'
+        ARCHIVE_TABLE if archived else 'ds_document', 
+        'File details not found',
+        sharded=True
     )
     
 def get_user_details(data):
@@ -79,6 +227,91 @@ def get_user_details(data):
 # Default items per page for pagination
 DEFAULT_ITEMS_PER_PAGE = 5
 
+# Newest first; id breaks ties so paging is deterministic
+DEFAULT_LIST_ORDER = ['createdAt DESC', 'id DESC']
+
+ARCHIVED_LIST_MODES = ('exclude', 'include', 'only')
+
+# Date filters shared by every table with createdAt/updatedAt columns.
+# 'on' matches the whole period of the value (a day for '2024-05-01', a month for '2024-05'),
+# 'from' is inclusive and 'to' includes the whole period of a date-only value.
+DATETIME_SEARCH_FIELDS = {
+    'created_at': {'db_column': 'createdAt', 'type': 'datetime', 'comparison': 'on'},
+    'created_from': {'db_column': 'createdAt', 'type': 'datetime', 'comparison': 'from'},
+    'created_to': {'db_column': 'createdAt', 'type': 'datetime', 'comparison': 'to'},
+    'updated_at': {'db_column': 'updatedAt', 'type': 'datetime', 'comparison': 'on'},
+    'updated_from': {'db_column': 'updatedAt', 'type': 'datetime', 'comparison': 'from'},
+    'updated_to': {'db_column': 'updatedAt', 'type': 'datetime', 'comparison': 'to'}
+}
+
+def build_etag(*parts) -> str:
+    """
+    Builds the opaque validator for a list or detail response from the values it depends on.
+
+    Args:
+        *parts: Table name, change watermark and, for lists, the normalized request filters.
+
+    Returns:
+        str: A hex digest, sent as a weak ETag.
+    """
+    return hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+def with_etag(response, etag: str):
+    """
+    Attaches a weak ETag to a response and asks clients to revalidate before reusing it.
+    """
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def not_modified_response(etag: str):
+    """
+    Returns the 304 answer for a request whose If-None-Match still matches.
+    """
+    return with_etag(make_response('', 304), etag), 304
+
+def get_list_etag(connection, table_name: str, data: dict, watermarks: Optional[List[str]] = None) -> Optional[str]:
+    """
+    Computes the validator of a list request from the change counters of the tables it reads
+    and the filters.
+
+    Triggers bump one of a table's striped counters in ds_change_counter in the same
+    transaction as every insert, update and delete, so an unchanged sum means every page and
+    count of the table is unchanged too. Insert-only tables (APPEND_ONLY_TABLES) use MAX(id).
+
+    Args:
+        connection: The connection the page and count queries will run on, so the counters
+                    and the data come from the same snapshot.
+        table_name (str): Database table (or derived table) to list.
+        data (dict): Request data (filters, page, limit, timezone).
+        watermarks (List[str]): Tables whose counters make up the watermark; defaults to
+                    the listed table.
+
+    Returns:
+        Optional[str]: The ETag, or None if the counters could not be read.
+    """
+    tables = watermarks or [table_name]
+    versions = {}
+    counted = [table for table in tables if table not in APPEND_ONLY_TABLES]
+    if counted:
+        rows = execute_query(
+            f"SELECT table_name, SUM(version) AS version FROM ds_change_counter"
+            f" WHERE table_name IN ({', '.join(['%s'] * len(counted))}) GROUP BY table_name",
+            counted,
+            connection=connection
+        )
+        versions.update((row['table_name'], row['version']) for row in rows or [])
+    for table in tables:
+        if table in APPEND_ONLY_TABLES:
+            row = execute_query(f"SELECT MAX(id) AS max_id FROM {table}", fetch_one=True, connection=connection)
+            if row is not None:
+                versions[table] = row['max_id']
+    if any(table not in versions for table in tables):
+        return None  # No counter (migration 0012 not applied): serve without a validator
+    # Values are compared as text so a GET query string and the equivalent POST body share an ETag
+    filters = json.dumps({key: str(value) for key, value in data.items()}, sort_keys=True)
+    return build_etag(table_name, *(f"{table}:{versions[table]}" for table in tables), filters)
+
 def get_request_data():
     """
     Helper function to safely get JSON data from the request body.
@@ -102,7 +335,8 @@ def get_request_data():
 def send_response(data: Union[List[Tuple], Tuple, None], page: int, limit: int, total_items: int, total_pages: int):
     """
     Helper function to standardize the JSON response for list endpoints,
-    including pagination metadata.
+    including pagination metadata. Clients that accept the table format get
+    'data' as one header row of column names and an array of value rows.
 
     Args:
         data (Union[List[Tuple], Tuple, None]): The list of data records.
@@ -123,49 +357,96 @@ def send_response(data: Union[List[Tuple], Tuple, None], page: int, limit: int,
         "totalItems": total_items,
         "totalPages": total_pages
     }
-    return jsonify(response), 200
+    return list_json_response(response, "data"), 200
 
-def execute_query(query: str, params: Optional[Union[tuple, list]] = None, fetch_one: bool = False):
+def execute_query(query: str, params: Optional[Union[tuple, list]] = None, fetch_one: bool = False, connection=None):
     """
     Executes a SQL query and returns the results.
-    Handles connection opening and closing for each query.
-    This version is optimized for read-only operations (SELECT statements).
+    Handles connection opening and closing for each query unless a connection is passed in.
+    This version is optimized for read-only operations (SELECT statements)
+    and is served by a read replica when one is configured.
 
     Args:
         query (str): The SQL query string to execute.
         params (Optional[Union[tuple, list]]): Parameters to be safely passed to the query.
         fetch_one (bool): If True, fetches only one row; otherwise, fetches all rows.
+        connection: Optional open connection to run on; the caller keeps ownership of it.
 
     Returns:
         Union[dict, list, None]: Query result (dictionary for single row, list of dictionaries for multiple rows,
                                       or None on error).
     """
-    connection = None
-    cursor = None
+    owns_connection = connection is None
     try:
-        connection = get_db_connection()
+        if owns_connection:
+            connection = get_db_connection(read_only=True)
         if not connection:
             print("Database connection error in execute_query.")
             return None
-        cursor = connection.cursor(dictionary=True) # dictionary=True returns rows as dictionaries
-        cursor.execute(query, params)
+        # Prepared once per pooled connection and reused (see run_statement)
+        rows = run_statement(connection, query, params).rows
         # Since this function is for read-only context, we only expect SELECT queries.
         if fetch_one:
-            return cursor.fetchone()
-        return cursor.fetchall()
+            return rows[0] if rows else None
+        return rows
     except Error as e:
         print(f"Error executing query: {e}")
         return None
     finally:
-        if cursor:
-            cursor.close()
-        close_db_connection(connection)
+        if owns_connection:
+            close_db_connection(connection)
+
+def parse_datetime_range(value: str, tz_name: Optional[str] = None) -> Tuple[datetime, datetime]:
+    """
+    Parses an ISO-8601 date or datetime into the UTC range [start, end) it denotes.
+    Timestamps are stored as naive UTC, so the returned datetimes are naive UTC too.
+
+    Args:
+        value (str): 'YYYY', 'YYYY-MM', 'YYYY-MM-DD' or a full ISO-8601 datetime,
+                     optionally with a 'Z' or '+HH:MM' offset.
+        tz_name (Optional[str]): IANA timezone for values without an offset. Defaults to UTC.
+
+    Returns:
+        tuple: (start, end) where end is exclusive.
+
+    Raises:
+        ValueError: If the value or timezone cannot be parsed.
+    """
+    try:
+        local_tz = ZoneInfo(tz_name) if tz_name else timezone.utc
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown timezone '{tz_name}'.")
+
+    value = str(value).strip()
+    if len(value) == 4 and value.isdigit():
+        start = datetime(int(value), 1, 1)
+        end = datetime(start.year + 1, 1, 1)
+    elif len(value) == 7 and value[4] == '-':
+        start = datetime.strptime(value, '%Y-%m')
+        end = datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+    elif len(value) == 10:
+        start = datetime.strptime(value, '%Y-%m-%d')
+        end = start + timedelta(days=1)
+    else:
+        start = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        end = start + (timedelta(seconds=1) if start.microsecond == 0 else timedelta(microseconds=1))
+
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=local_tz)
+        end = end.replace(tzinfo=local_tz)
+    return (
+        start.astimezone(timezone.utc).replace(tzinfo=None),
+        end.astimezone(timezone.utc).replace(tzinfo=None)
+    )
 
 def get_entity_list(
     data: dict,
     table_name: str,
     search_fields_mapping: dict,
-    select_columns: List[str]
+    select_columns: List[str],
+    order_by: List[str] = DEFAULT_LIST_ORDER,
+    watermarks: Optional[List[str]] = None,
+    sharded: bool = False
 ):
     """
     Generic function to fetch a paginated and filterable list of entities from a database table.
@@ -178,6 +459,14 @@ def get_entity_list(
                                       Example: {'id_search': {'db_column': 'id', 'type': 'int'},
                                                 'username_search': {'db_column': 'username', 'type': 'string', 'comparison': 'like'}}
         select_columns (List[str]): A list of column names to select from the table.
+        order_by (List[str]): ORDER BY terms; must end with a unique column so paging is stable.
+                              Datetime filters may be combined with an optional 'timezone'
+                              (IANA name) in the request data for values without an offset.
+        watermarks (List[str]): Passed to get_list_etag when table_name is not a plain
+                              table or other tables affect the list.
+        sharded (bool): True for tables partitioned by env_id. Without an 'env_id' filter
+                              every shard is queried and the pages are merged in order_by
+                              order; the order_by columns must be selected.
 
     Returns:
         tuple: (response, status_code)
@@ -212,11 +501,22 @@ def get_entity_list(
                     query_params.append(int_value)
                     count_params.append(int_value)
                 elif param_type == 'datetime':
-                    # For datetime, use LIKE comparison on text representation
-                    # Adjust for specific DB if not PostgreSQL (e.g., CAST for MySQL)
-                    where_clauses.append(f"{db_column}::text LIKE %s")
-                    query_params.append(f"%{search_value}%")
-                    count_params.append(f"%{search_value}%")
+                    # Plain range predicates on the raw column so an index on it can be used
+                    try:
+                        start, end = parse_datetime_range(search_value, data.get('timezone'))
+                    except ValueError as e:
+                        return jsonify({"error": f"Invalid '{param_name}' parameter. Must be an ISO-8601 date or datetime. {e}"}), 400
+                    if comparison == 'from':
+                        where_clauses.append(f"{db_column} >= %s")
+                        range_params = [start]
+                    elif comparison == 'to':
+                        where_clauses.append(f"{db_column} < %s")
+                        range_params = [end]
+                    else:
+                        where_clauses.append(f"{db_column} >= %s AND {db_column} < %s")
+                        range_params = [start, end]
+                    query_params.extend(range_params)
+                    count_params.extend(range_params)
                 else: # Default to string type, use LIKE for partial match unless comparison is '='
                     if comparison == 'like':
                         where_clauses.append(f"{db_column} LIKE %s")
@@ -237,18 +537,125 @@ def get_entity_list(
         base_select_query += where_string
         base_count_query += where_string
 
-    # Add LIMIT and OFFSET for pagination to the select query
-    select_query = f"{base_select_query} LIMIT %s OFFSET %s"
+    # Add ORDER BY, LIMIT and OFFSET for pagination to the select query
+    select_query = f"{base_select_query} ORDER BY {', '.join(order_by)} LIMIT %s OFFSET %s"
+
+    shards = shards_for_query(data.get('env_id')) if sharded else [DEFAULT_SHARD]
+    if len(shards) > 1:
+        def shard_queries(shard):
+            # Every shard returns its first offset + limit rows of the applications it owns;
+            # the merged page is cut from those
+            clauses, params = list(where_clauses), list(count_params)
+            ownership, ownership_params = ownership_filter(shard)
+            if ownership:
+                clauses.append(ownership)
+                params.extend(ownership_params)
+            where_string = " WHERE " + " AND ".join(clauses) if clauses else ""
+            return (
+                f"SELECT {select_cols_str} FROM {table_name}{where_string} ORDER BY {', '.join(order_by)} LIMIT %s OFFSET 0",
+                params + [offset + limit],
+                f"SELECT COUNT(*) AS total FROM {table_name}{where_string}",
+                params
+            )
+
+        try:
+            result = get_sharded_list_page(shards, table_name, data, watermarks, shard_queries, order_by)
+        except (Error, RuntimeError) as e:
+            print(f"Error querying shards for {table_name}: {e}")
+            result = None
+        if result is None:
+            return jsonify({"error": "Failed to retrieve data from database. Check database connection and queries."}), 500
+        etag, entity_data, total_items = result
+        if entity_data is None:
+            return not_modified_response(etag)
+        entity_data = entity_data[offset:offset + limit]
+        return list_response(entity_data, page, limit, total_items, etag)
+
     query_params.extend([limit, offset])
 
-    # Execute queries
-    entity_data = execute_query(select_query, query_params)
-    total_count_result = execute_query(base_count_query, count_params, fetch_one=True)
+    # Execute queries on one connection: with autocommit off they share a consistent snapshot,
+    # so the watermark in the ETag always describes the data that is sent
+    connection = get_db_connection(read_only=True, shard=shards[0])
+    if not connection:
+        return jsonify({"error": "Failed to retrieve data from database. Check database connection and queries."}), 500
+    try:
+        with span("db.list_watermark"):
+            etag = get_list_etag(connection, table_name, data, watermarks)
+        if etag and request.if_none_match.contains_weak(etag):
+            return not_modified_response(etag)
+        with span("db.list_page"):
+            entity_data = execute_query(select_query, query_params, connection=connection)
+        with span("db.list_count"):
+            total_count_result = execute_query(base_count_query, count_params, fetch_one=True, connection=connection)
+    finally:
+        close_db_connection(connection)
 
     if entity_data is None or total_count_result is None:
         return jsonify({"error": "Failed to retrieve data from database. Check database connection and queries."}), 500
 
-    total_items = total_count_result['total']
+    return list_response(entity_data, page, limit, total_count_result['total'], etag)
+
+def _merge_order_key(term: str):
+    # 'createdAt DESC' -> ('createdAt', True); NULLs sort first ascending, as in MySQL
+    column, _, direction = term.partition(' ')
+    return column, direction.strip().upper() == 'DESC'
+
+def get_sharded_list_page(shards: List[str], table_name: str, data: dict, watermarks, shard_queries, order_by: List[str]):
+    """
+    Runs a list request on every shard and merges the results. Each shard's watermark, page
+    and count come from one connection, as for a single database; the ETag combines the
+    shards' validators and the shard map.
+
+    Args:
+        shard_queries (callable): Returns (page_query, page_params, count_query, count_params)
+                            for a shard; the page query selects the first offset + limit rows.
+
+    Returns:
+        Optional[tuple]: (etag, rows, total_items) with rows sorted by order_by, or
+                         (etag, None, None) when If-None-Match still matches; None on error.
+    """
+    connections = {}
+
+    def open_and_watermark(shard):
+        connection = get_db_connection(read_only=True, shard=shard)
+        if not connection:
+            raise RuntimeError(f"Failed to connect to shard '{shard}'.")
+        connections[shard] = connection
+        return get_list_etag(connection, table_name, data, watermarks)
+
+    def page_and_count(shard):
+        page_query, page_params, count_query, count_params = shard_queries(shard)
+        return (
+            execute_query(page_query, page_params, connection=connections[shard]),
+            execute_query(count_query, count_params, fetch_one=True, connection=connections[shard])
+        )
+
+    try:
+        with span("db.list_watermark"):
+            shard_etags = scatter(open_and_watermark, shards)
+        etag = None
+        if all(shard_etags.values()):
+            etag = build_etag(*(f"{shard}:{shard_etags[shard]}" for shard in shards), shard_map_version())
+            if request.if_none_match.contains_weak(etag):
+                return etag, None, None
+        with span("db.list_page"):
+            results = scatter(page_and_count, shards)
+    finally:
+        for connection in connections.values():
+            close_db_connection(connection)
+
+    if any(rows is None or count is None for rows, count in results.values()):
+        return None
+    merged = [row for rows, _ in results.values() for row in rows]
+    # Stable sorts from the last term to the first give the combined ORDER BY
+    for column, descending in reversed([_merge_order_key(term) for term in order_by]):
+        merged.sort(key=lambda row: (row[column] is not None, row[column]), reverse=descending)
+    return etag, merged, sum(count['total'] for _, count in results.values())
+
+def list_response(entity_data: list, page: int, limit: int, total_items: int, etag: Optional[str]):
+    """
+    Serializes a list page with its pagination metadata and validator.
+    """
     total_pages = (total_items + limit - 1) // limit # Ceiling division
 
     # Ensure DateTime objects are converted to strings for JSON serialization
@@ -261,13 +668,16 @@ def get_entity_list(
                     # If it's not a datetime object, leave as is or handle appropriately
                     pass
 
-    return send_response(
+    response, status_code = send_response(
         data=entity_data,
         page=page,
         limit=limit,
         total_items=total_items,
         total_pages=total_pages
     )
+    if etag:
+        with_etag(response, etag)
+    return response, status_code
 
 # --- Specific List Service Functions ---
 
@@ -295,11 +705,27 @@ def get_documents_list_service(data: dict):
         'ref_id': {'db_column': 'ref_id', 'type': 'string', 'comparison': 'like'},
         'module_id': {'db_column': 'module_id', 'type': 'int'},
         'status': {'db_column': 'status', 'type': 'string', 'comparison': '='},
-        'created_at': {'db_column': 'createdAt', 'type': 'datetime'}, # Note: using 'createdAt' for DB column
-        'updated_at': {'db_column': 'updatedAt', 'type': 'datetime'}  # Note: using 'updatedAt' for DB column
+        **DATETIME_SEARCH_FIELDS
     }
     select_cols = ['id', 'env_id', 'type', 'parent_id', 'ref_id', 'module_id', 'status', 'createdAt', 'updatedAt']
-    return get_entity_list(data, 'ds_document', search_fields, select_cols)
+    # 'archived': 'exclude' (default) lists ds_document, 'only' the archive, 'include' both
+    archived = str(data.get('archived') or 'exclude').lower()
+    if archived not in ARCHIVED_LIST_MODES:
+        return jsonify({"error": "Invalid 'archived' parameter. Must be 'exclude', 'include' or 'only'."}), 400
+    if archived == 'exclude':
+        table_name = 'ds_document'
+        select_cols = select_cols + ['0 AS archived']
+    elif archived == 'only':
+        table_name = ARCHIVE_TABLE
+        select_cols = select_cols + ['1 AS archived']
+    else:
+        union_cols = ", ".join(select_cols)
+        table_name = (f"(SELECT {union_cols}, 0 AS archived FROM ds_document"
+                      f" UNION ALL SELECT {union_cols}, 1 AS archived FROM {ARCHIVE_TABLE}) AS documents")
+        select_cols = select_cols + ['archived']
+    # Archiving and restoring move rows between the tables, so every mode watches both
+    watermarks = ['ds_document', ARCHIVE_TABLE]
+    return get_entity_list(data, table_name, search_fields, select_cols, watermarks=watermarks, sharded=True)
 
 def get_access_logs_list_service(data: dict):
     """Service function to get a list of access logs with pagination and search."""
@@ -309,11 +735,10 @@ def get_access_logs_list_service(data: dict):
         'url': {'db_column': 'url', 'type': 'string', 'comparison': 'like'},
         'method': {'db_column': 'method', 'type': 'string', 'comparison': 'like'},
         'status': {'db_column': 'status', 'type': 'string', 'comparison': '='},
-        'created_at': {'db_column': 'createdAt', 'type': 'datetime'},
-        'updated_at': {'db_column': 'updatedAt', 'type': 'datetime'}
+        **DATETIME_SEARCH_FIELDS
     }
     select_cols = ['id', 'env_id', 'url', 'method', 'status', 'createdAt', 'updatedAt']
-    return get_entity_list(data, 'ds_access_log', search_fields, select_cols)
+    return get_entity_list(data, 'ds_access_log', search_fields, select_cols, sharded=True)
 
 def get_document_master_list_service(data: dict):
     """Service function to get a list of document master entries with pagination and search."""
@@ -323,8 +748,7 @@ def get_document_master_list_service(data: dict):
         'module_id': {'db_column': 'module_id', 'type': 'int'},
         'type': {'db_column': 'type', 'type': 'string', 'comparison': 'like'},
         'status': {'db_column': 'status', 'type': 'string', 'comparison': '='},
-        'created_at': {'db_column': 'createdAt', 'type': 'datetime'},
-        'updated_at': {'db_column': 'updatedAt', 'type': 'datetime'}
+        **DATETIME_SEARCH_FIELDS
     }
     select_cols = ['id', 'env_id', 'module_id', 'type', 'status', 'createdAt', 'updatedAt']
     return get_entity_list(data, 'ds_document_master', search_fields, select_cols)
@@ -336,8 +760,7 @@ def get_app_configs_list_service(data: dict):
         'env': {'db_column': 'env', 'type': 'string', 'comparison': 'like'},
         'code': {'db_column': 'code', 'type': 'string', 'comparison': 'like'},
         'app_api_config': {'db_column': 'app_api_config', 'type': 'string', 'comparison': 'like'},
-        'created_at': {'db_column': 'createdAt', 'type': 'datetime'}, # Assuming 'createdAt' in DB
-        'updated_at': {'db_column': 'updatedAt', 'type': 'datetime'}  # Assuming 'updatedAt' in DB
+        **DATETIME_SEARCH_FIELDS
     }
     select_cols = ['id', 'env', 'code', 'app_api_config', 'createdAt', 'updatedAt']
     return get_entity_list(data, 'ds_application_config', search_fields, select_cols)
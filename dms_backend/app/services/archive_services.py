@@ -0,0 +1,209 @@
+import os
+import time
+import threading
+from datetime import datetime, timedelta
+from mysql.connector import Error
+from app.database import get_db_connection, get_db_cursor, close_db_connection, get_replica_lags, DEFAULT_SHARD, shard_names
+from app.utils import metrics
+from app.schema import register_hot_query
+
+# Soft-deleted documents are archived once their deletion (deletedAt), and their restore from
+# the archive if any (restoredAt), are this many days old
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+# Seconds between archiver passes; 0 turns the background archiver off
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+# Rows moved per second at most, so replicas can keep up; 0 means unlimited
+ARCHIVE_MAX_ROWS_PER_SECOND = float(os.getenv("ARCHIVE_MAX_ROWS_PER_SECOND", "1000"))
+# Batches wait while any replica is further behind than this
+ARCHIVE_MAX_REPLICA_LAG_SECONDS = float(os.getenv("ARCHIVE_MAX_REPLICA_LAG_SECONDS", "10"))
+ARCHIVE_LAG_POLL_SECONDS = 5
+ARCHIVE_LOCK_NAME = "dms_document_archiver"
+MAX_RESTORE_IDS = 1000
+
+ARCHIVE_TABLE = "ds_document_archive"
+
+ARCHIVABLE_DOCUMENTS_QUERY = register_hot_query("archivable documents", """
+    SELECT id FROM ds_document
+    WHERE deleted = 1 AND deletedAt < %s AND (restoredAt IS NULL OR restoredAt < %s)
+    ORDER BY deletedAt, id
+    LIMIT %s
+""", (datetime(2000, 1, 1), datetime(2000, 1, 1), 500))
+
+
+def _wait_for_replicas(max_lag_seconds):
+    # A lag that cannot be read does not block archiving
+    while True:
+        lagging = {name: lag for name, lag in get_replica_lags().items() if lag is not None and lag > max_lag_seconds}
+        if not lagging:
+            return
+        metrics.incr("archive.lag_waits")
+        print(f"Archiver waiting for replicas to catch up: {lagging}")
+        time.sleep(ARCHIVE_LAG_POLL_SECONDS)
+
+
+def _archive_batch(conn, cursor, cutoff, batch_size):
+    cursor.execute(ARCHIVABLE_DOCUMENTS_QUERY, (cutoff, cutoff, batch_size))
+    ids = [row['id'] for row in cursor.fetchall()]
+    if not ids:
+        conn.commit()
+        return 0
+    placeholders = ", ".join(["%s"] * len(ids))
+    # The locking read keeps the rows from changing between the copy and the delete
+    cursor.execute(f"SELECT id FROM ds_document WHERE id IN ({placeholders}) AND deleted = 1 FOR UPDATE", ids)
+    ids = [row['id'] for row in cursor.fetchall()]
+    if not ids:
+        conn.commit()
+        return 0
+    placeholders = ", ".join(["%s"] * len(ids))
+    cursor.execute(f"""
+        INSERT INTO {ARCHIVE_TABLE}
+        SELECT d.*, UTC_TIMESTAMP() FROM ds_document d WHERE d.id IN ({placeholders})
+    """, ids)
+    cursor.execute(f"DELETE FROM ds_document WHERE id IN ({placeholders})", ids)
+    conn.commit()
+    return len(ids)
+
+
+def archive_deleted_documents(older_than_days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE,
+                              max_rows_per_second=ARCHIVE_MAX_ROWS_PER_SECOND,
+                              max_replica_lag_seconds=ARCHIVE_MAX_REPLICA_LAG_SECONDS, max_rows=None, shard=DEFAULT_SHARD):
+    """
+    Moves soft-deleted ds_document rows whose deletion is older than older_than_days into
+    ds_document_archive, oldest first, one batch per transaction. Batches are paced to
+    max_rows_per_second and, on the default shard, wait while a replica lags more than
+    max_replica_lag_seconds. Only one archiver runs at a time per shard across processes
+    (MySQL named lock).
+
+    Args:
+        max_rows (int): Stop after about this many rows; None archives everything eligible.
+        shard (str): The shard to archive on.
+
+    Returns:
+        int: The number of rows archived, or None if another archiver holds the lock.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    conn = get_db_connection(shard=shard)
+    if not conn:
+        raise RuntimeError(f"Failed to connect to the database shard '{shard}' for archiving.")
+    cursor = get_db_cursor(conn)
+    archived = 0
+    # Lock names are per server and shards may share one
+    lock_name = f"{ARCHIVE_LOCK_NAME}:{shard}"
+    try:
+        cursor.execute("SELECT GET_LOCK(%s, 0) AS acquired", (lock_name,))
+        if not cursor.fetchone()['acquired']:
+            return None
+        try:
+            while max_rows is None or archived < max_rows:
+                if shard == DEFAULT_SHARD:
+                    _wait_for_replicas(max_replica_lag_seconds)
+                started = time.monotonic()
+                try:
+                    moved = _archive_batch(conn, cursor, cutoff, batch_size)
+                except Error:
+                    conn.rollback()
+                    raise
+                if not moved:
+                    break
+                archived += moved
+                metrics.incr("archive.archived", moved)
+                if max_rows_per_second > 0:
+                    time.sleep(max(0.0, moved / max_rows_per_second - (time.monotonic() - started)))
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (lock_name,))
+            cursor.fetchall()
+        return archived
+    finally:
+        close_db_connection(conn, cursor)
+
+
+def restore_archived_documents(ids):
+    """
+    Moves archived rows back into ds_document on whichever shard holds them. They come back
+    as they were archived (still soft deleted, since their files were removed on delete) with
+    updatedAt set to now, so admin list validators change, and restoredAt set to now, so the
+    archiver waits another ARCHIVE_AFTER_DAYS before moving them again. deletedAt is kept.
+
+    Args:
+        ids (list): Document ids, at most MAX_RESTORE_IDS.
+
+    Returns:
+        tuple: (response_dict, status_code)
+    """
+    try:
+        ids = sorted({int(document_id) for document_id in ids})
+    except (TypeError, ValueError):
+        return {"error": "'ids' must be a list of integers."}, 400
+    if not ids:
+        return {"error": "'ids' must not be empty."}, 400
+    if len(ids) > MAX_RESTORE_IDS:
+        return {"error": f"At most {MAX_RESTORE_IDS} ids can be restored at once."}, 400
+
+    found = []
+    for shard in shard_names():
+        shard_found = _restore_on_shard(shard, ids)
+        if shard_found is None:
+            return {"error": "Failed to restore archived documents."}, 500
+        found.extend(shard_found)
+    found.sort()
+    metrics.incr("archive.restored", len(found))
+    return {"restored": found, "notFound": sorted(set(ids) - set(found))}, 200
+
+
+def _restore_on_shard(shard, ids):
+    # Returns the restored ids, or None on failure
+    conn = get_db_connection(shard=shard)
+    if not conn:
+        print(f"ERROR: Failed to connect to shard '{shard}' to restore archived documents.")
+        return None
+    cursor = get_db_cursor(conn)
+    placeholders = ", ".join(["%s"] * len(ids))
+    try:
+        cursor.execute(f"SELECT id FROM {ARCHIVE_TABLE} WHERE id IN ({placeholders}) FOR UPDATE", ids)
+        found = [row['id'] for row in cursor.fetchall()]
+        if found:
+            found_placeholders = ", ".join(["%s"] * len(found))
+            cursor.execute("SHOW COLUMNS FROM ds_document")
+            columns = ", ".join(f"`{row['Field']}`" for row in cursor.fetchall() if row['Field'] not in ("updatedAt", "restoredAt"))
+            cursor.execute(f"""
+                INSERT INTO ds_document ({columns}, updatedAt, restoredAt)
+                SELECT {columns}, UTC_TIMESTAMP(), UTC_TIMESTAMP() FROM {ARCHIVE_TABLE} WHERE id IN ({found_placeholders})
+            """, found)
+            cursor.execute(f"DELETE FROM {ARCHIVE_TABLE} WHERE id IN ({found_placeholders})", found)
+        conn.commit()
+    except Error as e:
+        conn.rollback()
+        print(f"ERROR: Failed to restore archived documents on shard '{shard}': {e}")
+        return None
+    finally:
+        close_db_connection(conn, cursor)
+    return found
+
+
+def run_document_archiver():
+    """
+    Archiver loop: one full pass over every shard every ARCHIVE_INTERVAL_SECONDS.
+    """
+    while True:
+        time.sleep(ARCHIVE_INTERVAL_SECONDS)
+        for shard in shard_names():
+            try:
+                archived = archive_deleted_documents(shard=shard)
+                if archived:
+                    print(f"Archived {archived} soft-deleted document(s) on shard '{shard}'.")
+            except Exception as e:
+                metrics.incr("archive.failures")
+                print(f"WARNING: Document archiver pass failed on shard '{shard}': {e}")
+
+
+def start_document_archiver():
+    """
+    Starts the background archiver unless ARCHIVE_INTERVAL_SECONDS is 0. Every worker
+    process may start one; the named lock lets a single pass run at a time.
+    """
+    if ARCHIVE_INTERVAL_SECONDS <= 0:
+        return None
+    thread = threading.Thread(target=run_document_archiver, name="document-archiver", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,244 @@
+import os
+import gzip
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from mysql.connector import Error
+from app.database import get_db_connection, get_db_cursor, close_db_connection, DEFAULT_SHARD
+from app.storage import get_storage_for_path
+from app.services.stats_services import record_stored_size_change
+
+COMPRESSION_POLICIES = ("none", "always", "min_savings")
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSED_SUFFIX = ".gz"
+
+COPY_BUFFER_SIZE = 64 * 1024
+# Compressed output is kept in memory up to this size and spills to a temp file beyond it.
+SPOOL_MAX_SIZE = 1024 * 1024
+
+
+def compress_stream(source):
+    """
+    Gzips a binary stream in one streaming pass.
+
+    Returns:
+        tuple: (compressed_file, original_size, compressed_size), with compressed_file
+               rewound and owned by the caller.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    original_size = 0
+    with gzip.GzipFile(fileobj=spool, mode="wb", compresslevel=COMPRESSION_GZIP_LEVEL, mtime=0) as gz:
+        while True:
+            chunk = source.read(COPY_BUFFER_SIZE)
+            if not chunk:
+                break
+            gz.write(chunk)
+            original_size += len(chunk)
+    compressed_size = spool.tell()
+    spool.seek(0)
+    return spool, original_size, compressed_size
+
+
+def should_store_compressed(policy, min_savings_percent, original_size, compressed_size):
+    if policy == "always":
+        return True
+    if policy == "min_savings":
+        return original_size > 0 and (original_size - compressed_size) * 100 >= min_savings_percent * original_size
+    return False
+
+
+def store_document_file(storage, source, directory, filename, rules):
+    """
+    Stores an upload, gzipping it first when the document master's policy asks for it.
+
+    Args:
+        storage: The storage backend to write to.
+        source: Seekable binary stream positioned at the start of the upload.
+        directory (str): Target directory from build_document_location.
+        filename (str): Unique stored file name; '.gz' is appended when compressed.
+        rules (dict): Parsed master rules with 'compression_policy' and 'compression_min_savings'.
+
+    Returns:
+        tuple: (path, original_size, stored_size, content_encoding) where content_encoding
+               is 'gzip' or None.
+    """
+    policy = rules.get("compression_policy") or "none"
+    if policy != "none":
+        spool, original_size, compressed_size = compress_stream(source)
+        with spool:
+            if should_store_compressed(policy, rules.get("compression_min_savings") or 0, original_size, compressed_size):
+                path, stored_size = storage.save(spool, directory, filename + COMPRESSED_SUFFIX)
+                return path, original_size, stored_size, "gzip"
+        source.seek(0)
+    path, size = storage.save(source, directory, filename)
+    return path, size, size, None
+
+
+def open_document_content(path, content_encoding, decompress=True):
+    """
+    Opens a stored document for reading. Compressed files are decompressed on the fly
+    unless decompress is False (e.g. to pass gzip through to a client that accepts it).
+    """
+    stream = get_storage_for_path(path).open(path)
+    if content_encoding == "gzip" and decompress:
+        return gzip.GzipFile(fileobj=stream, mode="rb")
+    return stream
+
+
+def _recompress_document(row):
+    """
+    Writes a gzipped copy of one local document next to the original. Returns (row, result)
+    where result is (new_path, stored_size, original_size), or None if the policy says to
+    keep it raw.
+    """
+    with open(row['filepath'], "rb") as source:
+        spool, original_size, compressed_size = compress_stream(source)
+    with spool:
+        if not should_store_compressed(row['compression_policy'], row['compression_min_savings'], original_size, compressed_size):
+            return row, None
+        target = row['filepath'] + COMPRESSED_SUFFIX
+        tmp_path = target + ".tmp"
+        with open(tmp_path, "wb") as out:
+            shutil.copyfileobj(spool, out, COPY_BUFFER_SIZE)
+        os.replace(tmp_path, target)
+    return row, (target, compressed_size, original_size)
+
+
+def _remove_file(path):
+    # The file may already be gone (deleted or moved by a concurrent job)
+    try:
+        os.remove(path)
+    except OSError as e:
+        print(f"WARNING: Could not remove {path}: {e}")
+
+
+def _move_previews(old_path, new_path):
+    # Thumbnails and previews are named after the stored file
+    from app.services.preview_services import thumbnail_path, preview_path
+    for derivative in (thumbnail_path, preview_path):
+        if os.path.exists(derivative(old_path)):
+            try:
+                os.replace(derivative(old_path), derivative(new_path))
+            except OSError as e:
+                print(f"WARNING: Could not move {derivative(old_path)}: {e}")
+
+
+def _active_compression_policies():
+    # ds_document_master stays on the primary; documents may be on another shard
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("Failed to connect to the database for recompression.")
+    cursor = get_db_cursor(conn)
+    try:
+        cursor.execute("""
+            SELECT env_id, module_id, type, compression_policy, compression_min_savings
+            FROM ds_document_master
+            WHERE deleted = 0 AND status = 'active' AND compression_policy <> 'none'
+        """)
+        return {(row['env_id'], row['module_id'], row['type']): row for row in cursor.fetchall()}
+    finally:
+        close_db_connection(conn, cursor)
+
+
+def recompress_documents(workers=4, batch_size=200, dry_run=False, shard=DEFAULT_SHARD):
+    """
+    Compresses existing uncompressed local documents on a shard whose document master now
+    has a compression policy. Works in id order; each batch's row updates are committed
+    before the original files are removed, so a failure never loses a readable copy.
+    filesize is set to the measured original size (downloads send it as Content-Length
+    of the decompressed body), and thumbnails and previews follow the file to its new name.
+
+    A row that was deleted or moved (e.g. by a reshard) while its copy was written is left
+    alone: its compressed copy is removed and it counts as 'skipped'.
+
+    Returns:
+        dict: Counts of 'compressed', 'kept' (not worth compressing), 'skipped' and 'failed'
+              documents.
+    """
+    stats = {"compressed": 0, "kept": 0, "skipped": 0, "failed": 0}
+    policies = _active_compression_policies()
+    if not policies:
+        return stats
+    scopes = ", ".join(["(%s, %s, %s)"] * len(policies))
+    scope_params = [value for scope in policies for value in scope]
+    last_id = 0
+    conn = get_db_connection(shard=shard)
+    if not conn:
+        raise RuntimeError(f"Failed to connect to the database shard '{shard}' for recompression.")
+    cursor = get_db_cursor(conn)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while True:
+                cursor.execute(f"""
+                    SELECT d.id, d.filepath, d.env_id, d.module_id, d.type, d.filesize,
+                           COALESCE(d.stored_size, d.filesize) AS stored_size
+                    FROM ds_document d
+                    WHERE d.id > %s AND d.deleted = 0 AND d.content_encoding IS NULL
+                      AND (d.env_id, d.module_id, d.type) IN ({scopes}) AND d.filepath NOT LIKE 's3://%%'
+                    ORDER BY d.id
+                    LIMIT %s
+                """, [last_id] + scope_params + [batch_size])
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1]['id']
+                for row in rows:
+                    policy = policies[(row['env_id'], row['module_id'], row['type'])]
+                    row['compression_policy'] = policy['compression_policy']
+                    row['compression_min_savings'] = policy['compression_min_savings']
+                if dry_run:
+                    stats["compressed"] += len(rows)
+                    continue
+
+                def attempt(row):
+                    try:
+                        return _recompress_document(row)
+                    except OSError as e:
+                        print(f"ERROR: Could not compress document {row['id']}: {e}")
+                        return row, False
+
+                done = []
+                for row, result in pool.map(attempt, rows):
+                    if result is False:
+                        stats["failed"] += 1
+                    elif result is None:
+                        stats["kept"] += 1
+                    else:
+                        done.append((row, result))
+                if not done:
+                    continue
+                matched, unmatched = [], []
+                try:
+                    for row, result in done:
+                        path, stored_size, original_size = result
+                        # Only rows still live at the path that was compressed
+                        cursor.execute(
+                            "UPDATE ds_document SET filepath = %s, filesize = %s, stored_size = %s, content_encoding = 'gzip' "
+                            "WHERE id = %s AND filepath = %s AND deleted = 0",
+                            (path, original_size, stored_size, row['id'], row['filepath'])
+                        )
+                        if cursor.rowcount:
+                            record_stored_size_change(cursor, row, row['stored_size'], stored_size,
+                                                      original_size - (row['filesize'] or 0))
+                            matched.append((row, path))
+                        else:
+                            unmatched.append(path)
+                    conn.commit()
+                except Error as e:
+                    conn.rollback()
+                    print(f"ERROR: Failed to record batch ending at id {last_id}: {e}")
+                    for row, (path, _, _) in done:
+                        _remove_file(path)
+                    stats["failed"] += len(done)
+                    continue
+                for path in unmatched:
+                    _remove_file(path)
+                for row, path in matched:
+                    _move_previews(row['filepath'], path)
+                    _remove_file(row['filepath'])
+                stats["compressed"] += len(matched)
+                stats["skipped"] += len(unmatched)
+                print(f"Recompressed up to document id {last_id}: {stats}")
+    finally:
+        close_db_connection(conn, cursor)
+    return stats
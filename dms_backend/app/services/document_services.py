@@ -1,9 +1,29 @@
 import os
+import time
 import uuid
 import json
+import threading
+import mimetypes
 from datetime import datetime, timezone
 from werkzeug.utils import secure_filename
-from app.database import get_db_connection, get_db_cursor, close_db_connection
+from app.database import get_db_connection, get_db_cursor, close_db_connection, mark_primary_write, run_statement
+from app.sharding import get_env_connection
+from app.schema import register_hot_query
+from app.utils.cache import create_result_cache
+from app.utils.events import create_event_broker
+from app.utils.journal import Journal
+from app.utils import metrics
+from app.utils.tracing import span, traced
+from app.storage import get_storage, get_storage_for_path
+from app.services.compression_services import store_document_file, open_document_content
+from app.services.stats_services import record_document_added, record_document_removed
+from app.services.preview_services import (
+    initial_preview_status,
+    schedule_previews,
+    remove_previews,
+    thumbnail_path,
+    preview_path
+)
 import mysql.connector
 import jwt
 from flask import current_app, request
@@ -11,8 +31,74 @@ from flask import current_app, request
 # Constants
 BASE_UPLOAD_FOLDER = "uploads/bioclaim/documents"
 
+# Listing cache: 'local' (per process), 'redis' (shared by all workers, see REDIS_URL) or 'off'
+DOCUMENT_LIST_CACHE = create_result_cache(
+    "document_list_cache",
+    os.getenv("DOCUMENT_LIST_CACHE_BACKEND", "local").lower(),
+    max_entries=int(os.getenv("DOCUMENT_LIST_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("DOCUMENT_LIST_CACHE_TTL_SECONDS", "60"))
+)
+
+# Parsed ds_document_master rules per (env, module, type); lets journaled uploads be
+# validated while the database is unavailable
+DOCUMENT_RULES_CACHE = create_result_cache(
+    "document_rules_cache",
+    os.getenv("DOCUMENT_RULES_CACHE_BACKEND", "local").lower(),
+    max_entries=256,
+    ttl=float(os.getenv("DOCUMENT_RULES_CACHE_TTL_SECONDS", "60"))
+)
+
+# Change feed of uploads and deletes per reference: 'local' (streams on this worker only),
+# 'redis' (shared by all workers, see REDIS_URL) or 'off'
+DOCUMENT_EVENTS = create_event_broker(os.getenv("EVENTS_BROKER", "local").lower())
+# A comment line is sent this often on idle streams so proxies keep them open and a
+# disconnected client is noticed
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+# Streams end after this long; the client reconnects with Last-Event-ID
+EVENTS_MAX_STREAM_SECONDS = float(os.getenv("EVENTS_MAX_STREAM_SECONDS", "300"))
+# Open streams per worker process at most
+EVENTS_MAX_STREAMS = int(os.getenv("EVENTS_MAX_STREAMS", "200"))
+EVENTS_RETRY_MILLISECONDS = 3000
+_open_streams = 0
+_open_streams_lock = threading.Lock()
+
+# Upload metadata journal: 'off', 'fallback' (journal only when the insert cannot be made)
+# or 'always' (acknowledge every upload once its metadata is journaled)
+UPLOAD_JOURNAL_MODE = os.getenv("UPLOAD_JOURNAL_MODE", "off").lower()
+UPLOAD_JOURNAL_DIR = os.getenv("UPLOAD_JOURNAL_DIR", "uploads/journal")
+UPLOAD_JOURNAL_BATCH_SIZE = int(os.getenv("UPLOAD_JOURNAL_BATCH_SIZE", "100"))
+UPLOAD_JOURNAL_INTERVAL_SECONDS = float(os.getenv("UPLOAD_JOURNAL_INTERVAL_SECONDS", "1"))
+UPLOAD_JOURNAL_RETRY_SECONDS = float(os.getenv("UPLOAD_JOURNAL_RETRY_SECONDS", "5"))
+UPLOAD_JOURNAL = Journal(UPLOAD_JOURNAL_DIR, "upload_metadata") if UPLOAD_JOURNAL_MODE != "off" else None
+
+# Hot queries; registered so their plans are checked at startup (see app/schema.py)
+DOCUMENT_MASTER_QUERY = register_hot_query("document master rule", """
+    SELECT allowed_extension, allowed_max_size, filepath, compression_policy, compression_min_savings
+    FROM ds_document_master
+    WHERE env_id = %s AND module_id = %s AND type = %s AND deleted = 0 AND status = 'active'
+""", (1, 1, "sample"))
+
+LIST_DOCUMENTS_QUERY = register_hot_query("document list", """
+    SELECT id, ref_id, type, original_filename, filename, filepath, filesize, extension, createdAt, status, preview_status
+    FROM ds_document
+    WHERE module_id = %s AND env_id = %s AND ref_id = %s AND deleted = 0
+""", (1, 1, "sample"))
+
+SELECT_DOCUMENT_QUERY = register_hot_query("document lookup", """
+    SELECT id, type, filepath, original_filename, extension, filesize, stored_size, content_encoding
+    FROM ds_document
+    WHERE id = %s AND module_id = %s AND env_id = %s AND ref_id = %s AND deleted = 0
+""", (1, 1, 1, "sample"))
+
+INSERT_DOCUMENT_QUERY = """
+    INSERT INTO ds_document
+    (env_id, parent_id, ref_id, module_id, type, filename, original_filename, filepath, filesize, stored_size, content_encoding, extension, preview_status, journal_id, createdBy, createdAt)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
 # --- Logging Functions (Moved from access_log_service.py) ---
 
+@traced("db.access_log")
 def log_api_access(url, method, request_body, response, status, ip, env_id=None, created_by=1):
     """
     Logs API access details to the ds_access_log table in the database.
@@ -30,13 +116,11 @@ def log_api_access(url, method, request_body, response, status, ip, env_id=None,
     conn = None
     cursor = None
     try:
-        conn = get_db_connection()
+        conn = get_env_connection(env_id)
         if not conn:
             print("ERROR: Failed to connect to database for access logging.")
             return False
 
-        cursor = get_db_cursor(conn)
-
         # Current timestamp
         now = datetime.now(timezone.utc)
 
@@ -60,7 +144,7 @@ def log_api_access(url, method, request_body, response, status, ip, env_id=None,
             datetime.utcnow(),
             created_by
         )
-        cursor.execute(insert_query, log_data)
+        run_statement(conn, insert_query, log_data)
         conn.commit()
 
     except Exception as e:
@@ -80,8 +164,8 @@ def log_api_operation(claims, request_context, response_data, request_body_log,
     request_method = request_context["method"]
     request_ip = request_context["ip"]
 
-    # Determine logging status
-    log_status = 'Success' if response_data.get("responseCode") == 200 else 'Failed'
+    # Determine logging status; journaled uploads answer 202 and are successes too
+    log_status = 'Success' if 200 <= (response_data.get("responseCode") or 0) < 300 else 'Failed'
 
     # Log the operation to ds_access_log
     log_api_access(
@@ -107,6 +191,7 @@ def allowed_file(filename, allowed_extensions_set):
     file_ext = filename.rsplit('.', 1)[1].lower()
     return file_ext in allowed_extensions_set
 
+@traced("jwt.decode")
 def decode_jwt_from_request():
     """
     Extracts and decodes the JWT token from the Authorization header.
@@ -148,10 +233,292 @@ def decode_jwt_from_request():
             "responseMessage": f"Server configuration error: {str(e)}"
         }
 
+def extract_upload_metadata(metadata):
+    """
+    Reads the upload metadata fields shared by direct and resumable uploads.
+
+    Returns:
+        tuple: ((file_type, module_id, env_id, ref_id, parent_id), error_response)
+    """
+    file_type = metadata.get("method")
+    module_id = metadata.get("module")
+    env_id = metadata.get("application_id")
+    ref_id = metadata.get("reference_id")
+    parent_id = metadata.get("parent_id")
+
+    if not all([file_type, module_id, env_id, ref_id]):
+        return None, {
+            "responseCode": 400,
+            "responseStatus": "error",
+            "responseMessage": "Missing required metadata fields: method, module, application_id, or reference_id."
+        }
+    return (file_type, module_id, env_id, ref_id, parent_id), None
+
+@traced("db.document_master")
+def get_document_master_rules(cursor, env_id, module_id, file_type):
+    """
+    Looks up the active ds_document_master rule for an upload and parses it.
+
+    Returns:
+        tuple: (rules, error_response) where rules holds 'extensions', 'max_size_kb',
+               'max_size_bytes', 'base_path', 'compression_policy' and
+               'compression_min_savings', and error_response is None on success.
+    """
+    cursor.execute(DOCUMENT_MASTER_QUERY, (env_id, module_id, file_type))
+    doc_master_config = cursor.fetchone()
+
+    if not doc_master_config:
+        return None, {
+            "responseCode": 404,
+            "responseStatus": "error",
+            "responseMessage": f"No document master configuration found for type '{file_type}' in module '{module_id}' and environment '{env_id}'."
+        }
+    return parse_document_master_rules(doc_master_config)
+
+def parse_document_master_rules(doc_master_config):
+    """
+    Parses a ds_document_master row into upload rules.
+
+    Returns:
+        tuple: (rules, error_response) as get_document_master_rules.
+    """
+    raw_allowed_extensions = doc_master_config['allowed_extension']
+    parsed_extensions = set()
+
+    try:
+        temp_list = json.loads(raw_allowed_extensions.replace("'", '"'))
+        if not isinstance(temp_list, list):
+            raise ValueError("allowed_extension is not a JSON list.")
+        for ext in temp_list:
+            clean_ext = str(ext).strip().lstrip('.').lower()
+            if clean_ext:
+                parsed_extensions.add(clean_ext)
+    except (json.JSONDecodeError, ValueError) as e:
+        return None, {
+            "responseCode": 500,
+            "responseStatus": "error",
+            "responseMessage": f"Invalid format for 'allowed_extension'. Error: {e}"
+        }
+
+    if not parsed_extensions:
+        return None, {
+            "responseCode": 500,
+            "responseStatus": "error",
+            "responseMessage": "Allowed_extension configuration is empty or invalid after parsing."
+        }
+
+    max_file_size_kb = doc_master_config['allowed_max_size']
+    return {
+        "extensions": parsed_extensions,
+        "max_size_kb": max_file_size_kb,
+        "max_size_bytes": max_file_size_kb * 1024,
+        "base_path": doc_master_config['filepath'].rstrip('/') if doc_master_config['filepath'] else BASE_UPLOAD_FOLDER,
+        "compression_policy": doc_master_config['compression_policy'],
+        "compression_min_savings": doc_master_config['compression_min_savings']
+    }, None
+
+def validate_upload_file(filename, size, rules):
+    """
+    Checks a file name and size against parsed master rules.
+    Returns an error response, or None if the file is acceptable.
+    """
+    if not allowed_file(filename, rules["extensions"]):
+        return {
+            "responseCode": 400,
+            "responseStatus": "error",
+            "responseMessage": f"File type not allowed. Allowed types: {', '.join(sorted(list(rules['extensions'])))}"
+        }
+
+    if size > rules["max_size_bytes"]:
+        return {
+            "responseCode": 400,
+            "responseStatus": "error",
+            "responseMessage": f"File size exceeds the maximum allowed size of {rules['max_size_kb']} KB."
+        }
+    return None
+
+def build_document_location(rules, file_type, filename):
+    """
+    Chooses where a new document is stored: a YYYY/MM/DD directory under the rule's base path
+    and a unique file name. The storage backend may add shard directories below it.
+
+    Returns:
+        tuple: (dynamic_path, unique_filename, file_ext, original_filename)
+    """
+    file_ext = filename.rsplit('.', 1)[1].lower()
+    original_filename = secure_filename(filename)
+    unique_filename = f"{file_type}_{str(uuid.uuid4())}.{file_ext}"
+
+    today = datetime.today()
+    dynamic_path = os.path.join(
+        rules["base_path"],
+        today.strftime("%Y"),
+        today.strftime("%m"),
+        today.strftime("%d")
+    )
+    return dynamic_path, unique_filename, file_ext, original_filename
+
+@traced("db.insert_document")
+def insert_document_record(cursor, document, user_id, journal_id=None):
+    """
+    Inserts a ds_document row and counts it in the stats aggregates; the caller commits and
+    then calls schedule_previews.
+
+    Args:
+        cursor: Cursor on a primary connection.
+        document (dict): env_id, parent_id, ref_id, module_id, type, filename,
+                         original_filename, filepath, filesize and extension, plus
+                         stored_size and content_encoding when stored compressed, and
+                         created_at when the upload happened earlier (journal replay).
+        user_id (int): The uploading user.
+        journal_id (str): Id of the upload journal record the row comes from, if any.
+
+    Returns:
+        int: The new document id.
+    """
+    created_at = document.get("created_at") or datetime.utcnow()
+    document_data = (
+        document["env_id"],
+        document["parent_id"],
+        document["ref_id"],
+        document["module_id"],
+        document["type"],
+        document["filename"],
+        document["original_filename"],
+        document["filepath"],
+        document["filesize"],
+        document.get("stored_size", document["filesize"]),
+        document.get("content_encoding"),
+        document["extension"],
+        initial_preview_status(document["filepath"], document["extension"]),
+        journal_id,
+        user_id,
+        created_at
+    )
+    cursor.execute(INSERT_DOCUMENT_QUERY, document_data)
+    document_id = cursor.lastrowid
+    record_document_added(cursor, document, created_at)
+    return document_id
+
+def get_cached_document_master_rules(env_id, module_id, file_type):
+    """
+    get_document_master_rules through DOCUMENT_RULES_CACHE, on a connection of its own.
+
+    Returns:
+        tuple: (rules, error_response) as get_document_master_rules.
+    """
+    def load():
+        conn = get_db_connection(read_only=True)
+        if not conn:
+            return (None, {
+                "responseCode": 500,
+                "responseStatus": "error",
+                "responseMessage": "Failed to connect to the database."
+            }), False
+        cursor = get_db_cursor(conn)
+        try:
+            rules, rules_error = get_document_master_rules(cursor, env_id, module_id, file_type)
+            return (rules, rules_error), rules_error is None
+        except mysql.connector.Error as e:
+            print(f"Database error: {e}")
+            return (None, {
+                "responseCode": 500,
+                "responseStatus": "error",
+                "responseMessage": f"Failed to read document master configuration: {str(e)}"
+            }), False
+        finally:
+            close_db_connection(conn, cursor)
+
+    if not DOCUMENT_RULES_CACHE:
+        return load()[0]
+    return DOCUMENT_RULES_CACHE.get_or_load(document_rules_cache_key(env_id, module_id, file_type), load)
+
+def document_rules_cache_key(env_id, module_id, file_type):
+    return f"{env_id}|{module_id}|{file_type}"
+
+def preload_document_master_rules(limit=256):
+    """
+    Fills DOCUMENT_RULES_CACHE with the active document master rules in one query.
+
+    Returns:
+        int: The number of rules cached.
+    """
+    if not DOCUMENT_RULES_CACHE:
+        return 0
+    conn = get_db_connection(read_only=True)
+    if not conn:
+        raise RuntimeError("Failed to connect to the database to preload document master rules.")
+    cursor = get_db_cursor(conn)
+    try:
+        cursor.execute("""
+            SELECT env_id, module_id, type, allowed_extension, allowed_max_size, filepath,
+                   compression_policy, compression_min_savings
+            FROM ds_document_master
+            WHERE deleted = 0 AND status = 'active'
+            ORDER BY id DESC
+            LIMIT %s
+        """, (limit,))
+        rows = cursor.fetchall()
+    finally:
+        close_db_connection(conn, cursor)
+    cached = 0
+    for row in rows:
+        rules, rules_error = parse_document_master_rules(row)
+        if rules_error is None:
+            DOCUMENT_RULES_CACHE.prime(document_rules_cache_key(row['env_id'], row['module_id'], row['type']), (rules, None))
+            cached += 1
+    return cached
+
+def upload_response(document_id, document):
+    return {
+        "responseCode": 200,
+        "responseStatus": "success",
+        "responseMessage": "Document uploaded successfully",
+        "responseData": {
+            "id": document_id,
+            "type": document["type"],
+            "name": document["original_filename"],
+            "path": document["filepath"],
+            "fileName": document["filename"]
+        },
+        "fileName": document["original_filename"]
+    }
+
+def journal_upload(document, user_id):
+    """
+    Durably records the metadata of a stored upload for the journal applier to insert.
+
+    Returns:
+        dict: A 202 response whose journalId identifies the upload until it is applied,
+              and afterwards through ds_document.journal_id.
+    """
+    journal_id = uuid.uuid4().hex
+    UPLOAD_JOURNAL.append({
+        "journal_id": journal_id,
+        "user_id": user_id,
+        "document": {**document, "created_at": datetime.utcnow().isoformat()}
+    })
+    metrics.incr("upload_journal.appended")
+    return {
+        "responseCode": 202,
+        "responseStatus": "success",
+        "responseMessage": "Document stored; metadata will be recorded shortly",
+        "responseData": {
+            "id": None,
+            "journalId": journal_id,
+            "type": document["type"],
+            "name": document["original_filename"],
+            "path": document["filepath"],
+            "fileName": document["filename"]
+        },
+        "fileName": document["original_filename"]
+    }
+
 def handle_file_upload(file, metadata_str, user_id):
     conn = None
     cursor = None
     file_path_on_disk = None
+    document = None
 
     decoded_token, token_error = decode_jwt_from_request()
     if token_error:
@@ -174,145 +541,82 @@ def handle_file_upload(file, metadata_str, user_id):
             "responseMessage": "Invalid JSON format in 'data'."
         }
 
-    file_type = metadata.get("method")
-    module_id = metadata.get("module")
-    env_id = metadata.get("application_id")
-    ref_id = metadata.get("reference_id")
-    parent_id = metadata.get("parent_id")
+    upload_fields, metadata_error = extract_upload_metadata(metadata)
+    if metadata_error:
+        return metadata_error
+    file_type, module_id, env_id, ref_id, parent_id = upload_fields
 
-    if not all([file_type, module_id, env_id, ref_id]):
-        return {
-            "responseCode": 400,
-            "responseStatus": "error",
-            "responseMessage": "Missing required metadata fields: method, module, application_id, or reference_id."
-        }
+    rules, rules_error = get_cached_document_master_rules(env_id, module_id, file_type)
+    if rules_error:
+        return rules_error
 
-    conn = get_db_connection()
-    if not conn:
-        return {
-            "responseCode": 500,
-            "responseStatus": "error",
-            "responseMessage": "Failed to connect to the database."
-        }
-    cursor = get_db_cursor(conn)
+    validation_error = validate_upload_file(file.filename, file.content_length, rules)
+    if validation_error:
+        return validation_error
 
-    try:
-        query_master = """
-            SELECT allowed_extension, allowed_max_size, filepath
-            FROM ds_document_master
-            WHERE env_id = %s AND module_id = %s AND type = %s AND deleted = 0 AND status = 'active'
-        """
-        cursor.execute(query_master, (env_id, module_id, file_type))
-        doc_master_config = cursor.fetchone()
-
-        if not doc_master_config:
-            return {
-                "responseCode": 404,
-                "responseStatus": "error",
-                "responseMessage": f"No document master configuration found for type '{file_type}' in module '{module_id}' and environment '{env_id}'."
-            }
-
-        raw_allowed_extensions = doc_master_config['allowed_extension']
-        parsed_extensions = set()
-
-        try:
-            temp_list = json.loads(raw_allowed_extensions.replace("'", '"'))
-            if not isinstance(temp_list, list):
-                raise ValueError("allowed_extension is not a JSON list.")
-            for ext in temp_list:
-                clean_ext = str(ext).strip().lstrip('.').lower()
-                if clean_ext:
-                    parsed_extensions.add(clean_ext)
-        except (json.JSONDecodeError, ValueError) as e:
-            return {
-                "responseCode": 500,
-                "responseStatus": "error",
-                "responseMessage": f"Invalid format for 'allowed_extension'. Error: {e}"
-            }
-
-        if not parsed_extensions:
+    if UPLOAD_JOURNAL_MODE != "always":
+        conn = get_env_connection(env_id)
+        if not conn and UPLOAD_JOURNAL_MODE != "fallback":
             return {
                 "responseCode": 500,
                 "responseStatus": "error",
-                "responseMessage": "Allowed_extension configuration is empty or invalid after parsing."
+                "responseMessage": "Failed to connect to the database."
             }
 
-        max_file_size_kb = doc_master_config['allowed_max_size']
-        max_file_size_bytes = max_file_size_kb * 1024
-
-        if not allowed_file(file.filename, parsed_extensions):
-            return {
-                "responseCode": 400,
-                "responseStatus": "error",
-                "responseMessage": f"File type not allowed. Allowed types: {', '.join(sorted(list(parsed_extensions)))}"
-            }
+    try:
+        dynamic_path, unique_filename, file_ext, original_filename = build_document_location(rules, file_type, file.filename)
 
-        if file.content_length > max_file_size_bytes:
-            return {
-                "responseCode": 400,
-                "responseStatus": "error",
-                "responseMessage": f"File size exceeds the maximum allowed size of {max_file_size_kb} KB."
-            }
+        storage = get_storage()
+        with span("storage.save"):
+            file_path_on_disk, filesize, stored_size, content_encoding = store_document_file(
+                storage, file.stream, dynamic_path, unique_filename, rules
+            )
 
-        file_ext = file.filename.rsplit('.', 1)[1].lower()
-        original_filename = secure_filename(file.filename)
-        unique_filename = f"{file_type}_{str(uuid.uuid4())}.{file_ext}"
-
-        today = datetime.today()
-        base_upload_path = doc_master_config['filepath'].rstrip('/') if doc_master_config['filepath'] else BASE_UPLOAD_FOLDER
-        dynamic_path = os.path.join(
-            base_upload_path,
-            today.strftime("%Y"),
-            today.strftime("%m"),
-            today.strftime("%d")
-        )
+        # Multipart parts rarely carry their own Content-Length, so check the stored size as well
+        validation_error = validate_upload_file(file.filename, filesize, rules)
+        if validation_error:
+            storage.delete(file_path_on_disk)
+            file_path_on_disk = None
+            return validation_error
 
-        os.makedirs(dynamic_path, exist_ok=True)
-        file_path_on_disk = os.path.join(dynamic_path, unique_filename)
-        file.save(file_path_on_disk)
+        document = {
+            "env_id": env_id,
+            "parent_id": parent_id,
+            "ref_id": ref_id,
+            "module_id": module_id,
+            "type": file_type,
+            "filename": unique_filename,
+            "original_filename": original_filename,
+            "filepath": file_path_on_disk,
+            "filesize": filesize,
+            "stored_size": stored_size,
+            "content_encoding": content_encoding,
+            "extension": file_ext
+        }
+        if not conn:
+            return journal_upload(document, user_id)
 
-        insert_query = """
-            INSERT INTO ds_document
-            (env_id, parent_id, ref_id, module_id, type, filename, original_filename, filepath, filesize, extension, createdBy, createdAt)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        document_data = (
-            env_id,
-            parent_id,
-            ref_id,
-            module_id,
-            file_type,
-            unique_filename,
-            original_filename,
-            file_path_on_disk.replace("\\", "/"),
-            file.content_length,
-            file_ext,
-            user_id,
-            datetime.utcnow()
-        )
-        cursor.execute(insert_query, document_data)
-        conn.commit()
-        document_id = cursor.lastrowid
+        cursor = get_db_cursor(conn)
+        document_id = insert_document_record(cursor, document, user_id)
+        with span("db.commit"):
+            conn.commit()
+        mark_primary_write(user_id)
+        invalidate_document_list(module_id, env_id, ref_id)
+        publish_document_uploaded(document_id, document)
+        schedule_previews(document_id, file_path_on_disk, file_ext, env_id=env_id)
 
-        return {
-            "responseCode": 200,
-            "responseStatus": "success",
-            "responseMessage": "Document uploaded successfully",
-            "responseData": {
-                "id": document_id,
-                "type": file_type,
-                "name": original_filename,
-                "path": file_path_on_disk.replace("\\", "/"),
-                "fileName": unique_filename
-            },
-            "fileName": original_filename
-        }
+        return upload_response(document_id, document)
 
     except mysql.connector.Error as e:
         conn.rollback()
-        if file_path_on_disk and os.path.exists(file_path_on_disk):
-            os.remove(file_path_on_disk)
         print(f"Database error: {e}")
+        if document and UPLOAD_JOURNAL_MODE == "fallback":
+            try:
+                return journal_upload(document, user_id)
+            except OSError as journal_error:
+                print(f"Upload journal error: {journal_error}")
+        if file_path_on_disk:
+            get_storage_for_path(file_path_on_disk).delete(file_path_on_disk)
         return {
             "responseCode": 500,
             "responseStatus": "error",
@@ -321,8 +625,8 @@ def handle_file_upload(file, metadata_str, user_id):
     except Exception as e:
         if conn:
             conn.rollback()
-        if file_path_on_disk and os.path.exists(file_path_on_disk):
-            os.remove(file_path_on_disk)
+        if file_path_on_disk:
+            get_storage_for_path(file_path_on_disk).delete(file_path_on_disk)
         print(f"Unexpected error: {e}")
         return {
             "responseCode": 500,
@@ -332,11 +636,251 @@ def handle_file_upload(file, metadata_str, user_id):
     finally:
         close_db_connection(conn, cursor)
 
+# --- Upload Journal Applier ---
+
+# Serializes the background applier and 'flask uploads apply-journal' within a process
+_journal_apply_lock = threading.Lock()
+
+def apply_upload_journal(batch_size=UPLOAD_JOURNAL_BATCH_SIZE):
+    """
+    Inserts the next batch of journaled uploads into ds_document in one transaction.
+    Records whose journal_id is already present are skipped, so a batch replayed after a
+    crash between the commit and the checkpoint is not inserted twice.
+
+    Returns:
+        int: The number of journal records consumed (0 when the journal is drained).
+
+    Raises:
+        RuntimeError: If the database is unavailable; mysql.connector.Error on insert failure.
+    """
+    with _journal_apply_lock:
+        return _apply_upload_journal_batch(batch_size)
+
+def _apply_upload_journal_batch(batch_size):
+    records, end_offset = UPLOAD_JOURNAL.read_pending(batch_size)
+    if not records:
+        return 0
+
+    # One transaction per application, on its shard. If one fails the whole batch is read
+    # again later and the records already inserted are skipped by journal_id, so each
+    # application's follow-up work runs right after its own commit.
+    by_env = {}
+    for record in records:
+        by_env.setdefault(record["document"]["env_id"], []).append(record)
+    for env_id, env_records in by_env.items():
+        inserted = _apply_journal_records(env_id, env_records)
+        metrics.incr("upload_journal.applied", len(inserted))
+        for document_id, document in inserted:
+            invalidate_document_list(document["module_id"], document["env_id"], document["ref_id"])
+            publish_document_uploaded(document_id, document)
+            schedule_previews(document_id, document["filepath"], document["extension"], env_id=document["env_id"])
+
+    UPLOAD_JOURNAL.commit(end_offset)
+    return len(records)
+
+def _apply_journal_records(env_id, records):
+    conn = get_env_connection(env_id)
+    if not conn:
+        raise RuntimeError("Failed to connect to the database.")
+    cursor = get_db_cursor(conn)
+    inserted = []
+    try:
+        journal_ids = [record["journal_id"] for record in records]
+        placeholders = ", ".join(["%s"] * len(journal_ids))
+        cursor.execute(f"SELECT journal_id FROM ds_document WHERE journal_id IN ({placeholders})", journal_ids)
+        applied = {row["journal_id"] for row in cursor.fetchall()}
+        for record in records:
+            if record["journal_id"] in applied:
+                metrics.incr("upload_journal.duplicates")
+                continue
+            document = {**record["document"], "created_at": datetime.fromisoformat(record["document"]["created_at"])}
+            document_id = insert_document_record(cursor, document, record["user_id"], journal_id=record["journal_id"])
+            applied.add(record["journal_id"])
+            inserted.append((document_id, document))
+        conn.commit()
+    except mysql.connector.Error:
+        conn.rollback()
+        raise
+    finally:
+        close_db_connection(conn, cursor)
+    return inserted
+
+def run_upload_journal_applier():
+    """
+    Applier loop: drains the journal whenever records arrive (or every interval, for records
+    appended by other worker processes), backing off while the database is unavailable.
+    Only the process holding the journal's applier lock applies.
+    """
+    while True:
+        try:
+            if UPLOAD_JOURNAL.try_acquire_applier():
+                while apply_upload_journal():
+                    pass
+                UPLOAD_JOURNAL.compact()
+            UPLOAD_JOURNAL.wait_for_records(UPLOAD_JOURNAL_INTERVAL_SECONDS)
+        except Exception as e:
+            metrics.incr("upload_journal.apply_failures")
+            print(f"WARNING: Upload journal apply failed, retrying in {UPLOAD_JOURNAL_RETRY_SECONDS}s: {e}")
+            time.sleep(UPLOAD_JOURNAL_RETRY_SECONDS)
+
+_journal_applier = None
+
+def start_upload_journal_applier():
+    """
+    Starts the background journal applier once per process when journaling is enabled.
+    """
+    global _journal_applier
+    if UPLOAD_JOURNAL is None or _journal_applier is not None:
+        return
+    metrics.register_gauge("upload_journal.pending_records", lambda: UPLOAD_JOURNAL.backlog()[0])
+    metrics.register_gauge("upload_journal.pending_bytes", lambda: UPLOAD_JOURNAL.backlog()[1])
+    _journal_applier = threading.Thread(target=run_upload_journal_applier, name="upload-journal-applier", daemon=True)
+    _journal_applier.start()
+
 # --- List and Delete Document Services ---
 
+def document_list_cache_key(module, application_id, reference_id):
+    return f"{module}|{application_id}|{reference_id}"
+
+def invalidate_document_list(module, application_id, reference_id):
+    """
+    Drops the cached listing of a reference; called after every committed upload or delete.
+    """
+    if DOCUMENT_LIST_CACHE:
+        DOCUMENT_LIST_CACHE.invalidate(document_list_cache_key(module, application_id, reference_id))
+
+def publish_document_event(module, application_id, reference_id, event_type, data):
+    """
+    Publishes a committed change of a reference to its change feed subscribers. Failures
+    are logged only: the change itself has already succeeded.
+    """
+    if not DOCUMENT_EVENTS:
+        return
+    try:
+        DOCUMENT_EVENTS.publish(document_list_cache_key(module, application_id, reference_id), event_type, data)
+    except Exception as e:
+        metrics.incr("events.publish_failures")
+        print(f"WARNING: Failed to publish {event_type} event: {e}")
+
+def format_sse(event_type, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data, default=str, separators=(',', ':'))}")
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+def open_document_event_stream(data, last_event_id=None):
+    """
+    Subscribes to the change feed of one reference.
+
+    Args:
+        data (dict): "module", "application_id" and "reference_id" of the reference.
+        last_event_id (str): The Last-Event-ID the client reconnects with, if any.
+
+    Returns:
+        tuple: (stream, error_response) where stream yields the server-sent events body:
+               'document.uploaded' and 'document.deleted' events, then 'reset' if events
+               were missed (the client should reload the listing and resubscribe without
+               an id), with heartbeat comments while idle.
+    """
+    global _open_streams
+    module_id = data.get("module") if data else None
+    env_id = data.get("application_id") if data else None
+    ref_id = data.get("reference_id") if data else None
+    if not all([module_id, env_id, ref_id]):
+        return None, {
+            "responseCode": 400,
+            "responseStatus": "error",
+            "responseMessage": "Missing required fields: module, application_id, or reference_id."
+        }
+    if not DOCUMENT_EVENTS:
+        return None, {
+            "responseCode": 404,
+            "responseStatus": "error",
+            "responseMessage": "The document change feed is disabled."
+        }
+    with _open_streams_lock:
+        if _open_streams >= EVENTS_MAX_STREAMS:
+            metrics.incr("events.rejected")
+            return None, {
+                "responseCode": 503,
+                "responseStatus": "error",
+                "responseMessage": "Too many open change feeds, please retry shortly."
+            }
+        _open_streams += 1
+    try:
+        subscription = DOCUMENT_EVENTS.subscribe(document_list_cache_key(module_id, env_id, ref_id), last_event_id)
+    except Exception as e:
+        with _open_streams_lock:
+            _open_streams -= 1
+        print(f"ERROR: Failed to subscribe to document events: {e}")
+        return None, {
+            "responseCode": 500,
+            "responseStatus": "error",
+            "responseMessage": "Failed to open the document change feed."
+        }
+
+    return DocumentEventStream(subscription), None
+
+class DocumentEventStream:
+    """
+    Response body of an open change feed. The subscription and the open stream count are
+    released by close(), which the WSGI server calls even when the body is never iterated
+    (HEAD requests, clients gone before the first byte).
+    """
+
+    def __init__(self, subscription):
+        self.subscription = subscription
+        self._closed = False
+        self._close_lock = threading.Lock()
+
+    def __iter__(self):
+        deadline = time.monotonic() + EVENTS_MAX_STREAM_SECONDS
+        try:
+            yield f"retry: {EVENTS_RETRY_MILLISECONDS}\n: subscribed\n\n".encode("utf-8")
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                events, reset = self.subscription.get(min(EVENTS_HEARTBEAT_SECONDS, remaining))
+                for event in events:
+                    yield format_sse(event.type, event.data, event.id)
+                if reset:
+                    yield format_sse("reset", {"reason": "Events were missed; reload the document list."})
+                    break
+                if not events:
+                    yield b": keepalive\n\n"
+        finally:
+            # Also reached when the client disconnects (GeneratorExit at a yield)
+            self.close()
+
+    def close(self):
+        global _open_streams
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+        self.subscription.close()
+        with _open_streams_lock:
+            _open_streams -= 1
+
+def publish_document_uploaded(document_id, document):
+    publish_document_event(document["module_id"], document["env_id"], document["ref_id"], "document.uploaded", {
+        "id": document_id,
+        "ref_id": document["ref_id"],
+        "type": document["type"],
+        "original_filename": document["original_filename"],
+        "filename": document["filename"],
+        "filesize": document["filesize"],
+        "extension": document["extension"]
+    })
+
 def list_documents_service(data, user_id):
     """
     Retrieves document metadata from the database using direct SQL queries.
+    Results are cached per (module, application_id, reference_id) until an upload or
+    delete for that reference invalidates them.
     Optionally uses user_id for internal authorization checks.
     """
     module = data.get("module")
@@ -351,26 +895,31 @@ def list_documents_service(data, user_id):
             "responseData": []
         }
 
+    if DOCUMENT_LIST_CACHE is None:
+        return query_document_list(module, application_id, reference_id, user_id)
+
+    def load():
+        response = query_document_list(module, application_id, reference_id, user_id)
+        return response, response["responseCode"] == 200
+
+    return DOCUMENT_LIST_CACHE.get_or_load(document_list_cache_key(module, application_id, reference_id), load)
+
+def query_document_list(module, application_id, reference_id, user_id):
+    """
+    Runs the document listing query. Reads are served by a replica unless user_id wrote recently.
+    """
     conn = None
     cursor = None
     try:
-        conn = get_db_connection()
+        conn = get_env_connection(application_id, read_only=True, sticky_key=user_id)
         if not conn:
             return {
                 "responseCode": 500,
                 "responseStatus": "error",
                 "responseMessage": "Failed to connect to the database."
             }
-        cursor = get_db_cursor(conn)
-
         # Query the ds_document table using direct SQL
-        query = """
-            SELECT id, ref_id, type, original_filename, filename, filepath, filesize, extension, createdAt, status
-            FROM ds_document
-            WHERE module_id = %s AND env_id = %s AND ref_id = %s AND deleted = 0
-        """
-        cursor.execute(query, (module, application_id, reference_id))
-        documents = cursor.fetchall() # Fetch all results as dictionaries
+        documents = run_statement(conn, LIST_DOCUMENTS_QUERY, (module, application_id, reference_id)).rows
 
         # Format the results for the API response
         response_data = []
@@ -385,7 +934,10 @@ def list_documents_service(data, user_id):
                 "filesize": doc['filesize'],
                 "extension": doc['extension'],
                 "createdAt": doc['createdAt'].isoformat() if isinstance(doc['createdAt'], datetime) else str(doc['createdAt']),
-                "status": doc['status']
+                "status": doc['status'],
+                "previewStatus": doc['preview_status'],
+                "thumbnailPath": thumbnail_path(doc['filepath']) if doc['preview_status'] == 'ready' else None,
+                "previewPath": preview_path(doc['filepath']) if doc['preview_status'] == 'ready' else None
             })
 
         return {
@@ -436,7 +988,7 @@ def delete_document_service(data, user_id):
             "responseMessage": "Missing required fields: id, module, application_id, reference_id, or filepath."
         }
    
-    conn = get_db_connection()
+    conn = get_env_connection(env_id)
     if not conn:
         return {
             "responseCode": 500,
@@ -447,14 +999,8 @@ def delete_document_service(data, user_id):
     cursor = get_db_cursor(conn)
     
     try:
-        select_query = """
-            SELECT id, filepath
-            FROM ds_document
-            WHERE id = %s AND module_id = %s AND env_id = %s AND ref_id = %s AND deleted = 0        
-        """
-        
-        cursor.execute(select_query, (id, module_id, env_id, ref_id))
-        document = cursor.fetchone()
+        rows = run_statement(conn, SELECT_DOCUMENT_QUERY, (id, module_id, env_id, ref_id)).rows
+        document = rows[0] if rows else None
         
         if not document:
             return {
@@ -465,17 +1011,20 @@ def delete_document_service(data, user_id):
         
         file_path_from_db = document['filepath']
         file_path_on_disk = file_path_from_db.replace("\\", "/")
-
-        if os.path.exists(file_path_on_disk):
-            os.remove(file_path_on_disk)
+        get_storage_for_path(file_path_on_disk).delete(file_path_on_disk)
+        remove_previews(file_path_on_disk)
         
         update_query = """
             UPDATE ds_document
-            SET deleted = 1, updatedBy = %s, updatedAt = NOW()
+            SET deleted = 1, deletedAt = UTC_TIMESTAMP(), updatedBy = %s, updatedAt = UTC_TIMESTAMP()
             WHERE id = %s
         """
-        cursor.execute(update_query, (user_id, id))
+        run_statement(conn, update_query, (user_id, id))
+        record_document_removed(cursor, {**document, "env_id": env_id, "module_id": module_id})
         conn.commit()
+        mark_primary_write(user_id)
+        invalidate_document_list(module_id, env_id, ref_id)
+        publish_document_event(module_id, env_id, ref_id, "document.deleted", {"id": int(id), "type": document['type']})
                 
         return {
             "responseCode": 200,
@@ -501,3 +1050,102 @@ def delete_document_service(data, user_id):
     finally:
         close_db_connection(conn, cursor)
 
+
+def get_document_download(data, user_id, accept_gzip=False):
+    """
+    Looks up a document for download and opens its content.
+
+    Args:
+        data (dict): "id", "module", "application_id" and "reference_id" of the document.
+        user_id (int): The ID of the user downloading, obtained from JWT.
+        accept_gzip (bool): True if the client accepts Content-Encoding: gzip, in which case
+                            gzip-compressed files are passed through without decompressing.
+
+    Returns:
+        dict: A standard response; on success it also carries a "download" entry with the
+              open "stream", "filename", "mimetype", "content_encoding" and "content_length".
+    """
+    id = data.get("id") if data else None
+    module_id = data.get("module") if data else None
+    env_id = data.get("application_id") if data else None
+    ref_id = data.get("reference_id") if data else None
+
+    if not all([id, module_id, env_id, ref_id]):
+        return {
+            "responseCode": 400,
+            "responseStatus": "error",
+            "responseMessage": "Missing required fields: id, module, application_id, or reference_id."
+        }
+
+    conn = get_env_connection(env_id, read_only=True, sticky_key=user_id)
+    if not conn:
+        return {
+            "responseCode": 500,
+            "responseStatus": "error",
+            "responseMessage": "Failed to connect to the database."
+        }
+    cursor = None
+    try:
+        rows = run_statement(conn, SELECT_DOCUMENT_QUERY, (id, module_id, env_id, ref_id)).rows
+        document = rows[0] if rows else None
+    except mysql.connector.Error as e:
+        print(f"Database error during document download for ID={id}: {e}")
+        return {
+            "responseCode": 500,
+            "responseStatus": "error",
+            "responseMessage": f"Failed to retrieve document: {str(e)}"
+        }
+    finally:
+        close_db_connection(conn, cursor)
+
+    if not document:
+        return {
+            "responseCode": 404,
+            "responseStatus": "error",
+            "responseMessage": "Document not found or already deleted."
+        }
+
+    content_encoding = document.get('content_encoding')
+    passthrough = content_encoding == "gzip" and accept_gzip
+    try:
+        stream = open_document_content(document['filepath'], content_encoding, decompress=not passthrough)
+        if passthrough:
+            content_length = document['stored_size']
+        elif content_encoding:
+            content_length = document['filesize']
+        else:
+            # Rows from before uploads recorded their real size may hold 0 here
+            content_length = get_storage_for_path(document['filepath']).size(document['filepath'])
+    except (OSError, RuntimeError) as e:
+        print(f"ERROR: Stored file for document ID={id} could not be opened: {e}")
+        return {
+            "responseCode": 404,
+            "responseStatus": "error",
+            "responseMessage": "Stored file for this document is missing."
+        }
+
+    return {
+        "responseCode": 200,
+        "responseStatus": "success",
+        "responseMessage": "Document download started",
+        "download": {
+            "stream": stream,
+            "filename": document['original_filename'],
+            "mimetype": mimetypes.guess_type(document['original_filename'])[0] or "application/octet-stream",
+            "content_encoding": "gzip" if passthrough else None,
+            "content_length": content_length
+        }
+    }
+
+def iter_file_chunks(stream, chunk_size=64 * 1024):
+    """
+    Yields a stream in chunks and closes it when done or when the client goes away.
+    """
+    try:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        stream.close()
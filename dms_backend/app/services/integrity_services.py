@@ -0,0 +1,345 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from mysql.connector import Error
+from app.database import get_db_connection, get_db_cursor, close_db_connection, DEFAULT_SHARD, shard_names
+from app.storage import get_storage_for_path
+from app.services.stats_services import record_stored_size_change
+
+# Bytes per second the verifier may read from storage across all workers; 0 means unlimited
+INTEGRITY_MAX_BYTES_PER_SECOND = int(os.getenv("INTEGRITY_MAX_BYTES_PER_SECOND", str(20 * 1024 * 1024)))
+INTEGRITY_LOCK_NAME = "dms_integrity_verify"
+READ_CHUNK_SIZE = 64 * 1024
+PROBLEMS = ("missing", "size_mismatch", "hash_mismatch", "unreadable")
+MAX_REPORT_ISSUES = 1000
+
+
+class _ByteThrottle:
+    """
+    Token bucket shared by the worker threads; consume() blocks until the bytes fit under
+    the configured rate. Allows at most one second of burst.
+    """
+
+    def __init__(self, bytes_per_second):
+        self.rate = bytes_per_second
+        self._tokens = float(bytes_per_second)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, size):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= size
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+class _ThrottledReader:
+    def __init__(self, stream, throttle):
+        self.stream = stream
+        self.throttle = throttle
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        chunk = self.stream.read(size)
+        self.bytes_read += len(chunk)
+        self.throttle.consume(len(chunk))
+        return chunk
+
+
+def _content_sha256(row, throttle):
+    """
+    Hashes a document's original bytes, decompressing gzip-stored files. Returns
+    (hexdigest, original_size, stored_bytes_read).
+    """
+    stream = get_storage_for_path(row['filepath']).open(row['filepath'])
+    try:
+        reader = _ThrottledReader(stream, throttle)
+        source = gzip.GzipFile(fileobj=reader, mode="rb") if row['content_encoding'] == "gzip" else reader
+        digest = hashlib.sha256()
+        original_size = 0
+        while True:
+            chunk = source.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            original_size += len(chunk)
+        return digest.hexdigest(), original_size, reader.bytes_read
+    finally:
+        stream.close()
+
+
+def check_document(row, throttle, verify_hashes=True):
+    """
+    Checks one ds_document row against storage: the file exists, its stored size matches and,
+    when verify_hashes is set, its content matches the recorded hash. Legacy rows with a
+    filesize of 0 have no known size; their measured sizes are returned instead of a mismatch.
+
+    Returns:
+        dict: 'problem' (None or one of PROBLEMS), 'expected', 'actual', 'bytes_read',
+              'sha256' (set when a hash was computed for a row that has none recorded) and
+              'sizes' ((filesize, stored_size) measured for a row of unknown size, else None).
+    """
+    result = {"problem": None, "expected": None, "actual": None, "bytes_read": 0, "sha256": None, "sizes": None}
+    path = row['filepath']
+    size_known = bool(row['filesize'])
+    try:
+        storage = get_storage_for_path(path)
+        if not storage.exists(path):
+            result["problem"] = "missing"
+            return result
+        expected_size = row['stored_size'] if row['stored_size'] is not None else row['filesize']
+        actual_size = storage.size(path)
+        if size_known and actual_size != expected_size:
+            result.update(problem="size_mismatch", expected=str(expected_size), actual=str(actual_size))
+            return result
+        if not verify_hashes:
+            if not size_known and row['content_encoding'] is None:
+                result["sizes"] = (actual_size, actual_size)
+            return result
+        digest, original_size, bytes_read = _content_sha256(row, throttle)
+        result["bytes_read"] = bytes_read
+        if not size_known:
+            result["sizes"] = (original_size, actual_size)
+        if size_known and original_size != row['filesize']:
+            # A gzip file whose stored size is right but that no longer expands to the original
+            result.update(problem="size_mismatch", expected=str(row['filesize']), actual=str(original_size))
+        elif row['content_sha256'] is None:
+            result["sha256"] = digest
+        elif digest != row['content_sha256']:
+            result.update(problem="hash_mismatch", expected=row['content_sha256'], actual=digest)
+    except (OSError, EOFError) as e:
+        result.update(problem="unreadable", actual=str(e)[:255])
+    except Exception as e:  # S3 client errors and the like; one bad file must not stop the run
+        result.update(problem="unreadable", actual=f"{type(e).__name__}: {e}"[:255])
+    return result
+
+
+def _start_or_resume_run(cursor, verify_hashes, resume):
+    if resume:
+        cursor.execute("""
+            SELECT * FROM ds_integrity_run
+            WHERE finishedAt IS NULL
+            ORDER BY id DESC
+            LIMIT 1
+        """)
+        run = cursor.fetchone()
+        if run:
+            cursor.execute("UPDATE ds_integrity_run SET status = 'running', error = NULL WHERE id = %s", (run['id'],))
+            run['status'] = 'running'
+            return run
+    cursor.execute("SELECT COALESCE(MAX(id), 0) AS max_id FROM ds_document")
+    max_id = cursor.fetchone()['max_id']
+    cursor.execute(
+        "INSERT INTO ds_integrity_run (verify_hashes, max_id) VALUES (%s, %s)",
+        (1 if verify_hashes else 0, max_id)
+    )
+    cursor.execute("SELECT * FROM ds_integrity_run WHERE id = %s", (cursor.lastrowid,))
+    return cursor.fetchone()
+
+
+def verify_document_integrity(workers=4, batch_size=500, max_bytes_per_second=INTEGRITY_MAX_BYTES_PER_SECOND,
+                              verify_hashes=True, resume=True, report_path=None, pause_seconds=0.0,
+                              progress=None, shard=DEFAULT_SHARD):
+    """
+    Verifies the files behind every live ds_document row, in id order, batch_size rows at a
+    time, with the storage checks spread over `workers` threads and reads throttled to
+    max_bytes_per_second.
+
+    Each batch's issues, newly recorded hashes and the run's checkpoint (last_id) and counters
+    are committed together, so an interrupted run resumes after its last finished batch. Rows
+    uploaded after the run started (id above its max_id) are left for the next run. Only one
+    verifier runs at a time per shard, guarded by a MySQL named lock. Runs and issues are
+    recorded on the shard that is verified.
+
+    Args:
+        verify_hashes (bool): Read file contents; False checks existence and size only.
+        resume (bool): Continue the newest unfinished run instead of starting a new one.
+        report_path (str): Optional JSON-lines file that issues are also appended to.
+        pause_seconds (float): Sleep between batches to leave room for live traffic.
+        progress (callable): Called with the run dict after every batch.
+        shard (str): The database shard whose documents are verified.
+
+    Returns:
+        dict: The run's final row from ds_integrity_run.
+    """
+    throttle = _ByteThrottle(max_bytes_per_second)
+    conn = get_db_connection(shard=shard)
+    if not conn:
+        raise RuntimeError(f"Failed to connect to the database shard '{shard}' for integrity verification.")
+    cursor = get_db_cursor(conn)
+    report = open(report_path, "a", encoding="utf-8") if report_path else None
+    run = None
+    try:
+        cursor.execute("SELECT GET_LOCK(%s, 0) AS acquired", (f"{INTEGRITY_LOCK_NAME}:{shard}",))
+        if not cursor.fetchone()['acquired']:
+            raise RuntimeError("Another integrity verification is already running.")
+        run = _start_or_resume_run(cursor, verify_hashes, resume)
+        conn.commit()
+        verify_hashes = bool(run['verify_hashes'])
+
+        def check(row):
+            return row, check_document(row, throttle, verify_hashes)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while run['last_id'] < run['max_id']:
+                cursor.execute("""
+                    SELECT id, env_id, module_id, type, filepath, filesize, stored_size, content_encoding, content_sha256
+                    FROM ds_document
+                    WHERE id > %s AND id <= %s AND deleted = 0
+                    ORDER BY id
+                    LIMIT %s
+                """, (run['last_id'], run['max_id'], batch_size))
+                rows = cursor.fetchall()
+                if not rows:
+                    run['last_id'] = run['max_id']
+                    break
+
+                issues, hashes, sizes = [], [], []
+                for row, result in pool.map(check, rows):
+                    run['checked'] += 1
+                    run['bytes_read'] += result['bytes_read']
+                    if result['problem']:
+                        run[result['problem']] += 1
+                        issues.append((run['id'], row['id'], row['filepath'], result['problem'],
+                                       result['expected'], result['actual']))
+                    else:
+                        run['ok'] += 1
+                    if result['sha256']:
+                        hashes.append((result['sha256'], row['id']))
+                    if result['sizes']:
+                        sizes.append((row, result['sizes']))
+                run['last_id'] = rows[-1]['id']
+
+                if issues:
+                    cursor.executemany("""
+                        INSERT INTO ds_integrity_issue (run_id, document_id, filepath, problem, expected, actual)
+                        VALUES (%s, %s, %s, %s, %s, %s)
+                    """, issues)
+                if hashes:
+                    # Keep updatedAt as is: recording a hash is not a change to the document
+                    cursor.executemany(
+                        "UPDATE ds_document SET content_sha256 = %s, updatedAt = updatedAt WHERE id = %s AND content_sha256 IS NULL",
+                        hashes
+                    )
+                    run['hashes_recorded'] += len(hashes)
+                for row, (filesize, stored_size) in sizes:
+                    # Legacy rows without a recorded size get the measured one, also in the stats
+                    cursor.execute(
+                        "UPDATE ds_document SET filesize = %s, stored_size = %s, updatedAt = updatedAt WHERE id = %s AND filesize = 0",
+                        (filesize, stored_size, row['id'])
+                    )
+                    if cursor.rowcount:
+                        old_stored_size = row['stored_size'] if row['stored_size'] is not None else 0
+                        record_stored_size_change(cursor, row, old_stored_size, stored_size, filesize)
+                _save_run_progress(cursor, run)
+                conn.commit()
+                if report:
+                    for run_id, document_id, filepath, problem, expected, actual in issues:
+                        report.write(json.dumps({
+                            "run_id": run_id, "document_id": document_id, "filepath": filepath,
+                            "problem": problem, "expected": expected, "actual": actual
+                        }) + "\n")
+                    report.flush()
+                if progress:
+                    progress(run)
+                time.sleep(pause_seconds)
+
+        run['status'] = 'completed'
+        _save_run_progress(cursor, run, finished=True)
+        conn.commit()
+        return run
+    except Exception as e:
+        conn.rollback()
+        if run is not None:
+            try:
+                cursor.execute(
+                    "UPDATE ds_integrity_run SET status = 'interrupted', error = %s WHERE id = %s",
+                    (str(e)[:500], run['id'])
+                )
+                conn.commit()
+            except Error:
+                pass
+        raise
+    finally:
+        if report:
+            report.close()
+        try:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (f"{INTEGRITY_LOCK_NAME}:{shard}",))
+            cursor.fetchall()
+        except Error:
+            pass
+        close_db_connection(conn, cursor)
+
+
+def _save_run_progress(cursor, run, finished=False):
+    cursor.execute(f"""
+        UPDATE ds_integrity_run
+        SET status = %s, last_id = %s, checked = %s, ok = %s, missing = %s, size_mismatch = %s,
+            hash_mismatch = %s, unreadable = %s, hashes_recorded = %s, bytes_read = %s
+            {", finishedAt = UTC_TIMESTAMP()" if finished else ""}
+        WHERE id = %s
+    """, (run['status'], run['last_id'], run['checked'], run['ok'], run['missing'], run['size_mismatch'],
+          run['hash_mismatch'], run['unreadable'], run['hashes_recorded'], run['bytes_read'], run['id']))
+
+
+def _serialize_run(run):
+    return {
+        **{key: value.isoformat() if hasattr(value, "isoformat") else value for key, value in run.items()},
+        "progress": round(min(run['last_id'], run['max_id']) * 100.0 / run['max_id'], 2) if run['max_id'] else 100.0
+    }
+
+
+def get_integrity_report(data):
+    """
+    Returns the newest verification runs with their progress and, when 'run_id' is given,
+    that run's issues after 'after_id' (at most 'limit', up to MAX_REPORT_ISSUES), from the
+    database 'shard' given (the default shard otherwise).
+
+    Returns:
+        tuple: (response_dict, status_code)
+    """
+    try:
+        run_id = int(data["run_id"]) if data.get("run_id") else None
+        after_id = int(data.get("after_id", 0))
+        limit = min(int(data.get("limit", 100)), MAX_REPORT_ISSUES)
+    except (TypeError, ValueError):
+        return {"error": "'run_id', 'after_id' and 'limit' must be integers."}, 400
+
+    shard = data.get("shard") or DEFAULT_SHARD
+    if shard not in shard_names():
+        return {"error": f"Unknown shard '{shard}'."}, 400
+    conn = get_db_connection(read_only=True, shard=shard)
+    if not conn:
+        return {"error": "Failed to connect to the database."}, 500
+    cursor = get_db_cursor(conn)
+    try:
+        cursor.execute("SELECT * FROM ds_integrity_run ORDER BY id DESC LIMIT 10")
+        response = {"runs": [_serialize_run(run) for run in cursor.fetchall()]}
+        if run_id is not None:
+            cursor.execute("""
+                SELECT id, document_id, filepath, problem, expected, actual, createdAt
+                FROM ds_integrity_issue
+                WHERE run_id = %s AND id > %s
+                ORDER BY id
+                LIMIT %s
+            """, (run_id, after_id, limit))
+            response["issues"] = [
+                {**issue, "createdAt": issue['createdAt'].isoformat() if issue['createdAt'] else None}
+                for issue in cursor.fetchall()
+            ]
+        return response, 200
+    except Error as e:
+        print(f"ERROR: Failed to read integrity report: {e}")
+        return {"error": "Failed to read integrity report."}, 500
+    finally:
+        close_db_connection(conn, cursor)
@@ -0,0 +1,200 @@
+import os
+import atexit
+import threading
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor
+from mysql.connector import Error
+from app.database import get_db_connection, get_db_cursor, close_db_connection, shard_names
+from app.sharding import get_env_connection
+from app.storage import S3_PATH_PREFIX
+from app.services.compression_services import COMPRESSED_SUFFIX
+
+# Thumbnails and first-page previews are rendered after upload in a process pool, so the
+# upload request never waits for them. PREVIEW_WORKERS=0 turns the pipeline off.
+PREVIEW_WORKERS = int(os.getenv("PREVIEW_WORKERS", "2"))
+# Jobs waiting for a worker beyond this stay 'pending' and are picked up by requeue_pending_previews.
+PREVIEW_QUEUE_LIMIT = int(os.getenv("PREVIEW_QUEUE_LIMIT", "100"))
+PREVIEW_THUMBNAIL_SIZE = (256, 256)
+PREVIEW_PAGE_SIZE = (1024, 1024)
+
+IMAGE_EXTENSIONS = {"jpg", "jpeg", "png", "gif", "bmp", "webp", "tif", "tiff"}
+PDF_EXTENSIONS = {"pdf"}
+
+THUMBNAIL_SUFFIX = ".thumb.jpg"
+PREVIEW_SUFFIX = ".preview.jpg"
+
+# Rendering needs Pillow, and PyMuPDF for PDFs; types without a renderer are skipped
+_RENDERERS_AVAILABLE = {
+    "image": importlib.util.find_spec("PIL") is not None,
+    "pdf": importlib.util.find_spec("PIL") is not None and importlib.util.find_spec("fitz") is not None
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+_in_flight = set()
+
+
+def thumbnail_path(filepath):
+    return filepath + THUMBNAIL_SUFFIX
+
+
+def preview_path(filepath):
+    return filepath + PREVIEW_SUFFIX
+
+
+def remove_previews(filepath):
+    """Deletes a document's derivatives, if any."""
+    for path in (thumbnail_path(filepath), preview_path(filepath)):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def initial_preview_status(filepath, extension):
+    """
+    Returns the preview_status a new document starts with: 'pending' if derivatives will be
+    generated for it, otherwise None. Derivatives are made for uncompressed local originals only.
+    """
+    if PREVIEW_WORKERS <= 0 or filepath.startswith(S3_PATH_PREFIX) or filepath.endswith(COMPRESSED_SUFFIX):
+        return None
+    if extension in IMAGE_EXTENSIONS and _RENDERERS_AVAILABLE["image"]:
+        return "pending"
+    if extension in PDF_EXTENSIONS and _RENDERERS_AVAILABLE["pdf"]:
+        return "pending"
+    return None
+
+
+def render_previews(source_path, extension, thumb_path, page_path):
+    """
+    Renders a thumbnail and a first-page preview as JPEG. Runs in a worker process.
+    Output is written to temp files and renamed, so a crash never leaves a partial image.
+
+    Returns:
+        bool: True when both images exist.
+    """
+    from PIL import Image
+
+    if os.path.exists(thumb_path) and os.path.exists(page_path):
+        return True  # Already rendered, e.g. before a crash that lost the status update
+
+    if extension in PDF_EXTENSIONS:
+        import fitz  # PyMuPDF
+        with fitz.open(source_path) as pdf:
+            pixmap = pdf[0].get_pixmap(dpi=100)
+            image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+    else:
+        with Image.open(source_path) as source:
+            source.seek(0)  # First frame of animated or multi-page images
+            image = source.convert("RGB")
+
+    for target, size in ((page_path, PREVIEW_PAGE_SIZE), (thumb_path, PREVIEW_THUMBNAIL_SIZE)):
+        rendered = image.copy()
+        rendered.thumbnail(size)
+        tmp_path = f"{target}.{os.getpid()}.tmp"
+        rendered.save(tmp_path, "JPEG", quality=80)
+        os.replace(tmp_path, target)
+    return True
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=PREVIEW_WORKERS)
+            atexit.register(_executor.shutdown, wait=False, cancel_futures=True)
+        return _executor
+
+
+def _set_preview_status(document_id, status, env_id):
+    # document_services imports this module for schedule_previews
+    from app.services.document_services import invalidate_document_list
+    conn = get_env_connection(env_id)
+    if not conn:
+        print(f"ERROR: Failed to record preview status for document {document_id}.")
+        return
+    cursor = get_db_cursor(conn)
+    document = None
+    try:
+        cursor.execute(
+            "UPDATE ds_document SET preview_status = %s WHERE id = %s AND preview_status = 'pending'",
+            (status, document_id)
+        )
+        if cursor.rowcount:
+            cursor.execute("SELECT module_id, env_id, ref_id FROM ds_document WHERE id = %s", (document_id,))
+            document = cursor.fetchone()
+        conn.commit()
+    except Error as e:
+        conn.rollback()
+        print(f"ERROR: Failed to record preview status for document {document_id}: {e}")
+    finally:
+        close_db_connection(conn, cursor)
+    if document:
+        # Cached listings carry previewStatus and the thumbnail and preview paths
+        invalidate_document_list(document['module_id'], document['env_id'], document['ref_id'])
+
+
+def _on_rendered(document_id, env_id, future):
+    with _executor_lock:
+        _in_flight.discard(document_id)
+    error = future.exception()
+    if error:
+        print(f"WARNING: Preview generation failed for document {document_id}: {error}")
+    _set_preview_status(document_id, "failed" if error else "ready", env_id)
+
+
+def schedule_previews(document_id, filepath, extension, env_id=None):
+    """
+    Queues preview generation for a committed document without blocking the caller.
+    A document already being rendered is not queued twice. Returns True if queued.
+    env_id routes the status update to the document's shard.
+    """
+    if initial_preview_status(filepath, extension) != "pending":
+        return False
+    with _executor_lock:
+        if document_id in _in_flight or len(_in_flight) >= PREVIEW_QUEUE_LIMIT:
+            return False
+        _in_flight.add(document_id)
+    try:
+        future = _get_executor().submit(
+            render_previews, filepath, extension, thumbnail_path(filepath), preview_path(filepath)
+        )
+    except RuntimeError as e:  # Pool shut down or broken
+        with _executor_lock:
+            _in_flight.discard(document_id)
+        print(f"WARNING: Could not queue previews for document {document_id}: {e}")
+        return False
+    future.add_done_callback(lambda f: _on_rendered(document_id, env_id, f))
+    return True
+
+
+def requeue_pending_previews(limit=PREVIEW_QUEUE_LIMIT):
+    """
+    Queues documents left 'pending' (e.g. by a restart or a full queue) on every shard.
+
+    Returns:
+        int: The number of documents queued.
+    """
+    if PREVIEW_WORKERS <= 0:
+        return 0
+    return sum(_requeue_shard_previews(shard, limit) for shard in shard_names())
+
+
+def _requeue_shard_previews(shard, limit):
+    conn = get_db_connection(shard=shard)
+    if not conn:
+        return 0
+    cursor = get_db_cursor(conn)
+    try:
+        cursor.execute("""
+            SELECT id, env_id, filepath, extension
+            FROM ds_document
+            WHERE preview_status = 'pending' AND deleted = 0
+            ORDER BY id
+            LIMIT %s
+        """, (limit,))
+        rows = cursor.fetchall()
+    except Error as e:
+        print(f"ERROR: Failed to load pending previews on shard '{shard}': {e}")
+        return 0
+    finally:
+        close_db_connection(conn, cursor)
+    return sum(1 for row in rows if schedule_previews(row['id'], row['filepath'], row['extension'], env_id=row['env_id']))
@@ -0,0 +1,273 @@
+import os
+import time
+from mysql.connector import Error
+from app.database import get_db_connection, get_db_cursor, close_db_connection, shard_names, DEFAULT_SHARD, DB_SHARDS
+from app.sharding import load_shard_map, SHARD_MAP_REFRESH_SECONDS
+from app.utils import metrics
+
+# Extra wait after a map change, on top of SHARD_MAP_REFRESH_SECONDS, for requests that
+# picked their shard just before it
+SHARD_MOVE_GRACE_SECONDS = float(os.getenv("SHARD_MOVE_GRACE_SECONDS", "2"))
+SHARD_MOVE_LOCK_NAME = "dms_shard_move"
+
+# Tables copied in id ranges, and tables replaced whole for the application
+ID_TABLES = ("ds_document", "ds_document_archive", "ds_access_log")
+SCOPE_TABLES = ("ds_document_stats", "ds_document_stats_daily")
+
+
+def _connect(shard):
+    conn = get_db_connection(shard=shard)
+    if not conn:
+        raise RuntimeError(f"Failed to connect to the database shard '{shard}'.")
+    return conn, get_db_cursor(conn)
+
+
+def _table_columns(cursor, table):
+    cursor.execute("""
+        SELECT COLUMN_NAME FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        ORDER BY ORDINAL_POSITION
+    """, (table,))
+    return [row['COLUMN_NAME'] for row in cursor.fetchall()]
+
+
+def _checksum(cursor, table, columns, where, params):
+    # ISNULL() keeps NULL apart from an empty string, which CONCAT_WS would otherwise merge
+    row_hash = "CRC32(CONCAT_WS('#', " + ", ".join(f"`{c}`, ISNULL(`{c}`)" for c in columns) + "))"
+    cursor.execute(f"SELECT COUNT(*) AS row_count, COALESCE(BIT_XOR({row_hash}), 0) AS checksum FROM {table} WHERE {where}", params)
+    row = cursor.fetchone()
+    return row['row_count'], row['checksum']
+
+
+def _replace_rows(source_cursor, target_conn, target_cursor, table, columns, where, params):
+    source_cursor.execute(f"SELECT {', '.join(f'`{c}`' for c in columns)} FROM {table} WHERE {where}", params)
+    rows = source_cursor.fetchall()
+    try:
+        target_cursor.execute(f"DELETE FROM {table} WHERE {where}", params)
+        if rows:
+            target_cursor.executemany(
+                f"INSERT INTO {table} ({', '.join(f'`{c}`' for c in columns)}) VALUES ({', '.join(['%s'] * len(columns))})",
+                [tuple(row[c] for c in columns) for row in rows]
+            )
+        target_conn.commit()
+    except Error:
+        target_conn.rollback()
+        raise
+    return len(rows)
+
+
+def _sync_env(env_id, source, target, batch_size, pause_seconds):
+    """
+    Makes the target shard's rows for env_id match the source's. Id tables are compared in
+    ranges of batch_size source rows by count and checksum, and only ranges that differ are
+    copied again.
+
+    Returns:
+        int: The number of rows copied; 0 means the shards already matched.
+    """
+    source_conn, source_cursor = _connect(source)
+    target_conn, target_cursor = _connect(target)
+    copied = 0
+    try:
+        for table in ID_TABLES:
+            columns = _table_columns(source_cursor, table)
+            low = 0
+            while True:
+                source_cursor.execute(f"""
+                    SELECT id FROM {table} WHERE env_id = %s AND id > %s
+                    ORDER BY id LIMIT 1 OFFSET %s
+                """, (env_id, low, batch_size - 1))
+                boundary = source_cursor.fetchone()
+                # The last range is open-ended so rows past the source's end are removed too
+                if boundary:
+                    where, params = "env_id = %s AND id > %s AND id <= %s", (env_id, low, boundary['id'])
+                else:
+                    where, params = "env_id = %s AND id > %s", (env_id, low)
+                if _checksum(source_cursor, table, columns, where, params) != _checksum(target_cursor, table, columns, where, params):
+                    copied += _replace_rows(source_cursor, target_conn, target_cursor, table, columns, where, params)
+                source_conn.commit()  # New snapshot for the next range
+                if not boundary:
+                    break
+                low = boundary['id']
+                if pause_seconds:
+                    time.sleep(pause_seconds)
+        for table in SCOPE_TABLES:
+            columns = _table_columns(source_cursor, table)
+            where, params = "env_id = %s", (env_id,)
+            if _checksum(source_cursor, table, columns, where, params) != _checksum(target_cursor, table, columns, where, params):
+                copied += _replace_rows(source_cursor, target_conn, target_cursor, table, columns, where, params)
+            source_conn.commit()
+        metrics.incr("shards.rows_copied", copied)
+        return copied
+    finally:
+        close_db_connection(source_conn, source_cursor)
+        close_db_connection(target_conn, target_cursor)
+
+
+def _set_map_entry(cursor, conn, env_id, shard, state, target):
+    cursor.execute("""
+        INSERT INTO ds_shard_map (env_id, shard, state, target) VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE shard = VALUES(shard), state = VALUES(state), target = VALUES(target)
+    """, (env_id, shard, state, target))
+    conn.commit()
+
+
+def _wait_for_map_refresh():
+    time.sleep(SHARD_MAP_REFRESH_SECONDS + SHARD_MOVE_GRACE_SECONDS)
+
+
+def move_application(env_id, target, batch_size=1000, pause_seconds=0.0, max_passes=3, progress=None):
+    """
+    Moves an application's rows to another shard while it stays online. Rows are copied
+    while the source keeps serving reads and writes, until a pass finds nothing to copy or
+    max_passes is reached. Writes are then refused (state 'frozen') for a final pass, the map
+    is switched to the target, and the source's copies are removed. Only one move per
+    application runs at a time (MySQL named lock on the primary).
+
+    Args:
+        progress (callable): Called with (stage, rows_copied) after each pass.
+
+    Returns:
+        dict: {'source', 'target', 'copied'}, or None if another move of env_id holds the lock.
+    """
+    env_id = int(env_id)
+    if target not in shard_names():
+        raise ValueError(f"Unknown shard '{target}'; configured shards: {', '.join(shard_names())}.")
+    entry = (load_shard_map(force=True) or {}).get(str(env_id))
+    if entry and entry['state'] != 'active':
+        raise RuntimeError(f"Application {env_id} is already being moved to '{entry['target']}'; abort that move first.")
+    source = entry['shard'] if entry else DEFAULT_SHARD
+    if source == target:
+        return {'source': source, 'target': target, 'copied': 0}
+
+    conn, cursor = _connect(DEFAULT_SHARD)
+    lock_name = f"{SHARD_MOVE_LOCK_NAME}:{env_id}"
+    copied = 0
+    try:
+        cursor.execute("SELECT GET_LOCK(%s, 0) AS acquired", (lock_name,))
+        if not cursor.fetchone()['acquired']:
+            return None
+        try:
+            _set_map_entry(cursor, conn, env_id, source, 'copying', target)
+            for number in range(1, max_passes + 1):
+                changed = _sync_env(env_id, source, target, batch_size, pause_seconds)
+                copied += changed
+                if progress:
+                    progress(f"pass {number}", changed)
+                if not changed:
+                    break
+
+            _set_map_entry(cursor, conn, env_id, source, 'frozen', target)
+            _wait_for_map_refresh()
+            try:
+                changed = _sync_env(env_id, source, target, batch_size, 0)
+                copied += changed
+                if progress:
+                    progress("final pass", changed)
+                if _sync_env(env_id, source, target, batch_size, 0):
+                    raise RuntimeError(f"Application {env_id} changed on '{source}' while frozen; move abandoned.")
+            except Exception:
+                _set_map_entry(cursor, conn, env_id, source, 'active', None)
+                raise
+
+            _set_map_entry(cursor, conn, env_id, target, 'active', None)
+            metrics.incr("shards.moves")
+            _wait_for_map_refresh()
+            cleanup_env(env_id)
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (lock_name,))
+            cursor.fetchall()
+        return {'source': source, 'target': target, 'copied': copied}
+    finally:
+        close_db_connection(conn, cursor)
+
+
+def abort_move(env_id):
+    """
+    Returns an application to normal service on its current shard after a move was
+    interrupted. Partial copies on the target are left for cleanup_env.
+
+    Returns:
+        bool: True if a move was in progress.
+    """
+    conn, cursor = _connect(DEFAULT_SHARD)
+    try:
+        cursor.execute("UPDATE ds_shard_map SET state = 'active', target = NULL WHERE env_id = %s AND state <> 'active'",
+                       (int(env_id),))
+        conn.commit()
+        return cursor.rowcount > 0
+    finally:
+        close_db_connection(conn, cursor)
+
+
+def cleanup_env(env_id, batch_size=1000):
+    """
+    Deletes an application's rows from every shard that does not own it, such as the source
+    of a finished move or the target of an aborted one.
+
+    Returns:
+        int: The number of rows deleted.
+    """
+    env_id = int(env_id)
+    entry = (load_shard_map(force=True) or {}).get(str(env_id))
+    if entry and entry['state'] != 'active':
+        raise RuntimeError(f"Application {env_id} is being moved; finish or abort the move first.")
+    owner = entry['shard'] if entry else DEFAULT_SHARD
+    deleted = 0
+    for shard in shard_names():
+        if shard == owner:
+            continue
+        conn, cursor = _connect(shard)
+        try:
+            for table in ID_TABLES + SCOPE_TABLES:
+                while True:
+                    cursor.execute(f"DELETE FROM {table} WHERE env_id = %s LIMIT %s", (env_id, batch_size))
+                    conn.commit()
+                    deleted += cursor.rowcount
+                    if cursor.rowcount < batch_size:
+                        break
+        finally:
+            close_db_connection(conn, cursor)
+    return deleted
+
+
+def list_shard_map():
+    """
+    Returns the configured shards and the applications mapped to them.
+    """
+    shard_map = load_shard_map(force=True) or {}
+    return [
+        {'env_id': int(env_id), **entry}
+        for env_id, entry in sorted(shard_map.items(), key=lambda item: int(item[0]))
+    ]
+
+
+def init_shard_ids():
+    """
+    Moves every shard's auto-increment counters above the highest id on any shard, so ids
+    created before DB_SHARDS was set (or a shard was added) are not issued again. Run after
+    `flask db upgrade` whenever DB_SHARDS changes, before traffic reaches the new shard.
+
+    Returns:
+        dict: table -> next id.
+    """
+    if not DB_SHARDS:
+        return {}
+    next_ids = {}
+    for table in ID_TABLES:
+        highest = 0
+        for shard in shard_names():
+            conn, cursor = _connect(shard)
+            try:
+                cursor.execute(f"SELECT COALESCE(MAX(id), 0) AS max_id FROM {table}")
+                highest = max(highest, cursor.fetchone()['max_id'])
+            finally:
+                close_db_connection(conn, cursor)
+        next_ids[table] = highest + 1
+        for shard in shard_names():
+            conn, cursor = _connect(shard)
+            try:
+                cursor.execute(f"ALTER TABLE {table} AUTO_INCREMENT = {int(highest) + 1}")
+            finally:
+                close_db_connection(conn, cursor)
+    return next_ids
@@ -0,0 +1,345 @@
+import time
+import threading
+from datetime import datetime, date, timedelta
+from mysql.connector import Error
+from app.database import get_db_connection, get_db_cursor, close_db_connection, shard_names
+from app.sharding import shards_for_query, scatter, ownership_filter
+from app.schema import register_hot_query
+
+# Days of daily history returned by GET /admin/stats unless the request asks for more
+DEFAULT_STATS_DAYS = 30
+MAX_STATS_DAYS = 366
+# Width of the createdAt windows the daily rebuild works through
+REBUILD_WINDOW_DAYS = 31
+
+UPSERT_STATS_QUERY = """
+    INSERT INTO ds_document_stats (module_id, env_id, type, document_count, total_bytes, stored_bytes)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        document_count = document_count + VALUES(document_count),
+        total_bytes = total_bytes + VALUES(total_bytes),
+        stored_bytes = stored_bytes + VALUES(stored_bytes)
+"""
+
+# Deletes per day in one rebuild window, from ds_document and from the archive; both are
+# range scans on the (deleted, deletedAt) indexes of migration 0013
+DELETES_BY_DAY_SQL = """
+            SELECT DATE(deletedAt) AS day, env_id, module_id, type, COUNT(*) AS deletes, COALESCE(SUM(filesize), 0) AS delete_bytes
+            FROM {table}
+            WHERE deleted = 1 AND deletedAt >= %s AND deletedAt < %s
+            GROUP BY DATE(deletedAt), env_id, module_id, type
+"""
+DELETES_BY_DAY_QUERY = register_hot_query(
+    "stats deletes by day", DELETES_BY_DAY_SQL.format(table="ds_document"), (date(2000, 1, 1), date(2000, 2, 1))
+)
+ARCHIVED_DELETES_BY_DAY_QUERY = register_hot_query(
+    "stats archived deletes by day", DELETES_BY_DAY_SQL.format(table="ds_document_archive"), (date(2000, 1, 1), date(2000, 2, 1))
+)
+
+UPSERT_DAILY_QUERY = """
+    INSERT INTO ds_document_stats_daily (day, env_id, module_id, type, uploads, upload_bytes, deletes, delete_bytes)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        uploads = uploads + VALUES(uploads),
+        upload_bytes = upload_bytes + VALUES(upload_bytes),
+        deletes = deletes + VALUES(deletes),
+        delete_bytes = delete_bytes + VALUES(delete_bytes)
+"""
+
+# --- Incremental updates (run inside the caller's transaction) ---
+
+def record_document_added(cursor, document, created_at):
+    """
+    Counts a newly inserted ds_document row.
+
+    Args:
+        cursor: Cursor of the transaction that inserted the row.
+        document (dict): env_id, module_id, type, filesize and optionally stored_size.
+        created_at (datetime): The row's createdAt (UTC).
+    """
+    filesize = document["filesize"] or 0
+    stored_size = document.get("stored_size") or filesize
+    cursor.execute(UPSERT_STATS_QUERY, (
+        document["module_id"], document["env_id"], document["type"], 1, filesize, stored_size
+    ))
+    cursor.execute(UPSERT_DAILY_QUERY, (
+        created_at.date(), document["env_id"], document["module_id"], document["type"], 1, filesize, 0, 0
+    ))
+
+def record_document_removed(cursor, document):
+    """
+    Uncounts a ds_document row that is being soft deleted; the deletion is dated today (UTC).
+
+    Args:
+        cursor: Cursor of the transaction that marks the row deleted.
+        document (dict): env_id, module_id, type, filesize and stored_size of the row.
+    """
+    filesize = document["filesize"] or 0
+    stored_size = document.get("stored_size") or filesize
+    cursor.execute(UPSERT_STATS_QUERY, (
+        document["module_id"], document["env_id"], document["type"], -1, -filesize, -stored_size
+    ))
+    cursor.execute(UPSERT_DAILY_QUERY, (
+        datetime.utcnow().date(), document["env_id"], document["module_id"], document["type"], 0, 0, 1, filesize
+    ))
+
+def record_stored_size_change(cursor, document, old_stored_size, new_stored_size, size_change=0):
+    """
+    Adjusts stored bytes after a document's stored representation changed (recompression),
+    and total bytes by size_change when its recorded original size was corrected.
+    """
+    cursor.execute(UPSERT_STATS_QUERY, (
+        document["module_id"], document["env_id"], document["type"], 0, size_change, new_stored_size - old_stored_size
+    ))
+
+# --- Read side ---
+
+def _stats_filters(data):
+    clauses, params = [], []
+    for param_name, column in (("env_id", "env_id"), ("module_id", "module_id")):
+        value = data.get(param_name)
+        if value is not None and str(value).strip() != "":
+            clauses.append(f"{column} = %s")
+            params.append(int(value))
+    return clauses, params
+
+def get_document_stats(data):
+    """
+    Returns document counts and bytes by env, module and type plus uploads and deletes per
+    day, read from the precomputed aggregates only.
+
+    Args:
+        data (dict): Optional 'env_id' and 'module_id' filters and 'days' of daily history.
+
+    Returns:
+        tuple: (response_dict, status_code)
+    """
+    try:
+        clauses, params = _stats_filters(data)
+        days = min(int(data.get("days", DEFAULT_STATS_DAYS)), MAX_STATS_DAYS)
+    except (TypeError, ValueError):
+        return {"error": "'env_id', 'module_id' and 'days' must be integers."}, 400
+
+    first_day = datetime.utcnow().date() - timedelta(days=days - 1)
+
+    shards = shards_for_query(data.get("env_id"))
+
+    def read_shard(shard):
+        shard_clauses, shard_params = list(clauses), list(params)
+        if len(shards) > 1:
+            # Skip copies left by an unfinished move between shards
+            ownership, ownership_params = ownership_filter(shard)
+            if ownership:
+                shard_clauses.append(ownership)
+                shard_params.extend(ownership_params)
+        conn = get_db_connection(read_only=True, shard=shard)
+        if not conn:
+            raise RuntimeError(f"Failed to connect to the database shard '{shard}'.")
+        cursor = get_db_cursor(conn)
+        try:
+            where = f" WHERE {' AND '.join(shard_clauses)}" if shard_clauses else ""
+            cursor.execute(f"""
+                SELECT module_id, env_id, type, document_count, total_bytes, stored_bytes
+                FROM ds_document_stats{where}
+            """, shard_params)
+            shard_rows = cursor.fetchall()
+
+            daily_where = " AND ".join(["day >= %s"] + shard_clauses)
+            cursor.execute(f"""
+                SELECT day, SUM(uploads) AS uploads, SUM(upload_bytes) AS upload_bytes,
+                       SUM(deletes) AS deletes, SUM(delete_bytes) AS delete_bytes
+                FROM ds_document_stats_daily
+                WHERE {daily_where}
+                GROUP BY day
+                ORDER BY day
+            """, [first_day] + shard_params)
+            return shard_rows, cursor.fetchall()
+        finally:
+            close_db_connection(conn, cursor)
+
+    # Aggregates live on the shard of their env_id
+    try:
+        results = scatter(read_shard, shards)
+    except RuntimeError as e:
+        print(f"ERROR: {e}")
+        return {"error": "Failed to connect to the database."}, 500
+    except Error as e:
+        print(f"ERROR: Failed to read document stats: {e}")
+        return {"error": "Failed to read document stats."}, 500
+    rows = [row for shard_rows, _ in results.values() for row in shard_rows]
+    daily_by_day = {}
+    for _, shard_daily in results.values():
+        for row in shard_daily:
+            merged = daily_by_day.setdefault(row["day"], {"day": row["day"], "uploads": 0, "upload_bytes": 0, "deletes": 0, "delete_bytes": 0})
+            for column in ("uploads", "upload_bytes", "deletes", "delete_bytes"):
+                merged[column] += int(row[column])
+    daily = [daily_by_day[day] for day in sorted(daily_by_day)]
+
+    def rollup(key_columns):
+        groups = {}
+        for row in rows:
+            key = tuple(row[column] for column in key_columns)
+            group = groups.setdefault(key, {"documents": 0, "bytes": 0, "storedBytes": 0})
+            group["documents"] += int(row["document_count"])
+            group["bytes"] += int(row["total_bytes"])
+            group["storedBytes"] += int(row["stored_bytes"])
+        return [
+            {**dict(zip(key_columns, key)), **totals}
+            for key, totals in sorted(groups.items(), key=lambda item: str(item[0]))
+        ]
+
+    totals = rollup([])
+    return {
+        "totals": totals[0] if totals else {"documents": 0, "bytes": 0, "storedBytes": 0},
+        "byEnv": rollup(["env_id"]),
+        "byModule": rollup(["module_id"]),
+        "byType": rollup(["type"]),
+        "byEnvModuleType": rollup(["env_id", "module_id", "type"]),
+        "daily": [
+            {
+                "day": row["day"].isoformat() if isinstance(row["day"], date) else row["day"],
+                "uploads": int(row["uploads"]),
+                "uploadBytes": int(row["upload_bytes"]),
+                "deletes": int(row["deletes"]),
+                "deleteBytes": int(row["delete_bytes"])
+            }
+            for row in daily
+        ],
+        "rebuild": dict(_rebuild_state)
+    }, 200
+
+# --- Rebuild ---
+
+_rebuild_lock = threading.Lock()
+_rebuild_state = {"running": False, "startedAt": None, "completedAt": None, "error": None}
+
+def _rebuild_scope_totals(conn, cursor, module_id, env_id):
+    # The locking INSERT ... SELECT holds the scope's index range, so uploads and deletes in it
+    # wait for this commit and then apply their increments on top of the rebuilt rows.
+    cursor.execute("DELETE FROM ds_document_stats WHERE module_id = %s AND env_id = %s", (module_id, env_id))
+    cursor.execute("""
+        INSERT INTO ds_document_stats (module_id, env_id, type, document_count, total_bytes, stored_bytes)
+        SELECT module_id, env_id, type, COUNT(*), COALESCE(SUM(filesize), 0),
+               COALESCE(SUM(COALESCE(stored_size, filesize)), 0)
+        FROM ds_document
+        WHERE module_id = %s AND env_id = %s AND deleted = 0
+        GROUP BY module_id, env_id, type
+    """, (module_id, env_id))
+    conn.commit()
+
+def _rebuild_daily_window(conn, cursor, start, end):
+    # History covers archived documents too; they were uploaded and deleted like any other
+    cursor.execute("DELETE FROM ds_document_stats_daily WHERE day >= %s AND day < %s", (start, end))
+    cursor.execute("""
+        INSERT INTO ds_document_stats_daily (day, env_id, module_id, type, uploads, upload_bytes, deletes, delete_bytes)
+        SELECT day, env_id, module_id, type, SUM(uploads), SUM(upload_bytes), 0, 0
+        FROM (
+            SELECT DATE(createdAt) AS day, env_id, module_id, type, COUNT(*) AS uploads, COALESCE(SUM(filesize), 0) AS upload_bytes
+            FROM ds_document
+            WHERE createdAt >= %s AND createdAt < %s
+            GROUP BY DATE(createdAt), env_id, module_id, type
+            UNION ALL
+            SELECT DATE(createdAt), env_id, module_id, type, COUNT(*), COALESCE(SUM(filesize), 0)
+            FROM ds_document_archive
+            WHERE createdAt >= %s AND createdAt < %s
+            GROUP BY DATE(createdAt), env_id, module_id, type
+        ) AS uploads_by_day
+        GROUP BY day, env_id, module_id, type
+    """, (start, end, start, end))
+    # Soft deletes are dated by deletedAt; updatedAt moves again on later changes such as a restore
+    cursor.execute(f"""
+        INSERT INTO ds_document_stats_daily (day, env_id, module_id, type, uploads, upload_bytes, deletes, delete_bytes)
+        SELECT day, env_id, module_id, type, 0, 0, SUM(deletes), SUM(delete_bytes)
+        FROM (
+            {DELETES_BY_DAY_QUERY}
+            UNION ALL
+            {ARCHIVED_DELETES_BY_DAY_QUERY}
+        ) AS deletes_by_day
+        GROUP BY day, env_id, module_id, type
+        ON DUPLICATE KEY UPDATE deletes = VALUES(deletes), delete_bytes = VALUES(delete_bytes)
+    """, (start, end, start, end))
+    conn.commit()
+
+def rebuild_document_stats(pause_seconds=0.0):
+    """
+    Recomputes both aggregate tables from ds_document on every shard, one (module, env)
+    scope and one createdAt window per transaction so concurrent uploads are only held up
+    briefly.
+
+    Args:
+        pause_seconds (float): Sleep between transactions to limit the load on the primary.
+
+    Returns:
+        dict: Counts of rebuilt 'scopes' and 'windows'.
+    """
+    result = {"scopes": 0, "windows": 0}
+    for shard in shard_names():
+        _rebuild_shard_stats(shard, pause_seconds, result)
+    return result
+
+def _rebuild_shard_stats(shard, pause_seconds, result):
+    conn = get_db_connection(shard=shard)
+    if not conn:
+        raise RuntimeError(f"Failed to connect to the database shard '{shard}' for the stats rebuild.")
+    cursor = get_db_cursor(conn)
+    try:
+        cursor.execute("SELECT DISTINCT module_id, env_id FROM ds_document")
+        scopes = [(row["module_id"], row["env_id"]) for row in cursor.fetchall()]
+        conn.commit()
+        for module_id, env_id in scopes:
+            _rebuild_scope_totals(conn, cursor, module_id, env_id)
+            result["scopes"] += 1
+            time.sleep(pause_seconds)
+        live_scopes = set(scopes)
+        cursor.execute("SELECT DISTINCT module_id, env_id FROM ds_document_stats")
+        stale = [(row["module_id"], row["env_id"]) for row in cursor.fetchall() if (row["module_id"], row["env_id"]) not in live_scopes]
+        for module_id, env_id in stale:
+            cursor.execute("DELETE FROM ds_document_stats WHERE module_id = %s AND env_id = %s", (module_id, env_id))
+        conn.commit()
+
+        cursor.execute("""
+            SELECT LEAST(COALESCE((SELECT MIN(createdAt) FROM ds_document), UTC_TIMESTAMP()),
+                         COALESCE((SELECT MIN(createdAt) FROM ds_document_archive), UTC_TIMESTAMP())) AS first_created
+        """)
+        first_created = cursor.fetchone()["first_created"]
+        conn.commit()
+        if first_created:
+            start = first_created.date()
+            last = datetime.utcnow().date() + timedelta(days=1)
+            while start < last:
+                end = min(start + timedelta(days=REBUILD_WINDOW_DAYS), last)
+                _rebuild_daily_window(conn, cursor, start, end)
+                result["windows"] += 1
+                start = end
+                time.sleep(pause_seconds)
+    except Error:
+        conn.rollback()
+        raise
+    finally:
+        close_db_connection(conn, cursor)
+
+def start_stats_rebuild(pause_seconds=0.0):
+    """
+    Runs rebuild_document_stats on a background thread unless one is already running.
+
+    Returns:
+        bool: True if a rebuild was started.
+    """
+    if not _rebuild_lock.acquire(blocking=False):
+        return False
+
+    def run():
+        try:
+            rebuild_document_stats(pause_seconds)
+            _rebuild_state["error"] = None
+            _rebuild_state["completedAt"] = datetime.utcnow().isoformat()
+        except Exception as e:
+            print(f"ERROR: Stats rebuild failed: {e}")
+            _rebuild_state["error"] = str(e)
+        finally:
+            _rebuild_state["running"] = False
+            _rebuild_lock.release()
+
+    _rebuild_state.update(running=True, startedAt=datetime.utcnow().isoformat())
+    threading.Thread(target=run, name="stats-rebuild", daemon=True).start()
+    return True
@@ -0,0 +1,133 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from mysql.connector import Error
+from app.database import get_db_connection, get_db_cursor, close_db_connection, DEFAULT_SHARD
+from app.storage import S3_PATH_PREFIX
+from app.storage.local import sharded_path, move_file
+from app.services.preview_services import thumbnail_path, preview_path
+
+# The YYYY/MM/DD directory a document was filed under; anything below it is sharding.
+_DATE_DIRECTORY_PATTERN = re.compile(r"^(.*/\d{4}/\d{2}/\d{2})(/.*)?$")
+
+
+def reshard_target(filepath):
+    """
+    Returns where a locally stored document belongs under the current shard settings.
+    Paths outside a YYYY/MM/DD tree are left where they are.
+    """
+    directory, filename = os.path.split(filepath)
+    match = _DATE_DIRECTORY_PATTERN.match(directory)
+    if not match:
+        return filepath
+    return sharded_path(match.group(1), filename).replace("\\", "/")
+
+
+def _move_with_derivatives(source, target):
+    move_file(source, target)
+    for derivative in (thumbnail_path, preview_path):
+        if os.path.exists(derivative(source)):
+            move_file(derivative(source), derivative(target))
+
+
+def _move_back(row, target):
+    # Returns a moved file to the path its row still records; a failure is logged, not raised
+    try:
+        _move_with_derivatives(target, row['filepath'])
+    except OSError as e:
+        print(f"ERROR: Could not move document {row['id']} back to {row['filepath']}: {e}")
+
+
+def _move_document(plan):
+    """Moves one file; returns (plan, outcome) where outcome is 'moved', 'missing' or 'failed'."""
+    row, target = plan
+    if not os.path.exists(row['filepath']):
+        return plan, 'missing'
+    try:
+        _move_with_derivatives(row['filepath'], target)
+        return plan, 'moved'
+    except OSError as e:
+        print(f"ERROR: Could not move document {row['id']} to {target}: {e}")
+        return plan, 'failed'
+
+
+def reshard_local_documents(workers=8, batch_size=500, dry_run=False, shard=DEFAULT_SHARD):
+    """
+    Moves locally stored documents of one database shard into the directory layout
+    configured by STORAGE_SHARD_LEVELS/STORAGE_SHARD_WIDTH and updates ds_document.filepath.
+
+    Rows are processed in id order, batch_size at a time, with file moves spread over
+    `workers` threads. Each batch's path updates are committed together. If the commit
+    fails, that batch's files are moved back, so paths on disk always match the database.
+    So are the files of rows whose filepath changed (e.g. by a recompression) while they
+    were moved; those count as 'skipped'.
+
+    Returns:
+        dict: Counts of 'moved', 'unchanged', 'missing', 'skipped' and 'failed' documents.
+    """
+    stats = {'moved': 0, 'unchanged': 0, 'missing': 0, 'skipped': 0, 'failed': 0}
+    last_id = 0
+    conn = get_db_connection(shard=shard)
+    if not conn:
+        raise RuntimeError(f"Failed to connect to the database shard '{shard}' for resharding.")
+    cursor = get_db_cursor(conn)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while True:
+                cursor.execute("""
+                    SELECT id, filepath
+                    FROM ds_document
+                    WHERE id > %s AND deleted = 0 AND filepath NOT LIKE %s
+                    ORDER BY id
+                    LIMIT %s
+                """, (last_id, S3_PATH_PREFIX + "%", batch_size))
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1]['id']
+
+                plans = []
+                for row in rows:
+                    target = reshard_target(row['filepath'])
+                    if target == row['filepath']:
+                        stats['unchanged'] += 1
+                    else:
+                        plans.append((row, target))
+                if dry_run:
+                    stats['moved'] += len(plans)
+                    continue
+
+                moved = []
+                for plan, outcome in pool.map(_move_document, plans):
+                    stats[outcome] += 1
+                    if outcome == 'moved':
+                        moved.append(plan)
+                if not moved:
+                    continue
+                unmatched = []
+                try:
+                    for row, target in moved:
+                        # Only rows still at the path whose file was moved
+                        cursor.execute(
+                            "UPDATE ds_document SET filepath = %s WHERE id = %s AND filepath = %s",
+                            (target, row['id'], row['filepath'])
+                        )
+                        if not cursor.rowcount:
+                            unmatched.append((row, target))
+                    conn.commit()
+                except Error as e:
+                    conn.rollback()
+                    print(f"ERROR: Failed to record batch ending at id {last_id}, moving files back: {e}")
+                    for row, target in moved:
+                        _move_back(row, target)
+                    stats['moved'] -= len(moved)
+                    stats['failed'] += len(moved)
+                    continue
+                for row, target in unmatched:
+                    _move_back(row, target)
+                stats['moved'] -= len(unmatched)
+                stats['skipped'] += len(unmatched)
+                print(f"Resharded up to document id {last_id}: {stats}")
+    finally:
+        close_db_connection(conn, cursor)
+    return stats
@@ -0,0 +1,504 @@
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import threading
+from datetime import datetime, timezone
+import mysql.connector
+from werkzeug.exceptions import ClientDisconnected
+from app.database import get_db_connection, get_db_cursor, close_db_connection, mark_primary_write
+from app.sharding import is_sharded, get_env_connection
+from app.storage import get_storage, get_storage_for_path
+from app.services.document_services import (
+    extract_upload_metadata,
+    get_document_master_rules,
+    validate_upload_file,
+    build_document_location,
+    insert_document_record,
+    invalidate_document_list,
+    publish_document_uploaded
+)
+from app.services.preview_services import schedule_previews
+from app.services.compression_services import store_document_file, open_document_content, COMPRESSED_SUFFIX
+
+# Resumable (tus-style) uploads: each session is a <id>.json state file and a <id>.part data
+# file in the staging folder. With local storage, keep the staging folder on the same
+# filesystem as the upload folders so finalizing is an atomic rename.
+UPLOAD_STAGING_FOLDER = os.getenv("UPLOAD_STAGING_FOLDER", "uploads/staging")
+# Sessions with no activity for this long are removed by cleanup_expired_upload_sessions.
+UPLOAD_SESSION_TTL_SECONDS = int(os.getenv("UPLOAD_SESSION_TTL_SECONDS", str(24 * 3600)))
+# Chunks are copied to disk in pieces of this size, so memory per request stays bounded.
+UPLOAD_COPY_BUFFER_SIZE = 64 * 1024
+# A session lock older than this belongs to a request that died; it may be taken over.
+UPLOAD_LOCK_STALE_SECONDS = 300
+# Held locks are touched this often, so a slow chunk or finalize never looks stale.
+UPLOAD_LOCK_HEARTBEAT_SECONDS = 30
+# Expired sessions are swept at most this often per process.
+UPLOAD_CLEANUP_INTERVAL_SECONDS = 600
+
+_SESSION_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+_last_cleanup = 0.0
+# Lock files held by this process, kept fresh by the heartbeat thread
+_held_locks = set()
+_held_locks_mutex = threading.Lock()
+_heartbeat_started = False
+
+
+def _error(code, message):
+    return {
+        "responseCode": code,
+        "responseStatus": "error",
+        "responseMessage": message
+    }
+
+
+def _session_paths(session_id):
+    """Returns the (state, data, lock) file paths of a session."""
+    base = os.path.join(UPLOAD_STAGING_FOLDER, session_id)
+    return base + ".json", base + ".part", base + ".lock"
+
+
+def _write_session_state(session):
+    state_path = _session_paths(session["id"])[0]
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(session, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, state_path)
+
+
+def _load_session(session_id, user_id):
+    """
+    Reads a session's state, checking that it exists, belongs to user_id and has not expired.
+
+    Returns:
+        tuple: (session, error_response)
+    """
+    if not session_id or not _SESSION_ID_PATTERN.match(session_id):
+        return None, _error(404, "Upload session not found.")
+    state_path, part_path, _ = _session_paths(session_id)
+    try:
+        with open(state_path, encoding="utf-8") as f:
+            session = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None, _error(404, "Upload session not found.")
+    if session.get("user_id") != user_id:
+        return None, _error(404, "Upload session not found.")
+    if session["expiresAt"] < time.time():
+        return None, _error(410, "Upload session has expired.")
+    if not os.path.exists(part_path):
+        return None, _error(404, "Upload session data is missing.")
+    return session, None
+
+
+def _refresh_held_locks():
+    # Under the mutex, so a lock being released is never touched after its file is removed
+    with _held_locks_mutex:
+        for lock_path in _held_locks:
+            try:
+                os.utime(lock_path)
+            except OSError as e:
+                print(f"WARNING: Could not refresh upload session lock {lock_path}: {e}")
+
+
+def _run_lock_heartbeat():
+    while True:
+        time.sleep(UPLOAD_LOCK_HEARTBEAT_SECONDS)
+        _refresh_held_locks()
+
+
+def _start_lock_heartbeat():
+    global _heartbeat_started
+    with _held_locks_mutex:
+        if _heartbeat_started:
+            return
+        _heartbeat_started = True
+    threading.Thread(target=_run_lock_heartbeat, name="upload-lock-heartbeat", daemon=True).start()
+
+
+def _acquire_lock(lock_path):
+    """
+    Takes a cross-process lock on a session by creating its lock file exclusively.
+    Returns False if another live request holds it. While held, the lock file's mtime is
+    refreshed every UPLOAD_LOCK_HEARTBEAT_SECONDS, so only a lock whose holder died goes
+    stale, however long the holder's request takes.
+    """
+    _start_lock_heartbeat()
+    for _ in range(2):
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            with _held_locks_mutex:
+                _held_locks.add(lock_path)
+            return True
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) < UPLOAD_LOCK_STALE_SECONDS:
+                    return False
+                os.remove(lock_path)
+            except FileNotFoundError:
+                pass
+    return False
+
+
+def _release_lock(lock_path):
+    with _held_locks_mutex:
+        _held_locks.discard(lock_path)
+        try:
+            os.remove(lock_path)
+        except FileNotFoundError:
+            pass
+
+
+def _session_status(session, offset):
+    return {
+        "sessionId": session["id"],
+        "offset": offset,
+        "length": session["length"],
+        "expiresAt": datetime.fromtimestamp(session["expiresAt"], tz=timezone.utc).isoformat()
+    }
+
+
+def create_upload_session(data, user_id):
+    """
+    Starts a resumable upload after validating its metadata against ds_document_master.
+
+    Args:
+        data (dict): The upload metadata ("method", "module", "application_id",
+                     "reference_id", optional "parent_id") plus "filename" and the total
+                     "length" in bytes.
+        user_id (int): The ID of the user starting the upload, obtained from JWT.
+    """
+    if not data:
+        return _error(400, "Request body must be JSON.")
+
+    upload_fields, metadata_error = extract_upload_metadata(data)
+    if metadata_error:
+        return metadata_error
+    file_type, module_id, env_id, ref_id, parent_id = upload_fields
+
+    filename = data.get("filename")
+    try:
+        length = int(data.get("length"))
+    except (TypeError, ValueError):
+        length = 0
+    if not filename or length <= 0:
+        return _error(400, "Missing required fields: filename and a positive length.")
+
+    conn = get_db_connection(read_only=True)
+    if not conn:
+        return _error(500, "Failed to connect to the database.")
+    cursor = get_db_cursor(conn)
+    try:
+        rules, rules_error = get_document_master_rules(cursor, env_id, module_id, file_type)
+        if rules_error:
+            return rules_error
+        validation_error = validate_upload_file(filename, length, rules)
+        if validation_error:
+            return validation_error
+    except mysql.connector.Error as e:
+        print(f"Database error while creating upload session: {e}")
+        return _error(500, f"Failed to validate upload: {str(e)}")
+    finally:
+        close_db_connection(conn, cursor)
+
+    cleanup_expired_upload_sessions(only_if_due=True)
+
+    os.makedirs(UPLOAD_STAGING_FOLDER, exist_ok=True)
+    session = {
+        "id": uuid.uuid4().hex,
+        "user_id": user_id,
+        "metadata": {
+            "method": file_type,
+            "module": module_id,
+            "application_id": env_id,
+            "reference_id": ref_id,
+            "parent_id": parent_id
+        },
+        "filename": filename,
+        "length": length,
+        "expiresAt": time.time() + UPLOAD_SESSION_TTL_SECONDS
+    }
+    open(_session_paths(session["id"])[1], "wb").close()
+    _write_session_state(session)
+
+    return {
+        "responseCode": 200,
+        "responseStatus": "success",
+        "responseMessage": "Upload session created",
+        "responseData": _session_status(session, 0)
+    }
+
+
+def get_upload_session_status(session_id, user_id):
+    """
+    Returns the number of bytes received so far, so a client can resume after a disconnect.
+    """
+    session, error = _load_session(session_id, user_id)
+    if error:
+        return error
+    return {
+        "responseCode": 200,
+        "responseStatus": "success",
+        "responseMessage": "Upload session status",
+        "responseData": _session_status(session, os.path.getsize(_session_paths(session_id)[1]))
+    }
+
+
+def append_upload_chunk(session_id, offset, stream, user_id):
+    """
+    Appends a chunk read from stream to the session's staging file.
+
+    The chunk must start at the current offset. Bytes received before a client disconnect
+    are kept, so the client resumes from wherever the transfer stopped.
+
+    Args:
+        session_id (str): The upload session.
+        offset (int): The offset the client believes the chunk starts at (Upload-Offset).
+        stream: A file-like object with the chunk body.
+        user_id (int): The ID of the uploading user.
+    """
+    session, error = _load_session(session_id, user_id)
+    if error:
+        return error
+    _, part_path, lock_path = _session_paths(session_id)
+
+    if not _acquire_lock(lock_path):
+        return _error(423, "Another request is writing to this upload session.")
+    try:
+        current_offset = os.path.getsize(part_path)
+        if offset != current_offset:
+            response = _error(409, f"Upload-Offset mismatch; the session is at offset {current_offset}.")
+            response["responseData"] = _session_status(session, current_offset)
+            return response
+
+        remaining = session["length"] - current_offset
+        overflow = False
+        with open(part_path, "ab") as f:
+            try:
+                while remaining > 0:
+                    chunk = stream.read(min(UPLOAD_COPY_BUFFER_SIZE, remaining))
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    remaining -= len(chunk)
+                overflow = remaining == 0 and bool(stream.read(1))
+            except ClientDisconnected:
+                pass  # Keep what arrived; the client resumes from the new offset
+            f.flush()
+            os.fsync(f.fileno())
+
+        session["expiresAt"] = time.time() + UPLOAD_SESSION_TTL_SECONDS
+        _write_session_state(session)
+        new_offset = session["length"] - remaining
+
+        if overflow:
+            response = _error(400, "Chunk exceeds the declared upload length.")
+            response["responseData"] = _session_status(session, new_offset)
+            return response
+        return {
+            "responseCode": 200,
+            "responseStatus": "success",
+            "responseMessage": "Chunk received",
+            "responseData": _session_status(session, new_offset)
+        }
+    finally:
+        _release_lock(lock_path)
+
+
+def finalize_upload_session(session_id, user_id):
+    """
+    Completes a resumable upload: moves the staging file into the YYYY/MM/DD tree and
+    inserts the ds_document row. If the insert fails the file goes back to staging so the
+    client can retry the finalize without re-sending data.
+    """
+    session, error = _load_session(session_id, user_id)
+    if error:
+        return error
+    state_path, part_path, lock_path = _session_paths(session_id)
+
+    if not _acquire_lock(lock_path):
+        return _error(423, "Another request is writing to this upload session.")
+
+    conn = None
+    cursor = None
+    file_path_on_disk = None
+    try:
+        received = os.path.getsize(part_path)
+        if received != session["length"]:
+            response = _error(409, f"Upload is incomplete: {received} of {session['length']} bytes received.")
+            response["responseData"] = _session_status(session, received)
+            return response
+
+        metadata = session["metadata"]
+        file_type = metadata["method"]
+        conn = get_db_connection()
+        if not conn:
+            return _error(500, "Failed to connect to the database.")
+        cursor = get_db_cursor(conn)
+
+        # The master rule may have changed while the upload was in progress
+        rules, rules_error = get_document_master_rules(cursor, metadata["application_id"], metadata["module"], file_type)
+        if rules_error:
+            return rules_error
+        validation_error = validate_upload_file(session["filename"], received, rules)
+        if validation_error:
+            return validation_error
+        if is_sharded():
+            # The master rule is read from the primary; the row goes to the application's shard
+            close_db_connection(conn, cursor)
+            conn = cursor = None
+            conn = get_env_connection(metadata["application_id"])
+            if not conn:
+                return _error(500, "Failed to connect to the database.")
+            cursor = get_db_cursor(conn)
+
+        dynamic_path, unique_filename, file_ext, original_filename = build_document_location(rules, file_type, session["filename"])
+        stored_size = received
+        content_encoding = None
+        if (rules.get("compression_policy") or "none") == "none":
+            file_path_on_disk = get_storage().save_local_file(part_path, dynamic_path, unique_filename)
+        else:
+            with open(part_path, "rb") as source:
+                file_path_on_disk, _, stored_size, content_encoding = store_document_file(
+                    get_storage(), source, dynamic_path, unique_filename, rules
+                )
+            os.remove(part_path)
+
+        document = {
+            "env_id": metadata["application_id"],
+            "parent_id": metadata["parent_id"],
+            "ref_id": metadata["reference_id"],
+            "module_id": metadata["module"],
+            "type": file_type,
+            "filename": unique_filename,
+            "original_filename": original_filename,
+            "filepath": file_path_on_disk,
+            "filesize": received,
+            "stored_size": stored_size,
+            "content_encoding": content_encoding,
+            "extension": file_ext
+        }
+        document_id = insert_document_record(cursor, document, user_id)
+        conn.commit()
+        mark_primary_write(user_id)
+        stored_path = file_path_on_disk
+        file_path_on_disk = None  # Committed; nothing to move back
+        os.remove(state_path)
+        invalidate_document_list(metadata["module"], metadata["application_id"], metadata["reference_id"])
+        publish_document_uploaded(document_id, document)
+        schedule_previews(document_id, stored_path, file_ext, env_id=metadata["application_id"])
+
+        return {
+            "responseCode": 200,
+            "responseStatus": "success",
+            "responseMessage": "Document uploaded successfully",
+            "responseData": {
+                "id": document_id,
+                "type": file_type,
+                "name": original_filename,
+                "path": stored_path,
+                "fileName": unique_filename
+            },
+            "fileName": original_filename
+        }
+    except mysql.connector.Error as e:
+        if conn:
+            conn.rollback()
+        print(f"Database error while finalizing upload session {session_id}: {e}")
+        return _error(500, f"Failed to store document metadata: {str(e)}")
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        print(f"Unexpected error while finalizing upload session {session_id}: {e}")
+        return _error(500, f"Unexpected error: {str(e)}")
+    finally:
+        if file_path_on_disk:
+            _return_to_staging(file_path_on_disk, part_path)
+        close_db_connection(conn, cursor)
+        _release_lock(lock_path)
+
+
+def _return_to_staging(stored_path, part_path):
+    """
+    Moves a stored file back to its session's staging file after a failed finalize.
+    """
+    storage = get_storage_for_path(stored_path)
+    if not storage.exists(stored_path):
+        return
+    with open_document_content(stored_path, "gzip" if stored_path.endswith(COMPRESSED_SUFFIX) else None) as src, \
+            open(part_path, "wb") as dst:
+        shutil.copyfileobj(src, dst, UPLOAD_COPY_BUFFER_SIZE)
+    storage.delete(stored_path)
+
+
+def abort_upload_session(session_id, user_id):
+    """
+    Cancels a resumable upload and removes its staging files.
+    """
+    session, error = _load_session(session_id, user_id)
+    if error:
+        return error
+    state_path, part_path, lock_path = _session_paths(session_id)
+    if not _acquire_lock(lock_path):
+        return _error(423, "Another request is writing to this upload session.")
+    try:
+        for path in (state_path, part_path):
+            if os.path.exists(path):
+                os.remove(path)
+    finally:
+        _release_lock(lock_path)
+    return {
+        "responseCode": 200,
+        "responseStatus": "success",
+        "responseMessage": "Upload session cancelled"
+    }
+
+
+def cleanup_expired_upload_sessions(only_if_due=False):
+    """
+    Removes the staging files of expired sessions, and data files whose state file is gone.
+
+    Args:
+        only_if_due (bool): Skip the sweep if this process ran one recently.
+
+    Returns:
+        int: The number of sessions removed.
+    """
+    global _last_cleanup
+    now = time.time()
+    if only_if_due and now - _last_cleanup < UPLOAD_CLEANUP_INTERVAL_SECONDS:
+        return 0
+    _last_cleanup = now
+    if not os.path.isdir(UPLOAD_STAGING_FOLDER):
+        return 0
+
+    removed = 0
+    for entry in os.scandir(UPLOAD_STAGING_FOLDER):
+        session_id, ext = os.path.splitext(entry.name)
+        if ext not in (".json", ".part") or not _SESSION_ID_PATTERN.match(session_id):
+            continue
+        state_path, part_path, lock_path = _session_paths(session_id)
+        if ext == ".json":
+            try:
+                with open(state_path, encoding="utf-8") as f:
+                    expired = json.load(f)["expiresAt"] < now
+            except (OSError, ValueError, KeyError):
+                expired = True
+        else:
+            # Data left behind without a state file (e.g. a crash mid-finalize)
+            expired = not os.path.exists(state_path) and now - entry.stat().st_mtime > UPLOAD_SESSION_TTL_SECONDS
+        if not expired or not _acquire_lock(lock_path):
+            continue
+        try:
+            for path in (state_path, part_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            removed += 1
+        finally:
+            _release_lock(lock_path)
+    if removed:
+        print(f"Removed {removed} expired upload session(s).")
+    return removed
@@ -0,0 +1,215 @@
+import os
+import zipfile
+from datetime import datetime
+import mysql.connector
+from app.database import close_db_connection, run_statement
+from app.sharding import get_env_connection
+from app.services.compression_services import open_document_content
+from app.utils import metrics
+
+# Documents in one ZIP download at most
+MAX_ZIP_DOCUMENTS = int(os.getenv("MAX_ZIP_DOCUMENTS", "500"))
+# Types whose content is already compressed; they are stored rather than deflated again
+ZIP_STORED_EXTENSIONS = {
+    ext.strip().lstrip(".").lower()
+    for ext in os.getenv(
+        "ZIP_STORED_EXTENSIONS",
+        "jpg,jpeg,png,gif,webp,heic,mp3,mp4,mov,zip,gz,tgz,7z,rar,bz2,xz,docx,xlsx,pptx,odt,ods"
+    ).split(",")
+    if ext.strip()
+}
+ZIP_DEFLATE_LEVEL = int(os.getenv("ZIP_DEFLATE_LEVEL", "6"))
+ZIP_CHUNK_SIZE = 64 * 1024
+
+ZIP_DOCUMENTS_BY_REFERENCE_QUERY = """
+    SELECT id, type, filepath, original_filename, extension, filesize, content_encoding, createdAt
+    FROM ds_document
+    WHERE module_id = %s AND env_id = %s AND ref_id = %s AND deleted = 0
+    ORDER BY id
+    LIMIT %s
+"""
+
+
+def _error(code, message):
+    return {"responseCode": code, "responseStatus": "error", "responseMessage": message}
+
+
+def get_zip_documents(data, user_id):
+    """
+    Finds the documents for a ZIP download: every live document of ("module",
+    "application_id", "reference_id"), or the live documents among "ids" that belong to
+    "module" and "application_id" (and "reference_id" when given), as single downloads
+    must match their scope too. Rows are read from the shard that owns the application only,
+    so copies left on another shard by a move are never included.
+
+    Returns:
+        dict: A standard response; on success it also carries "documents" (rows in id order)
+              and "filename" (the suggested archive name).
+    """
+    data = data or {}
+    module_id = data.get("module")
+    env_id = data.get("application_id")
+    ref_id = data.get("reference_id")
+    ids = data.get("ids")
+
+    if ids is not None:
+        if not all([module_id, env_id]):
+            return _error(400, "'module' and 'application_id' are required with 'ids'.")
+        if not isinstance(ids, list) or not ids:
+            return _error(400, "'ids' must be a non-empty list of document ids.")
+        try:
+            ids = sorted({int(document_id) for document_id in ids})
+        except (TypeError, ValueError):
+            return _error(400, "'ids' must be a list of integers.")
+        if len(ids) > MAX_ZIP_DOCUMENTS:
+            return _error(400, f"At most {MAX_ZIP_DOCUMENTS} documents can be downloaded at once.")
+        clauses = [f"id IN ({', '.join(['%s'] * len(ids))})", "module_id = %s", "env_id = %s", "deleted = 0"]
+        params = list(ids) + [module_id, env_id]
+        if ref_id:
+            clauses.append("ref_id = %s")
+            params.append(ref_id)
+        query = f"""
+            SELECT id, type, filepath, original_filename, extension, filesize, content_encoding, createdAt
+            FROM ds_document
+            WHERE {' AND '.join(clauses)}
+            ORDER BY id
+        """
+        filename = f"documents-{ids[0]}.zip" if len(ids) == 1 else f"documents-{len(ids)}.zip"
+    elif all([module_id, env_id, ref_id]):
+        query = ZIP_DOCUMENTS_BY_REFERENCE_QUERY
+        params = (module_id, env_id, ref_id, MAX_ZIP_DOCUMENTS + 1)
+        filename = f"{ref_id}.zip"
+    else:
+        return _error(400, "Provide 'module' and 'application_id' with 'ids' or 'reference_id'.")
+
+    conn = get_env_connection(env_id, read_only=True, sticky_key=user_id)
+    if not conn:
+        return _error(500, "Failed to connect to the database.")
+    try:
+        documents = run_statement(conn, query, params).rows
+    except mysql.connector.Error as e:
+        print(f"Database error during ZIP download lookup: {e}")
+        return _error(500, f"Failed to retrieve documents: {str(e)}")
+    finally:
+        close_db_connection(conn)
+
+    if not documents:
+        return _error(404, "No documents found.")
+    if len(documents) > MAX_ZIP_DOCUMENTS:
+        return _error(400, f"The reference has more than {MAX_ZIP_DOCUMENTS} documents; download them by 'ids'.")
+    return {
+        "responseCode": 200,
+        "responseStatus": "success",
+        "responseMessage": f"ZIP download of {len(documents)} document(s) started",
+        "documents": documents,
+        "filename": "".join(c if c.isalnum() or c in "-_." else "_" for c in filename)
+    }
+
+
+class _ZipOutput:
+    """
+    Write-only, unseekable sink for ZipFile. Written bytes wait here until the response
+    generator drains them, so at most about one chunk is buffered.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self.discard = False
+
+    def write(self, data):
+        if not self.discard:
+            self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _entry_name(document, used_names):
+    # '<type>/<original name>', made unique within the archive
+    original = (document['original_filename'] or f"document-{document['id']}").replace("/", "_").replace("\\", "_")
+    folder = (document['type'] or "documents").replace("/", "_").replace("\\", "_")
+    name = f"{folder}/{original}"
+    if name in used_names:
+        stem, dot, extension = original.rpartition(".")
+        if not dot:
+            stem, extension = original, ""
+        counter = 2
+        while name in used_names:
+            name = f"{folder}/{stem} ({counter}){dot}{extension}"
+            counter += 1
+    used_names.add(name)
+    return name
+
+
+def _zip_info(name, document):
+    created = document.get('createdAt')
+    date_time = created.timetuple()[:6] if isinstance(created, datetime) and created.year >= 1980 else (1980, 1, 1, 0, 0, 0)
+    info = zipfile.ZipInfo(name, date_time=date_time)
+    extension = (document.get('extension') or name.rpartition(".")[2]).lower()
+    if extension in ZIP_STORED_EXTENSIONS:
+        info.compress_type = zipfile.ZIP_STORED
+    else:
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info._compresslevel = ZIP_DEFLATE_LEVEL  # ZipFile.open() takes the level from the ZipInfo
+    # Sizing the entry up front lets ZipFile decide on ZIP64 for it before writing
+    info.file_size = document.get('filesize') or 0
+    info.external_attr = 0o644 << 16
+    return info
+
+
+def stream_zip(documents):
+    """
+    Yields a ZIP archive of the documents as it is built. Each file is read in chunks,
+    decompressed if stored gzipped, and stored or deflated by type. ZIP64 records are used
+    when an entry or the archive needs them. Nothing is written to disk.
+
+    Files that can no longer be opened are replaced by a '<name>.missing.txt' entry, since
+    the response status has already been sent. If the client disconnects, the open file is
+    closed and no more data is produced.
+    """
+    output = _ZipOutput()
+    archive = zipfile.ZipFile(output, mode="w", allowZip64=True)
+    used_names = set()
+    finished = False
+    try:
+        for document in documents:
+            name = _entry_name(document, used_names)
+            try:
+                stream = open_document_content(document['filepath'], document['content_encoding'])
+            except Exception as e:
+                print(f"ERROR: Stored file for document ID={document['id']} could not be opened for ZIP: {e}")
+                metrics.incr("zip.missing_files")
+                archive.writestr(f"{name}.missing.txt", f"Stored file for document {document['id']} is missing.\n")
+                yield output.drain()
+                continue
+            try:
+                info = _zip_info(name, document)
+                # Old rows may record 0 bytes; without a trustworthy size, reserve ZIP64 fields
+                force_zip64 = info.file_size == 0 or info.file_size > zipfile.ZIP64_LIMIT // 2
+                with archive.open(info, mode="w", force_zip64=force_zip64) as entry:
+                    while True:
+                        chunk = stream.read(ZIP_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        entry.write(chunk)
+                        data = output.drain()
+                        if data:
+                            yield data
+            finally:
+                stream.close()
+            yield output.drain()
+        archive.close()  # Central directory, with ZIP64 end records when needed
+        finished = True
+        yield output.drain()
+        metrics.incr("zip.completed")
+    finally:
+        if not finished:
+            # Client went away (GeneratorExit) or a read failed: stop without finishing the archive
+            output.discard = True
+            metrics.incr("zip.cancelled")
@@ -0,0 +1,162 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from mysql.connector import Error
+from app.database import DB_SHARDS, DEFAULT_SHARD, get_db_connection, get_db_cursor, close_db_connection, shard_names
+from app.utils import metrics
+
+# ds_document, ds_document_archive, ds_access_log and the document stats tables live on the
+# shard that owns their env_id; every other table stays on the primary. ds_shard_map (on the
+# primary) lists the env_ids that are not on the default shard or are being moved.
+
+# How often each process reloads ds_shard_map. A move waits longer than this before and
+# after switching an application, so every process has seen the change.
+SHARD_MAP_REFRESH_SECONDS = float(os.getenv("SHARD_MAP_REFRESH_SECONDS", "5"))
+# Threads running the per-shard queries of admin lists and stats
+SHARD_SCATTER_WORKERS = int(os.getenv("SHARD_SCATTER_WORKERS", "8"))
+
+# Map states: 'active' (served by its shard), 'copying' (served by its shard while rows are
+# copied to the target) and 'frozen' (reads only, during the final copy and switch)
+SHARD_STATES = ("active", "copying", "frozen")
+
+# Tables partitioned by env_id
+SHARDED_TABLES = ("ds_document", "ds_document_archive", "ds_access_log", "ds_document_stats", "ds_document_stats_daily")
+
+_shard_map = {}  # str(env_id) -> {'shard', 'state', 'target'}
+_shard_map_loaded_at = None
+_shard_map_lock = threading.Lock()
+_scatter_executor = None
+_scatter_lock = threading.Lock()
+
+
+def is_sharded():
+    return bool(DB_SHARDS)
+
+
+def load_shard_map(force=False):
+    """
+    Returns the cached shard map, reloading it from ds_shard_map when it is older than
+    SHARD_MAP_REFRESH_SECONDS. If the reload fails the previous map is kept.
+
+    Returns:
+        dict: str(env_id) -> {'shard', 'state', 'target'}, or None if it was never loaded.
+    """
+    global _shard_map, _shard_map_loaded_at
+    now = time.monotonic()
+    if not force and _shard_map_loaded_at is not None and now - _shard_map_loaded_at < SHARD_MAP_REFRESH_SECONDS:
+        return _shard_map
+    if not _shard_map_lock.acquire(blocking=_shard_map_loaded_at is None or force):
+        return _shard_map  # Another thread is reloading; the current map is still usable
+    try:
+        conn = get_db_connection()
+        if not conn:
+            return _shard_map if _shard_map_loaded_at is not None else None
+        cursor = get_db_cursor(conn)
+        try:
+            cursor.execute("SELECT env_id, shard, state, target FROM ds_shard_map")
+            _shard_map = {
+                str(row['env_id']): {'shard': row['shard'], 'state': row['state'], 'target': row['target']}
+                for row in cursor.fetchall()
+            }
+            _shard_map_loaded_at = time.monotonic()
+            metrics.incr("shards.map_loads")
+        except Error as e:
+            print(f"WARNING: Failed to load the shard map: {e}")
+            if _shard_map_loaded_at is None:
+                return None
+        finally:
+            close_db_connection(conn, cursor)
+        return _shard_map
+    finally:
+        _shard_map_lock.release()
+
+
+def shard_for_env(env_id):
+    """
+    Returns the name of the shard that owns env_id, or None when the shard map cannot be
+    read. Without DB_SHARDS every env_id is on the default shard.
+    """
+    if not DB_SHARDS or env_id is None:
+        return DEFAULT_SHARD
+    shard_map = load_shard_map()
+    if shard_map is None:
+        return None
+    entry = shard_map.get(str(env_id))
+    return entry['shard'] if entry else DEFAULT_SHARD
+
+
+def get_env_connection(env_id, read_only=False, sticky_key=None):
+    """
+    Gets a connection to the shard that owns env_id. Writes (read_only=False) get None while
+    the application is frozen for a move between shards, as they would for a database outage.
+    """
+    if not DB_SHARDS:
+        return get_db_connection(read_only=read_only, sticky_key=sticky_key)
+    shard = shard_for_env(env_id)
+    if shard is None:
+        print(f"ERROR: No shard map available to route application {env_id}.")
+        return None
+    if not read_only:
+        entry = (_shard_map or {}).get(str(env_id))
+        if entry and entry['state'] == 'frozen':
+            metrics.incr("shards.frozen_writes")
+            print(f"WARNING: Application {env_id} is being moved to shard '{entry['target']}'; write refused.")
+            return None
+    return get_db_connection(read_only=read_only, sticky_key=sticky_key, shard=shard)
+
+
+def shards_for_query(env_id=None):
+    """
+    Returns the shards a query must visit: the owner of env_id when it is given, otherwise
+    all of them.
+    """
+    if not DB_SHARDS:
+        return [DEFAULT_SHARD]
+    if env_id is not None and str(env_id).strip() != "":
+        shard = shard_for_env(env_id)
+        if shard is not None:
+            return [shard]
+    return shard_names()
+
+
+def scatter(function, shards):
+    """
+    Calls function(shard) for every shard, in parallel when there is more than one.
+
+    Returns:
+        dict: shard -> return value. An exception raised for any shard is re-raised.
+    """
+    global _scatter_executor
+    if len(shards) == 1:
+        return {shards[0]: function(shards[0])}
+    with _scatter_lock:
+        if _scatter_executor is None:
+            _scatter_executor = ThreadPoolExecutor(max_workers=SHARD_SCATTER_WORKERS, thread_name_prefix="shard-scatter")
+    futures = {shard: _scatter_executor.submit(function, shard) for shard in shards}
+    return {shard: future.result() for shard, future in futures.items()}
+
+
+def ownership_filter(shard, column="env_id"):
+    """
+    Returns (sql, params) restricting a scatter query on shard to the applications it owns,
+    so rows copied by an unfinished move are not counted twice. sql is empty when the shard
+    holds no other application's rows.
+    """
+    if not DB_SHARDS:
+        return "", []
+    foreign = sorted(
+        int(env_id) for env_id, entry in (load_shard_map() or {}).items()
+        if entry['shard'] != shard
+    )
+    if not foreign:
+        return "", []
+    return f"({column} IS NULL OR {column} NOT IN ({', '.join(['%s'] * len(foreign))}))", foreign
+
+
+def shard_map_version():
+    """
+    Identifies the current shard map, for validators of results gathered from many shards.
+    """
+    shard_map = load_shard_map() if DB_SHARDS else {}
+    return "|".join(f"{env_id}:{entry['shard']}" for env_id, entry in sorted((shard_map or {}).items()))
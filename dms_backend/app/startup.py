@@ -0,0 +1,206 @@
+import os
+import time
+import threading
+from flask import jsonify
+from app.database import init_db_pool, check_database, db_replica_pools, shard_names, DEFAULT_SHARD
+from app.schema import verify_query_plans
+from app.storage import STORAGE_BACKEND
+from app.services.preview_services import requeue_pending_previews
+from app.services.document_services import (
+    BASE_UPLOAD_FOLDER, UPLOAD_JOURNAL, UPLOAD_JOURNAL_DIR,
+    preload_document_master_rules, start_upload_journal_applier
+)
+from app.services.upload_session_services import UPLOAD_STAGING_FOLDER
+from app.services.archive_services import start_document_archiver
+from app.utils import metrics
+
+# Run the startup tasks (pool, plan check, warmup, background workers) on a background
+# thread as soon as a server entry point has loaded the app ('background') or leave them to
+# the first request ('off'). CLI commands never start them.
+STARTUP_TASKS = os.getenv("STARTUP_TASKS", "background").lower()
+# Open the pools and preload document master rules before /readyz reports ready
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "true").lower() == "true"
+# Wait between startup attempts while the database is unreachable
+STARTUP_RETRY_SECONDS = float(os.getenv("STARTUP_RETRY_SECONDS", "5"))
+# /readyz reuses a database check this recent instead of checking out another connection
+READINESS_DB_CACHE_SECONDS = float(os.getenv("READINESS_DB_CACHE_SECONDS", "5"))
+
+# perf_counter at import of the app package; set by app/__init__.py
+_process_started = None
+_startup_lock = threading.Lock()
+_startup = {
+    "state": "pending",  # pending, running, done or failed
+    "error": None,
+    "attempts": 0,
+    "rulesPreloaded": 0,
+    "importSeconds": None,
+    "poolSeconds": None,
+    "warmupSeconds": None,
+    "readySeconds": None
+}
+
+
+# shard -> (checked at, ok, detail)
+_database_checks = {}
+_database_checks_lock = threading.Lock()
+
+
+class _StartupAborted(Exception):
+    """A startup failure that retrying cannot fix."""
+
+
+def _since_start():
+    return round(time.perf_counter() - _process_started, 3)
+
+
+def _run_startup_tasks():
+    # Raises on failure; the caller retries
+    pool_started = time.perf_counter()
+    init_db_pool()
+    for replica in db_replica_pools:
+        if replica['pool'] is None:
+            print(f"WARNING: Replica '{replica['name']}' not warmed up; reads use the primary until it recovers.")
+    _startup["poolSeconds"] = round(time.perf_counter() - pool_started, 3)
+
+    # Check the plans of the registered hot queries: 'warn' (default), 'fail' or 'off'
+    try:
+        verify_query_plans(mode=os.getenv("DB_VERIFY_PLANS", "warn").lower())
+    except RuntimeError as e:
+        raise _StartupAborted(str(e))
+
+    if STARTUP_WARMUP:
+        warmup_started = time.perf_counter()
+        _startup["rulesPreloaded"] = preload_document_master_rules()
+        _startup["warmupSeconds"] = round(time.perf_counter() - warmup_started, 3)
+
+    # Resume preview generation that a previous process did not finish
+    requeue_pending_previews()
+    # Replay upload metadata journaled while the database was slow or down
+    start_upload_journal_applier()
+    # Move old soft-deleted documents out of ds_document
+    start_document_archiver()
+
+
+def run_startup(retry=True):
+    """
+    Runs the startup tasks once, retrying every STARTUP_RETRY_SECONDS while they fail (for
+    example while the database is unreachable). A failed 'DB_VERIFY_PLANS=fail' check is
+    final: readiness then stays false.
+    """
+    with _startup_lock:
+        if _startup["state"] in ("running", "done"):
+            return
+        _startup["state"] = "running"
+    while True:
+        _startup["attempts"] += 1
+        try:
+            _run_startup_tasks()
+            _startup.update(state="done", error=None, readySeconds=_since_start())
+            print(f"Startup complete in {_startup['readySeconds']}s "
+                  f"(import {_startup['importSeconds']}s, pool {_startup['poolSeconds']}s, "
+                  f"warmup {_startup['warmupSeconds']}s, {_startup['rulesPreloaded']} rule(s) preloaded).")
+            return
+        except Exception as e:
+            _startup["error"] = str(e)
+            if isinstance(e, _StartupAborted) or not retry:
+                _startup["state"] = "failed"
+                print(f"ERROR: Startup failed: {e}")
+                return
+            print(f"WARNING: Startup attempt {_startup['attempts']} failed, retrying in {STARTUP_RETRY_SECONDS}s: {e}")
+            time.sleep(STARTUP_RETRY_SECONDS)
+
+
+def start_background_startup():
+    if _startup["state"] != "pending":
+        return
+    threading.Thread(target=run_startup, name="app-startup", daemon=True).start()
+
+
+def start_server_startup():
+    """
+    Called by the server entry points (main.py, wsgi.py) once the app is loaded: starts the
+    startup tasks unless STARTUP_TASKS is 'off'. Importing the app (flask CLI commands,
+    scripts, tests) does not start them, so a one-shot command never runs the journal
+    applier or the archiver alongside itself.
+    """
+    if STARTUP_TASKS == "background":
+        start_background_startup()
+
+
+def _check_directory(path):
+    # The directory must exist (or be creatable) and be writable by this process
+    try:
+        os.makedirs(path, exist_ok=True)
+    except OSError as e:
+        return False, str(e)
+    if not os.access(path, os.W_OK | os.X_OK):
+        return False, f"'{path}' is not writable."
+    return True, None
+
+
+def _check_database_cached(shard):
+    # Probes arrive from every load balancer and kubelet; each real check holds a pooled
+    # connection that requests could use, so one result serves them for a few seconds
+    now = time.monotonic()
+    cached = _database_checks.get(shard)
+    if cached and now - cached[0] < READINESS_DB_CACHE_SECONDS:
+        return cached[1], cached[2]
+    with _database_checks_lock:
+        cached = _database_checks.get(shard)
+        if cached and time.monotonic() - cached[0] < READINESS_DB_CACHE_SECONDS:
+            return cached[1], cached[2]
+        ok, detail = check_database(None if shard == DEFAULT_SHARD else shard)
+        _database_checks[shard] = (time.monotonic(), ok, detail)
+        return ok, detail
+
+
+def readiness_checks():
+    """
+    Returns (ready, checks) where checks maps each check to {'ok', 'detail'}. Database
+    results may be up to READINESS_DB_CACHE_SECONDS old.
+    """
+    checks = {"startup": {"ok": _startup["state"] == "done", "detail": _startup["error"] or _startup["state"]}}
+    for shard in shard_names():
+        ok, detail = _check_database_cached(shard)
+        checks["database" if shard == DEFAULT_SHARD else f"database.{shard}"] = {"ok": ok, "detail": detail}
+    directories = {"staging": UPLOAD_STAGING_FOLDER}
+    if STORAGE_BACKEND == "local":
+        directories["uploads"] = BASE_UPLOAD_FOLDER
+    if UPLOAD_JOURNAL is not None:
+        directories["journal"] = UPLOAD_JOURNAL_DIR
+    for name, path in directories.items():
+        ok, detail = _check_directory(path)
+        checks[f"disk.{name}"] = {"ok": ok, "detail": detail}
+    return all(check["ok"] for check in checks.values()), checks
+
+
+def init_startup(app, started_at):
+    """
+    Adds the /healthz (liveness) and /readyz (readiness) endpoints and a hook that starts
+    the startup tasks on the first request, for servers that load the app without
+    start_server_startup (such as `flask run`). started_at is the perf_counter value taken
+    when the app package began importing, for the cold-start timings.
+    """
+    global _process_started
+    _process_started = started_at
+    _startup["importSeconds"] = _since_start()
+    for name in ("importSeconds", "poolSeconds", "warmupSeconds", "readySeconds"):
+        metrics.register_gauge(f"startup.{name}", lambda name=name: _startup[name])
+
+    @app.route('/healthz', methods=['GET'])
+    def healthz():
+        # Liveness only: the process is up and serving requests
+        return jsonify({"status": "ok"}), 200
+
+    @app.route('/readyz', methods=['GET'])
+    def readyz():
+        ready, checks = readiness_checks()
+        return jsonify({
+            "status": "ready" if ready else "not ready",
+            "checks": checks,
+            "startup": dict(_startup)
+        }), 200 if ready else 503
+
+    @app.before_request
+    def run_startup_on_first_request():
+        start_background_startup()
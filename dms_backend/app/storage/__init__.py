@@ -0,0 +1,85 @@
+import os
+from abc import ABC, abstractmethod
+
+# Backend used for new uploads: 'local' (default) or 's3'.
+# Reads and deletes pick the backend from the stored path, so both kinds of paths can coexist.
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local").lower()
+
+S3_PATH_PREFIX = "s3://"
+
+_backends = {}
+
+
+class StorageBackend(ABC):
+    """
+    Interface for where document bytes live. Paths are the strings stored in ds_document.filepath.
+    """
+
+    @abstractmethod
+    def save(self, stream, directory, filename):
+        """
+        Streams a file-like object into storage.
+
+        Args:
+            stream: Binary file-like object, read until EOF.
+            directory (str): The logical directory (base path plus YYYY/MM/DD).
+            filename (str): The unique stored file name.
+
+        Returns:
+            tuple: (path, size_in_bytes)
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def save_local_file(self, local_path, directory, filename):
+        """
+        Moves an existing local file (e.g. a finished resumable upload) into storage.
+
+        Returns:
+            str: The stored path.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def open(self, path):
+        """Returns a binary file-like object for reading the stored file."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, path):
+        """Removes the stored file. Returns False if it did not exist."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def exists(self, path):
+        """Returns True if the stored file exists."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def size(self, path):
+        """Returns the stored file's size in bytes."""
+        raise NotImplementedError
+
+
+def get_storage(name=None):
+    """
+    Returns the backend used for new uploads, or the named one.
+    """
+    name = name or STORAGE_BACKEND
+    if name not in _backends:
+        if name == "local":
+            from app.storage.local import LocalStorage
+            _backends[name] = LocalStorage()
+        elif name == "s3":
+            from app.storage.s3 import S3Storage
+            _backends[name] = S3Storage()
+        else:
+            raise ValueError(f"Unknown STORAGE_BACKEND '{name}'.")
+    return _backends[name]
+
+
+def get_storage_for_path(path):
+    """
+    Returns the backend that owns a stored path.
+    """
+    return get_storage("s3" if path.startswith(S3_PATH_PREFIX) else "local")
@@ -0,0 +1,91 @@
+import os
+import re
+import uuid
+import errno
+import shutil
+import hashlib
+from app.storage import StorageBackend
+
+# Fan-out under each YYYY/MM/DD directory: STORAGE_SHARD_LEVELS directories of
+# STORAGE_SHARD_WIDTH hex characters taken from the file's UUID (2 x 2 gives 65536 leaves).
+STORAGE_SHARD_LEVELS = int(os.getenv("STORAGE_SHARD_LEVELS", "2"))
+STORAGE_SHARD_WIDTH = int(os.getenv("STORAGE_SHARD_WIDTH", "2"))
+
+COPY_BUFFER_SIZE = 64 * 1024
+
+_UUID_PATTERN = re.compile(r"[0-9a-f]{8}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{12}")
+
+
+def shard_directories(filename, levels=None, width=None):
+    """
+    Returns the shard subdirectories for a stored file name, e.g. ['3f', 'a2'].
+    Uses the UUID in the name when there is one, otherwise a hash of the name.
+    """
+    levels = STORAGE_SHARD_LEVELS if levels is None else levels
+    width = STORAGE_SHARD_WIDTH if width is None else width
+    match = _UUID_PATTERN.search(filename.lower())
+    key = match.group(0).replace("-", "") if match else hashlib.sha1(filename.encode("utf-8")).hexdigest()
+    return [key[i * width:(i + 1) * width] for i in range(levels)]
+
+
+def sharded_path(directory, filename, levels=None, width=None):
+    return os.path.join(directory, *shard_directories(filename, levels, width), filename)
+
+
+class LocalStorage(StorageBackend):
+    """
+    Stores documents on the local filesystem under the document master's base path.
+    """
+
+    def save(self, stream, directory, filename):
+        path = sharded_path(directory, filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        size = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                while True:
+                    chunk = stream.read(COPY_BUFFER_SIZE)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    size += len(chunk)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return path.replace("\\", "/"), size
+
+    def save_local_file(self, local_path, directory, filename):
+        path = sharded_path(directory, filename)
+        move_file(local_path, path)
+        return path.replace("\\", "/")
+
+    def open(self, path):
+        return open(path, "rb")
+
+    def delete(self, path):
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def exists(self, path):
+        return os.path.exists(path)
+
+    def size(self, path):
+        return os.path.getsize(path)
+
+
+def move_file(source, destination):
+    """
+    Renames source to destination, copying across filesystems when a rename is not possible.
+    """
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    try:
+        os.replace(source, destination)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(source, destination)
@@ -0,0 +1,85 @@
+import os
+from app.storage import StorageBackend, S3_PATH_PREFIX
+
+# Any S3-compatible store works; point STORAGE_S3_ENDPOINT_URL at a local stand-in
+# (e.g. MinIO on http://127.0.0.1:9000) for testing. Credentials come from the usual
+# AWS_ACCESS_KEY_ID / AWS_SECRET_ACCESS_KEY environment variables.
+STORAGE_S3_BUCKET = os.getenv("STORAGE_S3_BUCKET")
+STORAGE_S3_ENDPOINT_URL = os.getenv("STORAGE_S3_ENDPOINT_URL")
+STORAGE_S3_REGION = os.getenv("STORAGE_S3_REGION")
+
+
+class _CountingReader:
+    """Wraps a stream and counts the bytes read through it."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.size = 0
+
+    def read(self, size=-1):
+        chunk = self.stream.read(size)
+        self.size += len(chunk)
+        return chunk
+
+
+class S3Storage(StorageBackend):
+    """
+    Stores documents in an S3-compatible bucket. Paths look like s3://bucket/key, where the
+    key is the document master's base path plus YYYY/MM/DD and the file name.
+    """
+
+    def __init__(self):
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires the 'boto3' package.")
+        if not STORAGE_S3_BUCKET:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires STORAGE_S3_BUCKET.")
+        self.bucket = STORAGE_S3_BUCKET
+        self.client = boto3.client("s3", endpoint_url=STORAGE_S3_ENDPOINT_URL, region_name=STORAGE_S3_REGION)
+
+    def _key(self, directory, filename):
+        return "/".join(part.strip("/") for part in (directory.replace("\\", "/"), filename) if part.strip("/"))
+
+    def _split(self, path):
+        bucket, _, key = path[len(S3_PATH_PREFIX):].partition("/")
+        return bucket, key
+
+    def save(self, stream, directory, filename):
+        key = self._key(directory, filename)
+        reader = _CountingReader(stream)
+        # upload_fileobj switches to a multipart upload for large files, so memory stays bounded
+        self.client.upload_fileobj(reader, self.bucket, key)
+        return f"{S3_PATH_PREFIX}{self.bucket}/{key}", reader.size
+
+    def save_local_file(self, local_path, directory, filename):
+        key = self._key(directory, filename)
+        self.client.upload_file(local_path, self.bucket, key)
+        os.remove(local_path)
+        return f"{S3_PATH_PREFIX}{self.bucket}/{key}"
+
+    def open(self, path):
+        bucket, key = self._split(path)
+        return self.client.get_object(Bucket=bucket, Key=key)["Body"]
+
+    def delete(self, path):
+        if not self.exists(path):
+            return False
+        bucket, key = self._split(path)
+        self.client.delete_object(Bucket=bucket, Key=key)
+        return True
+
+    def exists(self, path):
+        from botocore.exceptions import ClientError
+        bucket, key = self._split(path)
+        try:
+            self.client.head_object(Bucket=bucket, Key=key)
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def size(self, path):
+        bucket, key = self._split(path)
+        return self.client.head_object(Bucket=bucket, Key=key)["ContentLength"]
@@ -0,0 +1,232 @@
+import os
+import time
+import bisect
+import itertools
+import threading
+from flask import request, jsonify, g
+from app.utils import metrics
+from app.utils.tracing import span
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+# Requests running at once across all lanes; keep it at or below the DB pool size (10)
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "10"))
+# How long a queued request may wait for a slot before it is shed
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "2"))
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "1"))
+
+# lane -> (concurrency limit, queue cap, priority); a lower priority number is served first
+DEFAULT_LANES = {
+    "document_read": (10, 50, 0),
+    "document_write": (6, 20, 1),
+    "auth": (4, 20, 1),
+    "admin": (3, 10, 2),
+    "document_events": (200, 0, 0),
+    "document_stream": (50, 20, 0),
+}
+# Lanes whose slots do not count toward ADMISSION_MAX_CONCURRENCY: an open change feed, or a
+# download or ZIP sending its body to a slow client, holds its slot for as long as the
+# response streams but no database connection while it does
+UNCOUNTED_LANES = {"document_events", "document_stream"}
+
+# Endpoint -> lane, falling back to the blueprint; None bypasses admission control
+ENDPOINT_LANES = {
+    "document_routes.list_documents_route": "document_read",
+    "document_routes.download_document_route": "document_stream",
+    "document_routes.download_zip_route": "document_stream",
+    "document_routes.document_events_route": "document_events",
+    "document_routes.upload_session_status_route": "document_read",
+    "admin_routes.admin_metrics": None,
+    # Sampling waits for its whole duration and must not hold an admin slot meanwhile
+    "admin_routes.admin_profile_sample": None,
+}
+BLUEPRINT_LANES = {
+    "document_routes": "document_write",
+    "auth_routes": "auth",
+    "admin_routes": "admin",
+}
+
+
+def _lane_setting(lane, name, default):
+    return int(os.getenv(f"ADMISSION_{lane.upper()}_{name}", str(default)))
+
+
+class _Lane:
+    def __init__(self, name, limit, queue_limit, priority):
+        self.name = name
+        self.limit = limit
+        self.queue_limit = queue_limit
+        self.priority = priority
+        self.counted = name not in UNCOUNTED_LANES
+        self.active = 0
+        self.waiting = 0
+
+
+class _Ticket:
+    __slots__ = ("lane", "granted")
+
+    def __init__(self, lane):
+        self.lane = lane
+        self.granted = False
+
+
+class AdmissionController:
+    """
+    Bounds concurrent requests per lane and in total. When every slot is busy, requests wait
+    in a priority queue up to the lane's queue cap; a freed slot goes to the highest-priority
+    waiter whose lane is below its own limit. Requests that cannot be queued, or wait longer
+    than the queue timeout, are shed.
+    """
+
+    def __init__(self, max_concurrency, lanes, queue_timeout):
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.lanes = {name: _Lane(name, *settings) for name, settings in lanes.items()}
+        self._active = 0
+        self._queue = []  # sorted (priority, sequence, ticket)
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    def _has_capacity(self, lane):
+        return (not lane.counted or self._active < self.max_concurrency) and lane.active < lane.limit
+
+    def _grant(self, lane):
+        if lane.counted:
+            self._active += 1
+        lane.active += 1
+
+    def _dispatch(self):
+        # Called with the condition held after a slot frees up
+        granted = False
+        for entry in list(self._queue):
+            ticket = entry[2]
+            if self._has_capacity(ticket.lane):
+                self._queue.remove(entry)
+                ticket.lane.waiting -= 1
+                ticket.granted = True
+                self._grant(ticket.lane)
+                granted = True
+        if granted:
+            self._condition.notify_all()
+
+    def acquire(self, lane_name):
+        """
+        Waits for a slot in the lane.
+
+        Returns:
+            bool: True if the request was admitted, False if it was shed.
+        """
+        lane = self.lanes[lane_name]
+        with self._condition:
+            # Serve eligible waiters first; whoever is still queued is blocked by its own lane limit
+            self._dispatch()
+            if self._has_capacity(lane):
+                self._grant(lane)
+                metrics.incr(f"admission.{lane.name}.admitted")
+                return True
+            if lane.waiting >= lane.queue_limit:
+                metrics.incr(f"admission.{lane.name}.shed")
+                return False
+
+            ticket = _Ticket(lane)
+            bisect.insort(self._queue, (lane.priority, next(self._sequence), ticket))
+            lane.waiting += 1
+            metrics.incr(f"admission.{lane.name}.queued")
+            deadline = time.monotonic() + self.queue_timeout
+            while not ticket.granted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            if ticket.granted:
+                metrics.incr(f"admission.{lane.name}.admitted")
+                return True
+            self._queue = [entry for entry in self._queue if entry[2] is not ticket]
+            lane.waiting -= 1
+            metrics.incr(f"admission.{lane.name}.shed")
+            return False
+
+    def release(self, lane_name):
+        lane = self.lanes[lane_name]
+        with self._condition:
+            if lane.counted:
+                self._active -= 1
+            lane.active -= 1
+            self._dispatch()
+
+    def register_gauges(self):
+        metrics.register_gauge("admission.active", lambda: self._active)
+        for lane in self.lanes.values():
+            metrics.register_gauge(f"admission.{lane.name}.active", lambda lane=lane: lane.active)
+            metrics.register_gauge(f"admission.{lane.name}.waiting", lambda lane=lane: lane.waiting)
+
+
+def lane_for_endpoint(endpoint):
+    """
+    Returns the admission lane of a Flask endpoint name, or None if it is not controlled.
+    """
+    if not endpoint:
+        return None
+    if endpoint in ENDPOINT_LANES:
+        return ENDPOINT_LANES[endpoint]
+    return BLUEPRINT_LANES.get(endpoint.rsplit(".", 1)[0])
+
+
+def create_admission_controller():
+    lanes = {
+        name: (
+            _lane_setting(name, "LIMIT", limit),
+            _lane_setting(name, "QUEUE", queue_limit),
+            _lane_setting(name, "PRIORITY", priority),
+        )
+        for name, (limit, queue_limit, priority) in DEFAULT_LANES.items()
+    }
+    controller = AdmissionController(ADMISSION_MAX_CONCURRENCY, lanes, ADMISSION_QUEUE_TIMEOUT_SECONDS)
+    controller.register_gauges()
+    return controller
+
+
+def init_admission_control(app):
+    """
+    Installs admission control on the app: a before_request hook that admits, queues or
+    sheds each request with a 503 and Retry-After. The slot is freed when the response is
+    closed, so streamed downloads, ZIPs and change feeds hold it until their body is sent.
+    """
+    if not ADMISSION_ENABLED:
+        return None
+    controller = create_admission_controller()
+
+    @app.before_request
+    def admit_request():
+        if request.method == "OPTIONS":
+            return None
+        lane_name = lane_for_endpoint(request.endpoint)
+        if lane_name is None:
+            return None
+        with span("admission.wait"):
+            admitted = controller.acquire(lane_name)
+        if not admitted:
+            response = jsonify({
+                "responseCode": 503,
+                "responseStatus": "error",
+                "responseMessage": "Server is busy, please retry shortly."
+            })
+            response.headers["Retry-After"] = str(ADMISSION_RETRY_AFTER_SECONDS)
+            return response, 503
+        g.admission_lane = lane_name
+        return None
+
+    @app.after_request
+    def release_slot_on_close(response):
+        lane_name = g.pop("admission_lane", None)
+        if lane_name is not None:
+            response.call_on_close(lambda: controller.release(lane_name))
+        return response
+
+    @app.teardown_request
+    def release_request_slot(exc):
+        # Requests that failed before after_request ran
+        lane_name = g.pop("admission_lane", None)
+        if lane_name is not None:
+            controller.release(lane_name)
+
+    return controller
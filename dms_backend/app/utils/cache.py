@@ -0,0 +1,185 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from app.utils import metrics
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0")
+
+# A fill is skipped if its key was invalidated after the load began or within this window,
+# so a lagging read replica cannot put a pre-write result back into the cache.
+CACHE_INVALIDATION_WINDOW_SECONDS = float(os.getenv("DB_REPLICA_STICKY_SECONDS", "5"))
+
+
+class LocalCacheBackend:
+    """
+    In-process LRU with per-entry expiry. Suitable for a single worker process.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._invalidated = {}  # key -> time of last invalidation
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl, loaded_at):
+        with self._lock:
+            invalidated_at = self._invalidated.get(key)
+            if invalidated_at is not None and invalidated_at >= loaded_at - CACHE_INVALIDATION_WINDOW_SECONDS:
+                return False
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return True
+
+    def delete(self, key):
+        now = time.monotonic()
+        with self._lock:
+            self._entries.pop(key, None)
+            self._invalidated[key] = now
+            if len(self._invalidated) > self.max_entries:
+                cutoff = now - CACHE_INVALIDATION_WINDOW_SECONDS - 60
+                for stale_key in [k for k, t in self._invalidated.items() if t < cutoff]:
+                    del self._invalidated[stale_key]
+
+    def clock(self):
+        return time.monotonic()
+
+
+class RedisCacheBackend:
+    """
+    Shared cache in Redis (or a compatible local stand-in) so every worker process sees the
+    same entries and invalidations. Redis evicts by its own maxmemory policy (use allkeys-lru).
+    """
+
+    def __init__(self, prefix):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("The redis cache backend requires the 'redis' package.")
+        self.client = redis.Redis.from_url(REDIS_URL)
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl, loaded_at):
+        invalidated_at = self.client.get(self.prefix + "inv:" + key)
+        if invalidated_at is not None and float(invalidated_at) >= loaded_at - CACHE_INVALIDATION_WINDOW_SECONDS:
+            return False
+        self.client.set(self.prefix + key, json.dumps(value), ex=max(1, int(ttl)))
+        return True
+
+    def delete(self, key):
+        pipe = self.client.pipeline()
+        pipe.delete(self.prefix + key)
+        pipe.set(self.prefix + "inv:" + key, time.time(), ex=int(CACHE_INVALIDATION_WINDOW_SECONDS) + 60)
+        pipe.execute()
+
+    def clock(self):
+        return time.time()
+
+
+class ResultCache:
+    """
+    Read-through cache for service results.
+
+    Concurrent misses for the same key in a process share a single load. Results are only
+    stored when the loader marks them cacheable. Hits, misses, coalesced waits and
+    invalidations are counted in app.utils.metrics under '<name>.*'.
+    """
+
+    def __init__(self, name, backend, ttl):
+        self.name = name
+        self.backend = backend
+        self.ttl = ttl
+        self._loading = {}  # key -> in-flight load: {'event', 'value', 'done'}
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key, loader):
+        """
+        Returns the cached value for key, or calls loader() -> (value, cacheable).
+        """
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            print(f"WARNING: Cache '{self.name}' read failed: {e}")
+            value = None
+        if value is not None:
+            metrics.incr(f"{self.name}.hits")
+            return value
+
+        with self._lock:
+            flight = self._loading.get(key)
+            leader = flight is None
+            if leader:
+                flight = {"event": threading.Event(), "value": None, "done": False}
+                self._loading[key] = flight
+        if not leader:
+            metrics.incr(f"{self.name}.coalesced")
+            flight["event"].wait()
+            if flight["done"]:
+                return flight["value"]
+            return loader()[0]  # The leader failed; load independently
+
+        metrics.incr(f"{self.name}.misses")
+        try:
+            loaded_at = self.backend.clock()
+            value, cacheable = loader()
+            flight["value"] = value
+            flight["done"] = True
+            if cacheable:
+                try:
+                    self.backend.set(key, value, self.ttl, loaded_at)
+                except Exception as e:
+                    print(f"WARNING: Cache '{self.name}' write failed: {e}")
+            return value
+        finally:
+            with self._lock:
+                del self._loading[key]
+            flight["event"].set()
+
+    def prime(self, key, value):
+        """
+        Stores a value loaded ahead of demand (e.g. by the startup warmup).
+        """
+        try:
+            self.backend.set(key, value, self.ttl, self.backend.clock())
+        except Exception as e:
+            print(f"WARNING: Cache '{self.name}' write failed: {e}")
+
+    def invalidate(self, key):
+        metrics.incr(f"{self.name}.invalidations")
+        try:
+            self.backend.delete(key)
+        except Exception as e:
+            print(f"WARNING: Cache '{self.name}' invalidation failed: {e}")
+
+
+def create_result_cache(name, backend_name, max_entries, ttl):
+    """
+    Builds a ResultCache with the 'local' or 'redis' backend, or returns None for 'off'.
+    """
+    if backend_name == "off":
+        return None
+    if backend_name == "redis":
+        return ResultCache(name, RedisCacheBackend(prefix=f"dms:{name}:"), ttl)
+    if backend_name == "local":
+        backend = LocalCacheBackend(max_entries)
+        metrics.register_gauge(f"{name}.entries", lambda: len(backend._entries))
+        return ResultCache(name, backend, ttl)
+    raise ValueError(f"Unknown cache backend '{backend_name}' for '{name}'.")
@@ -0,0 +1,166 @@
+import os
+import gzip
+import json
+import time
+import urllib.request
+from flask import request, jsonify
+from app.utils import metrics
+
+try:
+    import brotli  # Optional; br is offered only when it is installed
+except ImportError:
+    brotli = None
+
+# Array-of-rows list format: {"columns": [...], "rows": [[...], ...]}, sent to clients whose
+# Accept header prefers it; everyone else keeps the array of objects
+TABLE_MEDIA_TYPE = "application/vnd.dms.table+json"
+
+RESPONSE_COMPRESSION = os.getenv("RESPONSE_COMPRESSION", "true").lower() == "true"
+# Bodies smaller than this are sent uncompressed
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "6"))
+RESPONSE_BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "4"))
+COMPRESSIBLE_TYPES = {"application/json", TABLE_MEDIA_TYPE, "text/plain"}
+
+
+def wants_table():
+    """
+    True when the request's Accept header prefers the table format over plain JSON.
+    """
+    return request.accept_mimetypes.best_match(["application/json", TABLE_MEDIA_TYPE]) == TABLE_MEDIA_TYPE
+
+
+def to_table(rows):
+    """
+    Converts a list of dicts into one header row of column names and a list of value rows.
+    """
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    return {"columns": columns, "rows": [[row.get(column) for column in columns] for row in rows]}
+
+
+def list_json_response(body, field):
+    """
+    jsonify(body), with the list in body[field] in the table format when the client asked for it.
+    """
+    table = wants_table() and isinstance(body.get(field), list)
+    if table:
+        body = {**body, field: to_table(body[field])}
+    response = jsonify(body)
+    if table:
+        response.mimetype = TABLE_MEDIA_TYPE
+    response.vary.add("Accept")
+    return response
+
+
+def compress_body(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=RESPONSE_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=RESPONSE_GZIP_LEVEL, mtime=0)
+
+
+def _choose_encoding(accept_encodings):
+    if brotli is not None and accept_encodings["br"] > 0 and accept_encodings["br"] >= accept_encodings["gzip"]:
+        return "br"
+    if accept_encodings["gzip"] > 0:
+        return "gzip"
+    return None
+
+
+def init_response_compression(app):
+    """
+    Compresses JSON and text responses of at least RESPONSE_COMPRESSION_MIN_BYTES with br or
+    gzip, as the client's Accept-Encoding allows. Streamed responses (downloads, ZIPs, event
+    streams) and responses that already have a Content-Encoding are left alone.
+    """
+    if not RESPONSE_COMPRESSION:
+        return
+
+    @app.after_request
+    def compress_response(response):
+        if (response.direct_passthrough or response.is_streamed or response.status_code in (204, 304)
+                or "Content-Encoding" in response.headers or response.mimetype not in COMPRESSIBLE_TYPES):
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = _choose_encoding(request.accept_encodings)
+        if encoding is None or response.content_length is None or response.content_length < RESPONSE_COMPRESSION_MIN_BYTES:
+            return response
+        body = response.get_data()
+        compressed = compress_body(body, encoding)
+        if len(compressed) >= len(body):
+            return response
+        response.set_data(compressed)
+        response.headers["Content-Encoding"] = encoding
+        metrics.incr(f"compression.{encoding}")
+        metrics.incr("compression.bytes_saved", len(body) - len(compressed))
+        return response
+
+
+def benchmark_encodings(rows, iterations=200):
+    """
+    Serializes a list page of rows in each format and content coding.
+
+    Returns:
+        list: {'format', 'encoding', 'bytes', 'encode_us'} per combination, where encode_us
+              is the mean time to serialize (and compress) the page.
+    """
+    results = []
+    encodings = [None, "gzip"] + (["br"] if brotli is not None else [])
+    for name, data in (("json", rows), ("table", to_table(rows))):
+        for encoding in encodings:
+            started = time.perf_counter()
+            for _ in range(iterations):
+                body = json.dumps({"data": data}, separators=(",", ":"), default=str).encode("utf-8")
+                if encoding:
+                    body = compress_body(body, encoding)
+            results.append({
+                "format": name,
+                "encoding": encoding or "identity",
+                "bytes": len(body),
+                "encode_us": (time.perf_counter() - started) / iterations * 1_000_000
+            })
+    return results
+
+
+def benchmark_endpoint(url, token, body=None, iterations=20):
+    """
+    Requests a running server's list endpoint in each format and content coding and measures
+    the bytes received and the end-to-end latency, including decompression.
+
+    Returns:
+        list: {'format', 'encoding', 'bytes', 'mean_ms', 'p95_ms'} per combination.
+    """
+    results = []
+    encodings = ["identity", "gzip"] + (["br"] if brotli is not None else [])
+    for name, accept in (("json", "application/json"), ("table", TABLE_MEDIA_TYPE)):
+        for encoding in encodings:
+            timings, size = [], 0
+            for _ in range(iterations):
+                req = urllib.request.Request(
+                    url,
+                    data=json.dumps(body).encode("utf-8") if body is not None else None,
+                    headers={"Authorization": f"Bearer {token}", "Accept": accept,
+                             "Accept-Encoding": encoding, "Content-Type": "application/json"},
+                    method="POST" if body is not None else "GET"
+                )
+                started = time.perf_counter()
+                with urllib.request.urlopen(req, timeout=30) as response:
+                    payload = response.read()
+                    received = response.headers.get("Content-Encoding")
+                if received == "gzip":
+                    decoded = gzip.decompress(payload)
+                elif received == "br":
+                    decoded = brotli.decompress(payload)
+                else:
+                    decoded = payload
+                json.loads(decoded)
+                timings.append((time.perf_counter() - started) * 1000)
+                size = len(payload)
+            timings.sort()
+            results.append({
+                "format": name,
+                "encoding": encoding,
+                "bytes": size,
+                "mean_ms": sum(timings) / len(timings),
+                "p95_ms": timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            })
+    return results
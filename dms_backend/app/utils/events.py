@@ -0,0 +1,229 @@
+import os
+import json
+import itertools
+import threading
+from collections import OrderedDict, deque, namedtuple
+from app.utils import metrics
+from app.utils.cache import REDIS_URL
+
+# Events kept per scope for Last-Event-ID resume
+EVENTS_HISTORY_SIZE = int(os.getenv("EVENTS_HISTORY_SIZE", "100"))
+# Scopes with history kept by the local broker; the least recently published is dropped first
+EVENTS_MAX_SCOPES = int(os.getenv("EVENTS_MAX_SCOPES", "10000"))
+# Events waiting for one slow stream; beyond this the stream is told to reset
+EVENTS_SUBSCRIBER_BUFFER = int(os.getenv("EVENTS_SUBSCRIBER_BUFFER", "100"))
+# Idle scopes expire from Redis after this long
+EVENTS_REDIS_TTL_SECONDS = int(os.getenv("EVENTS_REDIS_TTL_SECONDS", str(24 * 3600)))
+
+Event = namedtuple("Event", ["id", "type", "data"])
+
+
+class _LocalSubscription:
+    """
+    Bounded queue of events for one stream. If the stream falls more than `capacity` events
+    behind, further events are dropped and `overflowed` is set.
+    """
+
+    def __init__(self, broker, scope, capacity):
+        self.broker = broker
+        self.scope = scope
+        self.capacity = capacity
+        self.overflowed = False
+        self._events = deque()
+        self._condition = threading.Condition()
+
+    def offer(self, event):
+        with self._condition:
+            if len(self._events) >= self.capacity:
+                if not self.overflowed:
+                    metrics.incr("events.overflows")
+                self.overflowed = True
+            else:
+                self._events.append(event)
+            self._condition.notify()
+
+    def get(self, timeout):
+        """
+        Waits up to timeout seconds for events.
+
+        Returns:
+            tuple: (events, reset) where reset means events were lost and the client must
+                   reload the listing.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._events or self.overflowed, timeout)
+            events = list(self._events)
+            self._events.clear()
+            return events, self.overflowed
+
+    def close(self):
+        self.broker._unsubscribe(self)
+
+
+class LocalEventBroker:
+    """
+    In-process broker: delivers events to streams served by this worker only. Event ids are
+    '<process epoch>-<sequence>', so an id from another process or before a restart cannot be
+    resumed and the client is told to reset.
+    """
+
+    def __init__(self, history_size, max_scopes, buffer_size):
+        self.history_size = history_size
+        self.max_scopes = max_scopes
+        self.buffer_size = buffer_size
+        self.epoch = os.urandom(4).hex()
+        self._sequence = itertools.count(1)
+        self._history = OrderedDict()  # scope -> deque of (sequence, Event)
+        self._trimmed = {}  # scope -> highest sequence dropped from its history
+        self._evicted_through = 0  # highest sequence of any scope dropped entirely
+        self._subscribers = {}  # scope -> set of _LocalSubscription
+        self._lock = threading.Lock()
+
+    def publish(self, scope, event_type, data):
+        with self._lock:
+            sequence = next(self._sequence)
+            event = Event(f"{self.epoch}-{sequence}", event_type, data)
+            history = self._history.get(scope)
+            if history is None:
+                history = self._history[scope] = deque()
+            self._history.move_to_end(scope)
+            history.append((sequence, event))
+            if len(history) > self.history_size:
+                self._trimmed[scope] = history.popleft()[0]
+            while len(self._history) > self.max_scopes:
+                evicted_scope, evicted = self._history.popitem(last=False)
+                self._evicted_through = max(self._evicted_through, evicted[-1][0])
+                self._trimmed.pop(evicted_scope, None)
+            subscribers = list(self._subscribers.get(scope, ()))
+        metrics.incr("events.published")
+        for subscription in subscribers:
+            subscription.offer(event)
+        return event
+
+    def _parse_id(self, event_id):
+        epoch, _, sequence = (event_id or "").partition("-")
+        if epoch != self.epoch or not sequence.isdigit():
+            return None
+        return int(sequence)
+
+    def subscribe(self, scope, last_event_id=None):
+        """
+        Starts a subscription. With last_event_id, the events after it are queued first; if
+        they are no longer all available the subscription starts in the reset state.
+        """
+        subscription = _LocalSubscription(self, scope, self.buffer_size)
+        with self._lock:
+            self._subscribers.setdefault(scope, set()).add(subscription)
+            if last_event_id:
+                last = self._parse_id(last_event_id)
+                history = self._history.get(scope, ())
+                floor = self._trimmed.get(scope, 0) if scope in self._history else self._evicted_through
+                if last is None or last < floor:
+                    subscription.overflowed = True
+                else:
+                    for sequence, event in history:
+                        if sequence > last:
+                            subscription.offer(event)
+        return subscription
+
+    def _unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.scope)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.scope]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+class _RedisSubscription:
+    def __init__(self, broker, scope, last_id, reset):
+        self.broker = broker
+        self.key = broker.prefix + scope
+        self.last_id = last_id
+        self.reset = reset
+
+    def get(self, timeout):
+        if self.reset:
+            return [], True
+        response = self.broker.client.xread(
+            {self.key: self.last_id}, count=self.broker.buffer_size, block=max(1, int(timeout * 1000))
+        )
+        events = []
+        for _, entries in response or []:
+            for entry_id, fields in entries:
+                entry_id = entry_id.decode() if isinstance(entry_id, bytes) else entry_id
+                events.append(Event(entry_id, fields[b"type"].decode(), json.loads(fields[b"data"])))
+                self.last_id = entry_id
+        return events, False
+
+    def close(self):
+        pass
+
+
+def _stream_id(entry_id):
+    milliseconds, _, sequence = entry_id.partition("-")
+    return int(milliseconds), int(sequence or 0)
+
+
+class RedisEventBroker:
+    """
+    Broker shared by every worker process through one capped Redis stream per scope. Event
+    ids are the stream entry ids, so a client can resume on any worker.
+    """
+
+    def __init__(self, prefix, history_size, buffer_size):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("The redis event broker requires the 'redis' package.")
+        self.client = redis.Redis.from_url(REDIS_URL)
+        self.prefix = prefix
+        self.history_size = history_size
+        self.buffer_size = buffer_size
+
+    def publish(self, scope, event_type, data):
+        key = self.prefix + scope
+        pipe = self.client.pipeline()
+        pipe.xadd(key, {"type": event_type, "data": json.dumps(data, default=str)},
+                  maxlen=self.history_size, approximate=True)
+        pipe.expire(key, EVENTS_REDIS_TTL_SECONDS)
+        entry_id = pipe.execute()[0]
+        metrics.incr("events.published")
+        return Event(entry_id.decode() if isinstance(entry_id, bytes) else entry_id, event_type, data)
+
+    def subscribe(self, scope, last_event_id=None):
+        key = self.prefix + scope
+        if not last_event_id:
+            newest = self.client.xrevrange(key, count=1)
+            start = newest[0][0].decode() if newest else "0-0"
+            return _RedisSubscription(self, scope, start, False)
+        try:
+            last = _stream_id(last_event_id)
+        except ValueError:
+            return _RedisSubscription(self, scope, "0-0", True)
+        oldest = self.client.xrange(key, count=1)
+        # Trimmed past the client's position: events in between are gone
+        reset = bool(oldest) and last < _stream_id(oldest[0][0].decode()) and self.client.xlen(key) >= self.history_size
+        return _RedisSubscription(self, scope, last_event_id, reset)
+
+    def subscriber_count(self):
+        return None
+
+
+def create_event_broker(backend_name):
+    """
+    Builds the 'local' or 'redis' event broker, or returns None for 'off'.
+    """
+    if backend_name == "off":
+        return None
+    if backend_name == "redis":
+        return RedisEventBroker("dms:events:", EVENTS_HISTORY_SIZE, EVENTS_SUBSCRIBER_BUFFER)
+    if backend_name == "local":
+        broker = LocalEventBroker(EVENTS_HISTORY_SIZE, EVENTS_MAX_SCOPES, EVENTS_SUBSCRIBER_BUFFER)
+        metrics.register_gauge("events.subscribers", broker.subscriber_count)
+        return broker
+    raise ValueError(f"Unknown event broker '{backend_name}'.")
@@ -0,0 +1,196 @@
+import os
+import json
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: journal locking is process-local only
+    fcntl = None
+
+
+class Journal:
+    """
+    Append-only JSON-lines journal with a durable checkpoint.
+
+    append() returns only after the record is fsync'd. A consumer reads the records after the
+    checkpoint with read_pending(), applies them and then calls commit() with the returned
+    offset, so a crash between the two replays the batch. Consumers must therefore be
+    idempotent. Once everything is applied, compact() truncates the file.
+    Appends from several worker processes are serialized with a lock file; only the process
+    holding the applier lock should consume.
+    """
+
+    def __init__(self, directory, name):
+        self.directory = directory
+        self.path = os.path.join(directory, f"{name}.jsonl")
+        self.checkpoint_path = os.path.join(directory, f"{name}.checkpoint")
+        self.lock_path = os.path.join(directory, f"{name}.lock")
+        self.applier_lock_path = os.path.join(directory, f"{name}.applier.lock")
+        self._lock = threading.Lock()
+        self._ready = False
+        self._applier_fd = None
+        self._wakeup = threading.Event()
+
+    def _ensure_ready(self):
+        if self._ready:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        with self._locked():
+            if not os.path.exists(self.path):
+                fd = os.open(self.path, os.O_WRONLY | os.O_CREAT, 0o644)
+                os.fsync(fd)
+                os.close(fd)
+                self._fsync_directory()
+            self._repair_tail()
+        self._ready = True
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                os.close(fd)
+
+    def _fsync_directory(self):
+        if fcntl is None:
+            return
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _repair_tail(self):
+        # A crash during append can leave a partial last line; drop it so later appends
+        # start on a fresh line. Called with the lock held.
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def append(self, record):
+        """
+        Appends a record and fsyncs it before returning.
+        """
+        self._ensure_ready()
+        line = (json.dumps(record, default=str, separators=(",", ":")) + "\n").encode("utf-8")
+        with self._locked():
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+            try:
+                os.write(fd, line)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        self._wakeup.set()
+
+    def read_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, encoding="utf-8") as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def commit(self, offset):
+        """
+        Durably records that every record before offset has been applied.
+        """
+        temp_path = f"{self.checkpoint_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(str(offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.checkpoint_path)
+        self._fsync_directory()
+
+    def read_pending(self, max_records):
+        """
+        Returns up to max_records complete records after the checkpoint.
+
+        Returns:
+            tuple: (records, end_offset) where end_offset is the offset to commit once the
+                   records are applied. Lines that are not valid JSON are skipped.
+        """
+        self._ensure_ready()
+        offset = self.read_checkpoint()
+        if offset > os.path.getsize(self.path):
+            offset = 0  # Crashed between the checkpoint reset and the truncate in compact()
+        records = []
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            while len(records) < max_records:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break  # End of file, or an append still in progress
+                offset += len(line)
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    print(f"WARNING: Skipping unreadable journal line in {self.path}.")
+        return records, offset
+
+    def compact(self):
+        """
+        Truncates the journal if every record in it has been applied.
+        """
+        self._ensure_ready()
+        with self._locked():
+            size = os.path.getsize(self.path)
+            if size == 0 or self.read_checkpoint() < size:
+                return False
+            # Reset the checkpoint first: a crash before the truncate only replays applied records
+            self.commit(0)
+            os.truncate(self.path, 0)
+            return True
+
+    def backlog(self):
+        """
+        Returns (pending_records, pending_bytes) not yet applied.
+        """
+        if not os.path.exists(self.path):
+            return 0, 0
+        offset = self.read_checkpoint()
+        size = os.path.getsize(self.path)
+        if offset > size:
+            offset = 0
+        pending = 0
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if line.endswith(b"\n"):
+                    pending += 1
+        return pending, size - offset
+
+    def try_acquire_applier(self):
+        """
+        Takes the applier lock without blocking; the owner keeps it for the process lifetime.
+        """
+        if self._applier_fd is not None:
+            return True
+        self._ensure_ready()
+        if fcntl is None:
+            self._applier_fd = -1
+            return True
+        fd = os.open(self.applier_lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._applier_fd = fd
+        return True
+
+    def wait_for_records(self, timeout):
+        """
+        Sleeps until the next append in this process or for timeout seconds.
+        """
+        self._wakeup.wait(timeout)
+        self._wakeup.clear()
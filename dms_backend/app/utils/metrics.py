@@ -0,0 +1,35 @@
+import threading
+
+# Process-local counters and gauges, exported by GET /admin/metrics.
+_counters = {}
+_gauges = {}
+_lock = threading.Lock()
+
+
+def incr(name, value=1):
+    """Adds value to a counter."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def register_gauge(name, read_function):
+    """
+    Registers a gauge whose current value is read by calling read_function at export time.
+    """
+    _gauges[name] = read_function
+
+
+def snapshot():
+    """
+    Returns all counters and the current value of every gauge.
+    """
+    with _lock:
+        counters = dict(_counters)
+    gauges = {}
+    for name, read_function in list(_gauges.items()):
+        try:
+            gauges[name] = read_function()
+        except Exception as e:
+            print(f"WARNING: Gauge '{name}' failed: {e}")
+            gauges[name] = None
+    return {"counters": counters, "gauges": gauges}
@@ -0,0 +1,176 @@
+import io
+import os
+import re
+import sys
+import hmac
+import time
+import pstats
+import hashlib
+import cProfile
+import threading
+from flask import request, g
+from app.utils import metrics
+
+# Master switch for the sampling profiler and per-request profiles; off installs nothing
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+PROFILE_DEFAULT_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "10"))
+PROFILE_MAX_DEPTH = 128
+# Per-request profiles are written here as <id>.prof (pstats format); the newest are kept
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+PROFILE_TOKEN_MAX_SECONDS = int(os.getenv("PROFILE_TOKEN_MAX_SECONDS", "3600"))
+# Signs the per-request profile header; defaults to the JWT secret
+PROFILE_SECRET = os.getenv("PROFILE_SECRET") or os.getenv("JWT_SECRET_KEY") or ""
+PROFILE_HEADER = "X-Profile"
+
+_PROFILE_ID = re.compile(r"^[0-9]+-[0-9a-f]{8}$")
+
+_sampling_lock = threading.Lock()
+# cProfile hooks the interpreter for all threads on newer Pythons, so one request at a time
+_request_profile_lock = threading.Lock()
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample_stacks(seconds, interval_ms=PROFILE_DEFAULT_INTERVAL_MS):
+    """
+    Samples the stack of every other thread every interval_ms for `seconds` and counts
+    identical stacks. Returns None if another sampling run is in progress.
+
+    Returns:
+        str: Collapsed stacks, one "thread;outer;...;inner count" line per distinct stack,
+             as read by flamegraph.pl and speedscope.
+    """
+    if not _sampling_lock.acquire(blocking=False):
+        return None
+    try:
+        own_id = threading.get_ident()
+        interval = max(interval_ms, 1.0) / 1000
+        counts = {}
+        samples = 0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < PROFILE_MAX_DEPTH:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, f"thread-{thread_id}"))
+                key = ";".join(reversed(stack))
+                counts[key] = counts.get(key, 0) + 1
+            samples += 1
+            time.sleep(interval)
+        metrics.incr("profiling.samples", samples)
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(counts.items()))
+    finally:
+        _sampling_lock.release()
+
+
+def _signature(path, expires):
+    return hmac.new(PROFILE_SECRET.encode("utf-8"), f"profile|{expires}|{path}".encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def create_profile_token(path, ttl_seconds):
+    """
+    Returns the X-Profile header value that profiles requests to path until it expires.
+    """
+    expires = int(time.time()) + max(1, min(int(ttl_seconds), PROFILE_TOKEN_MAX_SECONDS))
+    return f"{expires}.{_signature(path, expires)}", expires
+
+
+def _valid_token(token, path):
+    expires, _, signature = (token or "").partition(".")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(signature, _signature(path, int(expires)))
+
+
+def _save_profile(profiler):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profile_id = f"{int(time.time() * 1000)}-{os.urandom(4).hex()}"
+    profiler.dump_stats(os.path.join(PROFILE_DIR, f"{profile_id}.prof"))
+    saved = sorted(name for name in os.listdir(PROFILE_DIR) if name.endswith(".prof"))
+    for name in saved[:-PROFILE_KEEP] if PROFILE_KEEP > 0 else []:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, name))
+        except OSError:
+            pass
+    return profile_id
+
+
+def load_request_profile(profile_id, raw=False):
+    """
+    Reads a stored per-request profile: the pstats file itself when raw, otherwise the
+    functions sorted by cumulative time as text. Returns None if there is no such profile.
+    """
+    if not _PROFILE_ID.match(profile_id or ""):
+        return None
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.prof")
+    if not os.path.exists(path):
+        return None
+    if raw:
+        with open(path, "rb") as f:
+            return f.read()
+    output = io.StringIO()
+    pstats.Stats(path, stream=output).sort_stats("cumulative").print_stats(100)
+    return output.getvalue()
+
+
+def init_profiling(app):
+    """
+    Profiles requests that carry a valid X-Profile header with cProfile, stores the result
+    under PROFILE_DIR and returns its id in the X-Profile-Id response header. Does nothing
+    when PROFILING_ENABLED is off.
+    """
+    if not PROFILING_ENABLED:
+        return
+
+    @app.before_request
+    def start_request_profile():
+        token = request.headers.get(PROFILE_HEADER)
+        if token is None:
+            return
+        if not _valid_token(token, request.path):
+            metrics.incr("profiling.rejected")
+            return
+        if not _request_profile_lock.acquire(blocking=False):
+            metrics.incr("profiling.busy")
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:  # Another profiler already hooks the interpreter
+            _request_profile_lock.release()
+            metrics.incr("profiling.busy")
+            return
+        g.profiler = profiler
+
+    @app.after_request
+    def finish_request_profile(response):
+        profiler = g.pop("profiler", None)
+        if profiler is None:
+            return response
+        try:
+            profiler.disable()
+            response.headers["X-Profile-Id"] = _save_profile(profiler)
+            metrics.incr("profiling.requests")
+        except OSError as e:
+            print(f"WARNING: Failed to store request profile: {e}")
+        finally:
+            _request_profile_lock.release()
+        return response
+
+    @app.teardown_request
+    def release_request_profile(exc):
+        # Requests that failed before after_request ran
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            profiler.disable()
+            _request_profile_lock.release()
@@ -1,7 +1,22 @@
-from flask import request
-from flask_jwt_extended import get_jwt
+from functools import wraps
+from flask import request, current_app
+from flask_jwt_extended import get_jwt, verify_jwt_in_request
+from app.utils.tracing import span
 import json
 
+def traced_jwt_required():
+    """
+    flask_jwt_extended's @jwt_required() with the token check recorded as the 'jwt.verify' span.
+    """
+    def wrapper(fn):
+        @wraps(fn)
+        def decorator(*args, **kwargs):
+            with span("jwt.verify"):
+                verify_jwt_in_request()
+            return current_app.ensure_sync(fn)(*args, **kwargs)
+        return decorator
+    return wrapper
+
 def get_request_context():
     claims = get_jwt()
     user_id = claims.get("user_id")
@@ -0,0 +1,291 @@
+import os
+import json
+import time
+import queue
+import random
+import functools
+import threading
+import contextvars
+import urllib.request
+from flask import request, g
+from app.utils import metrics
+
+# Fraction of requests traced; 0 turns tracing off entirely
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+# Add a Server-Timing header with the span breakdown to sampled responses
+TRACE_SERVER_TIMING = os.getenv("TRACE_SERVER_TIMING", "true").lower() == "true"
+# Where completed traces go: 'off', 'file' (JSON lines) or 'otlp' (OTLP/HTTP JSON)
+TRACE_EXPORT = os.getenv("TRACE_EXPORT", "off").lower()
+TRACE_EXPORT_FILE = os.getenv("TRACE_EXPORT_FILE", "traces.jsonl")
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://127.0.0.1:4318/v1/traces")
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "dms_backend")
+# Traces waiting for export; further traces are dropped rather than slowing requests
+TRACE_EXPORT_QUEUE = int(os.getenv("TRACE_EXPORT_QUEUE", "1000"))
+TRACE_EXPORT_BATCH = 50
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """
+    The spans recorded for one request. Spans nest through a stack, so a span's parent is
+    whichever span was open when it started.
+    """
+
+    def __init__(self, name, trace_id=None, parent_span_id=None):
+        self.trace_id = trace_id or os.urandom(16).hex()
+        self.start_ns = time.time_ns()
+        self._start = time.perf_counter()
+        self.spans = []  # {'span_id', 'parent_id', 'name', 'offset_ms', 'duration_ms', 'attributes'}
+        self.root = self._new_span(name, parent_span_id)
+        self._stack = [self.root]
+
+    def _new_span(self, name, parent_id):
+        span = {
+            "span_id": os.urandom(8).hex(),
+            "parent_id": parent_id,
+            "name": name,
+            "offset_ms": (time.perf_counter() - self._start) * 1000,
+            "duration_ms": None,
+            "attributes": {}
+        }
+        self.spans.append(span)
+        return span
+
+    def start_span(self, name):
+        span = self._new_span(name, self._stack[-1]["span_id"])
+        self._stack.append(span)
+        return span
+
+    def end_span(self, span):
+        span["duration_ms"] = (time.perf_counter() - self._start) * 1000 - span["offset_ms"]
+        if self._stack and self._stack[-1] is span:
+            self._stack.pop()
+
+    def finish(self):
+        if self.root["duration_ms"] is None:
+            self.end_span(self.root)
+
+    def server_timing(self):
+        """
+        Formats the child spans as a Server-Timing value, summing spans that share a name.
+        """
+        totals = {}
+        for span in self.spans[1:]:
+            if span["duration_ms"] is not None:
+                totals[span["name"]] = totals.get(span["name"], 0.0) + span["duration_ms"]
+        entries = [f"{name};dur={duration:.2f}" for name, duration in totals.items()]
+        entries.append(f"total;dur={(time.perf_counter() - self._start) * 1000:.2f}")
+        return ", ".join(entries)
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "start_ns": self.start_ns,
+            "spans": self.spans
+        }
+
+
+class _Span:
+    __slots__ = ("trace", "name", "span")
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+        self.span = None
+
+    def __enter__(self):
+        self.span = self.trace.start_span(self.name)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.span["attributes"]["error"] = exc_type.__name__
+        self.trace.end_span(self.span)
+        return False
+
+    def set_attribute(self, key, value):
+        self.span["attributes"][key] = value
+
+
+def span(name):
+    """
+    Context manager timing a phase of the current request; a shared no-op when the request
+    is not traced.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return _NOOP_SPAN
+    return _Span(trace, name)
+
+
+def traced(name):
+    """
+    Decorator running the whole function inside span(name).
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class FileExporter:
+    def __init__(self, path):
+        self.path = path
+
+    def export(self, traces):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for trace in traces:
+                f.write(json.dumps(trace, default=str) + "\n")
+
+
+class OtlpExporter:
+    """
+    Posts traces to an OTLP/HTTP collector using the JSON encoding.
+    """
+
+    def __init__(self, endpoint, service_name):
+        self.endpoint = endpoint
+        self.service_name = service_name
+
+    def _otlp_span(self, trace, span):
+        start_ns = trace["start_ns"] + int(span["offset_ms"] * 1_000_000)
+        return {
+            "traceId": trace["trace_id"],
+            "spanId": span["span_id"],
+            "parentSpanId": span["parent_id"] or "",
+            "name": span["name"],
+            "kind": 2 if span is trace["spans"][0] else 1,  # SERVER for the request span, INTERNAL below it
+            "startTimeUnixNano": str(start_ns),
+            "endTimeUnixNano": str(start_ns + int((span["duration_ms"] or 0) * 1_000_000)),
+            "attributes": [
+                {"key": key, "value": {"stringValue": str(value)}}
+                for key, value in span["attributes"].items()
+            ]
+        }
+
+    def export(self, traces):
+        body = {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+                "scopeSpans": [{
+                    "scope": {"name": "app.utils.tracing"},
+                    "spans": [self._otlp_span(trace, span) for trace in traces for span in trace["spans"]]
+                }]
+            }]
+        }
+        req = urllib.request.Request(
+            self.endpoint,
+            data=json.dumps(body).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        with urllib.request.urlopen(req, timeout=5) as response:
+            response.read()
+
+
+class _ExportWorker:
+    """
+    Hands completed traces to an exporter on a background thread, in batches.
+    """
+
+    def __init__(self, exporter):
+        self.exporter = exporter
+        self._queue = queue.Queue(maxsize=TRACE_EXPORT_QUEUE)
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def submit(self, trace):
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            metrics.incr("tracing.dropped")
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < TRACE_EXPORT_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.exporter.export(batch)
+                metrics.incr("tracing.exported", len(batch))
+            except Exception as e:
+                metrics.incr("tracing.export_failures")
+                print(f"WARNING: Trace export failed: {e}")
+
+
+def _parse_traceparent(header):
+    # W3C traceparent: version-traceid-parentid-flags
+    parts = (header or "").split("-")
+    if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+        return parts[1], parts[2]
+    return None, None
+
+
+def create_exporter(kind):
+    if kind == "file":
+        return FileExporter(TRACE_EXPORT_FILE)
+    if kind == "otlp":
+        return OtlpExporter(TRACE_OTLP_ENDPOINT, TRACE_SERVICE_NAME)
+    if kind == "off":
+        return None
+    raise ValueError(f"Unknown TRACE_EXPORT '{kind}'.")
+
+
+def init_tracing(app):
+    """
+    Installs request tracing: sampled requests get a root span, a Server-Timing header and,
+    once finished, are exported. Does nothing when TRACE_SAMPLE_RATE is 0.
+    """
+    if TRACE_SAMPLE_RATE <= 0:
+        return
+    exporter = create_exporter(TRACE_EXPORT)
+    worker = _ExportWorker(exporter) if exporter else None
+
+    @app.before_request
+    def start_trace():
+        if random.random() >= TRACE_SAMPLE_RATE:
+            return
+        trace_id, parent_span_id = _parse_traceparent(request.headers.get("traceparent"))
+        trace = Trace(f"{request.method} {request.url_rule or request.path}", trace_id, parent_span_id)
+        trace.root["attributes"]["http.method"] = request.method
+        trace.root["attributes"]["http.target"] = request.path
+        g.trace = trace
+        g.trace_token = _current_trace.set(trace)
+
+    @app.after_request
+    def add_server_timing(response):
+        trace = g.get("trace")
+        if trace is not None:
+            trace.root["attributes"]["http.status_code"] = response.status_code
+            if TRACE_SERVER_TIMING:
+                response.headers["Server-Timing"] = trace.server_timing()
+        return response
+
+    @app.teardown_request
+    def finish_trace(exc):
+        trace = g.pop("trace", None)
+        if trace is None:
+            return
+        _current_trace.reset(g.pop("trace_token"))
+        trace.finish()
+        metrics.incr("tracing.sampled")
+        if worker:
+            worker.submit(trace.to_dict())
@@ -7,12 +7,17 @@ load_dotenv()
 
 # Now import the app (which may use env variables during initialization)
 from app import app
+from app.startup import start_server_startup
 
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 5000))
     host = os.getenv("HOST", "0.0.0.0")
     debug = os.getenv("DEBUG", "False").lower() == "true"
     print(f"Starting server on {host}:{port} (debug={debug})")
+
+    # With the reloader, only the child process that serves requests starts the startup tasks
+    if not debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_server_startup()
     
     # Run the app
     app.run(host=host, port=port, debug=debug)
\ No newline at end of file
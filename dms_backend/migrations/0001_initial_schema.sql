@@ -0,0 +1,97 @@
+-- Baseline schema for the DMS backend.
+-- Uses IF NOT EXISTS so it can be recorded against databases created before migrations existed.
+
+CREATE TABLE IF NOT EXISTS ds_user (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    id_str VARCHAR(64) NULL,
+    role_id INT NULL,
+    username VARCHAR(100) NOT NULL,
+    password VARCHAR(255) NOT NULL,
+    first_name VARCHAR(100) NULL,
+    middle_name VARCHAR(100) NULL,
+    last_name VARCHAR(100) NULL,
+    email VARCHAR(255) NULL,
+    mobile VARCHAR(20) NULL,
+    is_admin TINYINT(1) NOT NULL DEFAULT 0,
+    web_access TINYINT(1) NOT NULL DEFAULT 1,
+    mobile_access TINYINT(1) NOT NULL DEFAULT 0,
+    last_password_change DATETIME NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'active',
+    deleted TINYINT(1) NOT NULL DEFAULT 0,
+    createdBy INT NULL,
+    createdAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updatedBy INT NULL,
+    updatedAt DATETIME NULL DEFAULT NULL ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_user_username (username)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS ds_application_config (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    env VARCHAR(50) NOT NULL,
+    code VARCHAR(50) NOT NULL,
+    app_api_config TEXT NULL,
+    deleted TINYINT(1) NOT NULL DEFAULT 0,
+    createdBy INT NULL,
+    createdAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updatedBy INT NULL,
+    updatedAt DATETIME NULL DEFAULT NULL ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS ds_document_master (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    env_id INT NOT NULL,
+    module_id INT NOT NULL,
+    type VARCHAR(50) NOT NULL,
+    allowed_extension VARCHAR(255) NOT NULL,
+    allowed_max_size INT NOT NULL COMMENT 'KB',
+    filepath VARCHAR(255) NULL,
+    is_protected TINYINT(1) NOT NULL DEFAULT 0,
+    is_filename_encrypted TINYINT(1) NOT NULL DEFAULT 0,
+    is_downloadable TINYINT(1) NOT NULL DEFAULT 1,
+    backup_destination VARCHAR(255) NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'active',
+    deleted TINYINT(1) NOT NULL DEFAULT 0,
+    createdBy INT NULL,
+    createdAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updatedBy INT NULL,
+    updatedAt DATETIME NULL DEFAULT NULL ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS ds_document (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    env_id INT NOT NULL,
+    parent_id VARCHAR(100) NULL,
+    ref_id VARCHAR(100) NOT NULL,
+    module_id INT NOT NULL,
+    type VARCHAR(50) NOT NULL,
+    filename VARCHAR(255) NOT NULL,
+    original_filename VARCHAR(255) NOT NULL,
+    filepath VARCHAR(512) NOT NULL,
+    filesize BIGINT NOT NULL DEFAULT 0,
+    extension VARCHAR(20) NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'active',
+    assigned_to INT NULL,
+    backup_status VARCHAR(20) NULL,
+    deleted TINYINT(1) NOT NULL DEFAULT 0,
+    createdBy INT NULL,
+    createdAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updatedBy INT NULL,
+    updatedAt DATETIME NULL DEFAULT NULL ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS ds_access_log (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    env_id INT NULL,
+    url VARCHAR(2048) NOT NULL,
+    method VARCHAR(10) NOT NULL,
+    request_header TEXT NULL,
+    request_body LONGTEXT NULL,
+    response LONGTEXT NULL,
+    status VARCHAR(20) NOT NULL,
+    ip VARCHAR(45) NULL,
+    deleted TINYINT(1) NOT NULL DEFAULT 0,
+    createdBy INT NULL,
+    createdAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updatedBy INT NULL,
+    updatedAt DATETIME NULL DEFAULT NULL ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
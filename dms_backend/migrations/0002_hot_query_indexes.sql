@@ -0,0 +1,13 @@
+-- Indexes for the queries registered with app.schema.register_hot_query.
+
+-- list_documents_service: WHERE module_id AND env_id AND ref_id AND deleted = 0
+CREATE INDEX idx_document_scope ON ds_document (module_id, env_id, ref_id, deleted);
+
+-- handle_file_upload master lookup; covering, so the rule is served from the index alone.
+CREATE INDEX idx_document_master_rule ON ds_document_master
+    (env_id, module_id, type, deleted, status, allowed_max_size, allowed_extension, filepath);
+
+-- login: covering for the columns the route reads.
+CREATE INDEX idx_user_login ON ds_user (username, deleted, status, password, first_name);
+
+-- delete_document_service looks documents up by primary key; no extra index is needed.
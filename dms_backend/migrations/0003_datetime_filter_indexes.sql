@@ -0,0 +1,6 @@
+-- Indexes for the admin list date-range filters and their ORDER BY createdAt DESC, id DESC.
+-- InnoDB appends the primary key to secondary indexes, so (createdAt) also serves the id tiebreaker.
+
+CREATE INDEX idx_document_created ON ds_document (createdAt);
+CREATE INDEX idx_document_updated ON ds_document (updatedAt);
+CREATE INDEX idx_access_log_created ON ds_access_log (createdAt);
@@ -0,0 +1,5 @@
+-- Thumbnail/preview generation state: NULL (not previewable), 'pending', 'ready' or 'failed'.
+-- Rows left 'pending' by a crash are picked up again by app.services.preview_services.requeue_pending_previews.
+
+ALTER TABLE ds_document ADD COLUMN preview_status VARCHAR(16) NULL DEFAULT NULL;
+CREATE INDEX idx_document_preview_status ON ds_document (preview_status);
@@ -0,0 +1,17 @@
+-- Per document-type compression policy and per document stored representation.
+-- compression_policy: 'none', 'always', or 'min_savings' (compress when it saves at least
+-- compression_min_savings percent). filesize stays the original size; stored_size is the
+-- size on disk and content_encoding is 'gzip' for compressed files.
+
+ALTER TABLE ds_document_master
+    ADD COLUMN compression_policy VARCHAR(16) NOT NULL DEFAULT 'none',
+    ADD COLUMN compression_min_savings TINYINT NOT NULL DEFAULT 20;
+
+ALTER TABLE ds_document
+    ADD COLUMN stored_size BIGINT NULL DEFAULT NULL,
+    ADD COLUMN content_encoding VARCHAR(16) NULL DEFAULT NULL;
+
+-- Keep the master rule lookup covering now that it also reads the policy.
+DROP INDEX idx_document_master_rule ON ds_document_master;
+CREATE INDEX idx_document_master_rule ON ds_document_master
+    (env_id, module_id, type, deleted, status, allowed_max_size, compression_policy, compression_min_savings, allowed_extension, filepath);
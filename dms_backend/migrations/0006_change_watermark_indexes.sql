@@ -0,0 +1,8 @@
+-- Indexes for the change watermark behind the admin list ETags:
+-- SELECT MAX(id), MAX(updatedAt) reads the last entry of the primary key and of an (updatedAt) index.
+-- ds_document already has idx_document_updated.
+
+CREATE INDEX idx_access_log_updated ON ds_access_log (updatedAt);
+CREATE INDEX idx_user_updated ON ds_user (updatedAt);
+CREATE INDEX idx_document_master_updated ON ds_document_master (updatedAt);
+CREATE INDEX idx_application_config_updated ON ds_application_config (updatedAt);
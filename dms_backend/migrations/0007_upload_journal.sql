@@ -0,0 +1,6 @@
+-- Uploads acknowledged from the local metadata journal keep the journal record id, which makes
+-- the journal applier idempotent and lets clients match their acknowledgement to the row.
+
+ALTER TABLE ds_document
+    ADD COLUMN journal_id CHAR(32) NULL DEFAULT NULL,
+    ADD UNIQUE KEY uq_document_journal (journal_id);
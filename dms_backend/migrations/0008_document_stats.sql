@@ -0,0 +1,27 @@
+-- Precomputed document aggregates for GET /admin/stats, kept current in the same transaction
+-- as every insert and soft delete of ds_document and rebuilt by 'flask stats rebuild'.
+-- ds_document_stats holds the live (not deleted) documents per module, env and type.
+-- ds_document_stats_daily holds uploads per createdAt day and soft deletes per deletion day.
+
+CREATE TABLE IF NOT EXISTS ds_document_stats (
+    module_id INT NOT NULL,
+    env_id INT NOT NULL,
+    type VARCHAR(50) NOT NULL,
+    document_count BIGINT NOT NULL DEFAULT 0,
+    total_bytes BIGINT NOT NULL DEFAULT 0,
+    stored_bytes BIGINT NOT NULL DEFAULT 0,
+    updatedAt DATETIME NULL DEFAULT NULL ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (module_id, env_id, type)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS ds_document_stats_daily (
+    day DATE NOT NULL,
+    env_id INT NOT NULL,
+    module_id INT NOT NULL,
+    type VARCHAR(50) NOT NULL,
+    uploads BIGINT NOT NULL DEFAULT 0,
+    upload_bytes BIGINT NOT NULL DEFAULT 0,
+    deletes BIGINT NOT NULL DEFAULT 0,
+    delete_bytes BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, env_id, module_id, type)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,43 @@
+-- Storage integrity verification ('flask storage verify').
+-- content_sha256 is the SHA-256 of a document's original bytes, recorded the first time the
+-- verifier reads the file and checked on every later run.
+-- ds_integrity_run holds one row per run, with its checkpoint (last_id) and counters.
+-- ds_integrity_issue holds one row per problem found.
+
+ALTER TABLE ds_document ADD COLUMN content_sha256 CHAR(64) NULL DEFAULT NULL;
+
+CREATE TABLE IF NOT EXISTS ds_integrity_run (
+    id INT NOT NULL AUTO_INCREMENT,
+    status VARCHAR(16) NOT NULL DEFAULT 'running',
+    verify_hashes TINYINT(1) NOT NULL DEFAULT 1,
+    max_id BIGINT NOT NULL DEFAULT 0,
+    last_id BIGINT NOT NULL DEFAULT 0,
+    checked BIGINT NOT NULL DEFAULT 0,
+    ok BIGINT NOT NULL DEFAULT 0,
+    missing BIGINT NOT NULL DEFAULT 0,
+    size_mismatch BIGINT NOT NULL DEFAULT 0,
+    hash_mismatch BIGINT NOT NULL DEFAULT 0,
+    unreadable BIGINT NOT NULL DEFAULT 0,
+    hashes_recorded BIGINT NOT NULL DEFAULT 0,
+    bytes_read BIGINT NOT NULL DEFAULT 0,
+    error VARCHAR(500) NULL DEFAULT NULL,
+    startedAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updatedAt DATETIME NULL DEFAULT NULL ON UPDATE CURRENT_TIMESTAMP,
+    finishedAt DATETIME NULL DEFAULT NULL,
+    PRIMARY KEY (id),
+    KEY idx_integrity_run_finished (finishedAt)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS ds_integrity_issue (
+    id BIGINT NOT NULL AUTO_INCREMENT,
+    run_id INT NOT NULL,
+    document_id INT NOT NULL,
+    filepath VARCHAR(512) NOT NULL,
+    problem VARCHAR(16) NOT NULL,
+    expected VARCHAR(100) NULL DEFAULT NULL,
+    actual VARCHAR(255) NULL DEFAULT NULL,
+    createdAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id),
+    KEY idx_integrity_issue_run (run_id, id),
+    KEY idx_integrity_issue_document (document_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
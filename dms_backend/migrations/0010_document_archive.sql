@@ -0,0 +1,11 @@
+-- Archive for soft-deleted documents, filled by the document archiver (app/services/archive_services.py).
+-- ds_document_archive has ds_document's columns in the same order plus archivedAt at the end,
+-- so rows move with INSERT ... SELECT d.*. A migration that adds a column to ds_document must
+-- add it to ds_document_archive too, before archivedAt.
+
+CREATE TABLE IF NOT EXISTS ds_document_archive LIKE ds_document;
+ALTER TABLE ds_document_archive ADD COLUMN archivedAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP;
+CREATE INDEX idx_document_archive_archived ON ds_document_archive (archivedAt);
+
+-- Finds archivable rows (deleted = 1, oldest deletion first) without walking live rows
+CREATE INDEX idx_document_deleted_updated ON ds_document (deleted, updatedAt);
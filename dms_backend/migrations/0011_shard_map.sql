@@ -0,0 +1,16 @@
+-- Shard map for the per-application tables (see app/sharding.py). Rows exist only for
+-- env_ids that live outside the default shard or are being moved; the table is read from
+-- the primary. Migrations are applied to every shard, so shards carry the full schema.
+
+CREATE TABLE IF NOT EXISTS ds_shard_map (
+    env_id INT PRIMARY KEY,
+    shard VARCHAR(64) NOT NULL,
+    state VARCHAR(16) NOT NULL DEFAULT 'active' COMMENT 'active, copying or frozen',
+    target VARCHAR(64) NULL COMMENT 'Shard a move is copying to',
+    updatedAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- 'flask shards move' walks one application's rows in id order
+CREATE INDEX idx_document_env_id ON ds_document (env_id, id);
+CREATE INDEX idx_document_archive_env_id ON ds_document_archive (env_id, id);
+CREATE INDEX idx_access_log_env_id ON ds_access_log (env_id, id);
@@ -0,0 +1,105 @@
+-- Change counters behind the admin list ETags (see get_list_etag in app/services/admin_services.py).
+-- Triggers bump a table's counter on every insert, update and delete in the same transaction,
+-- so the counter moves exactly when the list can change: unlike MAX(updatedAt) it has no
+-- one-second granularity, does not depend on the session time zone, and a transaction that
+-- commits after a newer one still moves it. Shards keep their own counters.
+--
+-- Each table has 16 counter rows (stripes) and a session bumps stripe CONNECTION_ID() % 16,
+-- so a long transaction (an archiver batch, a shard copy) only holds its own stripe and other
+-- writers rarely wait on it. The ETag uses the sum of the stripes.
+-- ds_access_log has no counter: the API only inserts into it, so MAX(id) is its watermark.
+
+CREATE TABLE IF NOT EXISTS ds_change_counter (
+    table_name VARCHAR(64) NOT NULL,
+    stripe TINYINT UNSIGNED NOT NULL,
+    version BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    PRIMARY KEY (table_name, stripe)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+INSERT IGNORE INTO ds_change_counter (table_name, stripe)
+SELECT tables.table_name, stripes.stripe
+FROM (
+    SELECT 'ds_user' AS table_name
+    UNION ALL SELECT 'ds_document_master'
+    UNION ALL SELECT 'ds_application_config'
+    UNION ALL SELECT 'ds_document'
+    UNION ALL SELECT 'ds_document_archive'
+) AS tables
+CROSS JOIN (
+    SELECT 0 AS stripe
+    UNION ALL SELECT 1
+    UNION ALL SELECT 2
+    UNION ALL SELECT 3
+    UNION ALL SELECT 4
+    UNION ALL SELECT 5
+    UNION ALL SELECT 6
+    UNION ALL SELECT 7
+    UNION ALL SELECT 8
+    UNION ALL SELECT 9
+    UNION ALL SELECT 10
+    UNION ALL SELECT 11
+    UNION ALL SELECT 12
+    UNION ALL SELECT 13
+    UNION ALL SELECT 14
+    UNION ALL SELECT 15
+) AS stripes;
+
+CREATE TRIGGER trg_user_ins_counter AFTER INSERT ON ds_user FOR EACH ROW
+    UPDATE ds_change_counter SET version = version + 1
+    WHERE table_name = 'ds_user' AND stripe = CONNECTION_ID() % 16;
+
+CREATE TRIGGER trg_user_upd_counter AFTER UPDATE ON ds_user FOR EACH ROW
+    UPDATE ds_change_counter SET version = version + 1
+    WHERE table_name = 'ds_user' AND stripe = CONNECTION_ID() % 16;
+
+CREATE TRIGGER trg_user_del_counter AFTER DELETE ON ds_user FOR EACH ROW
+    UPDATE ds_change_counter SET version = version + 1
+    WHERE table_name = 'ds_user' AND stripe = CONNECTION_ID() % 16;
+
+CREATE TRIGGER trg_document_master_ins_counter AFTER INSERT ON ds_document_master FOR EACH ROW
+    UPDATE ds_change_counter SET version = version + 1
+    WHERE table_name = 'ds_document_master' AND stripe = CONNECTION_ID() % 16;
+
+CREATE TRIGGER trg_document_master_upd_counter AFTER UPDATE ON ds_document_master FOR EACH ROW
+    UPDATE ds_change_counter SET version = version + 1
+    WHERE table_name = 'ds_document_master' AND stripe = CONNECTION_ID() % 16;
+
+CREATE TRIGGER trg_document_master_del_counter AFTER DELETE ON ds_document_master FOR EACH ROW
+    UPDATE ds_change_counter SET version = version + 1
+    WHERE table_name = 'ds_document_master' AND stripe = CONNECTION_ID() % 16;
+
+CREATE TRIGGER trg_application_config_ins_counter AFTER INSERT ON ds_application_config FOR EACH ROW
+    UPDATE ds_change_counter SET version = version + 1
+    WHERE table_name = 'ds_application_config' AND stripe = CONNECTION_ID() % 16;
+
+CREATE TRIGGER trg_application_config_upd_counter AFTER UPDATE ON ds_application_config FOR EACH ROW
+    UPDATE ds_change_counter SET version = version + 1
+    WHERE table_name = 'ds_application_config' AND stripe = CONNECTION_ID() % 16;
+
+CREATE TRIGGER trg_application_config_del_counter AFTER DELETE ON ds_application_config FOR EACH ROW
+    UPDATE ds_change_counter SET version = version + 1
+    WHERE table_name = 'ds_application_config' AND stripe = CONNECTION_ID() % 16;
+
+CREATE TRIGGER trg_document_ins_counter AFTER INSERT ON ds_document FOR EACH ROW
+    UPDATE ds_change_counter SET version = version + 1
+    WHERE table_name = 'ds_document' AND stripe = CONNECTION_ID() % 16;
+
+CREATE TRIGGER trg_document_upd_counter AFTER UPDATE ON ds_document FOR EACH ROW
+    UPDATE ds_change_counter SET version = version + 1
+    WHERE table_name = 'ds_document' AND stripe = CONNECTION_ID() % 16;
+
+CREATE TRIGGER trg_document_del_counter AFTER DELETE ON ds_document FOR EACH ROW
+    UPDATE ds_change_counter SET version = version + 1
+    WHERE table_name = 'ds_document' AND stripe = CONNECTION_ID() % 16;
+
+CREATE TRIGGER trg_document_archive_ins_counter AFTER INSERT ON ds_document_archive FOR EACH ROW
+    UPDATE ds_change_counter SET version = version + 1
+    WHERE table_name = 'ds_document_archive' AND stripe = CONNECTION_ID() % 16;
+
+CREATE TRIGGER trg_document_archive_upd_counter AFTER UPDATE ON ds_document_archive FOR EACH ROW
+    UPDATE ds_change_counter SET version = version + 1
+    WHERE table_name = 'ds_document_archive' AND stripe = CONNECTION_ID() % 16;
+
+CREATE TRIGGER trg_document_archive_del_counter AFTER DELETE ON ds_document_archive FOR EACH ROW
+    UPDATE ds_change_counter SET version = version + 1
+    WHERE table_name = 'ds_document_archive' AND stripe = CONNECTION_ID() % 16;
@@ -0,0 +1,20 @@
+-- Deletion time of soft-deleted documents. It defines a deletion's age everywhere: the stats
+-- rebuild dates deletes by it and the archiver archives by it. updatedAt also moves on later
+-- changes, so it is not used for either.
+-- restoredAt is set when a row is restored from the archive; the archiver leaves the row in
+-- ds_document until the restore, too, is ARCHIVE_AFTER_DAYS old. deletedAt is kept as is.
+-- Both are written with UTC_TIMESTAMP(), like the daily counters of record_document_removed.
+-- ds_document_archive gets the columns in the same position, before archivedAt (see 0010).
+
+ALTER TABLE ds_document ADD COLUMN deletedAt DATETIME NULL DEFAULT NULL, ADD COLUMN restoredAt DATETIME NULL DEFAULT NULL;
+ALTER TABLE ds_document_archive ADD COLUMN deletedAt DATETIME NULL DEFAULT NULL AFTER content_sha256, ADD COLUMN restoredAt DATETIME NULL DEFAULT NULL AFTER deletedAt;
+
+-- Rows deleted before this migration keep the date the rebuild and the archiver used until now
+UPDATE ds_document SET deletedAt = updatedAt, updatedAt = updatedAt WHERE deleted = 1 AND deletedAt IS NULL;
+UPDATE ds_document_archive SET deletedAt = updatedAt, updatedAt = updatedAt WHERE deleted = 1 AND deletedAt IS NULL;
+
+-- The rebuild's deletes by day and the archiver's batches are range scans on these
+CREATE INDEX idx_document_deleted_at ON ds_document (deleted, deletedAt);
+CREATE INDEX idx_document_archive_deleted_at ON ds_document_archive (deleted, deletedAt);
+-- Replaced by idx_document_deleted_at now that the archiver no longer goes by updatedAt
+DROP INDEX idx_document_deleted_updated ON ds_document;
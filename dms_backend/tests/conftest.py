@@ -0,0 +1,180 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Tests against real MySQL servers run when TEST_DB_HOST is set; they use the schemas
+# dms_test (primary), dms_test_s1 and dms_test_s2 (shards) on that server, and
+# TEST_DB_REPLICA_HOST (host[:port]) as a read replica of it when set.
+TEST_DB_HOST = os.getenv("TEST_DB_HOST")
+TEST_DB_PORT = os.getenv("TEST_DB_PORT", "3306")
+TEST_DB_REPLICA_HOST = os.getenv("TEST_DB_REPLICA_HOST")
+TEST_SHARDS = ("s1", "s2")
+
+if TEST_DB_HOST:
+    os.environ.update(
+        DB_HOST=TEST_DB_HOST,
+        DB_NAME="dms_test",
+        DB_USER=os.getenv("TEST_DB_USER", "root"),
+        DB_PASSWORD=os.getenv("TEST_DB_PASSWORD", ""),
+        DB_SHARDS=",".join(f"{name}={TEST_DB_HOST}:{TEST_DB_PORT}/dms_test_{name}" for name in TEST_SHARDS),
+        DB_REPLICA_HOSTS=TEST_DB_REPLICA_HOST or ""
+    )
+else:
+    os.environ.update(DB_HOST="db.invalid", DB_NAME="dms", DB_USER="dms", DB_PASSWORD="")
+os.environ.update(
+    JWT_SECRET_KEY="test-secret-" * 4,
+    STARTUP_TASKS="off",
+    DB_VERIFY_PLANS="off",
+    SHARD_MAP_REFRESH_SECONDS="0",
+    SHARD_MOVE_GRACE_SECONDS="0"
+)
+
+from app import database, sharding  # noqa: E402
+from app.services import shard_services  # noqa: E402
+
+requires_mysql = pytest.mark.skipif(not TEST_DB_HOST, reason="TEST_DB_HOST is not set")
+
+
+class FakeCursor:
+    def __init__(self, server):
+        self.server = server
+        self.rows = []
+        self.description = None
+        self.with_rows = False
+        self.lastrowid = None
+        self.rowcount = 0
+
+    def execute(self, sql, params=None):
+        sql = " ".join(sql.split())
+        self.server.log.append((sql, params))
+        rows = self.server.respond(sql, params)
+        self.rows = list(rows) if isinstance(rows, (list, tuple)) else []
+        self.with_rows = sql.upper().startswith("SELECT")
+        self.description = ("column",) if self.with_rows else None
+        # A response to a write is its rowcount
+        self.rowcount = len(self.rows) if self.with_rows else (rows if isinstance(rows, int) else 1)
+
+    def executemany(self, sql, seq_params):
+        for params in seq_params:
+            self.execute(sql, params)
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return list(self.rows)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, server):
+        self.server = server
+        self.connection_id = id(self)
+
+    def is_connected(self):
+        return True
+
+    def cursor(self, **kwargs):
+        return FakeCursor(self.server)
+
+    def commit(self):
+        self.server.log.append(("COMMIT", None))
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeServer:
+    """
+    One MySQL database: logs every statement and answers the first response whose SQL
+    fragment occurs in the statement.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.log = []
+        self.responses = []  # (sql fragment, rows, rowcount or callable(sql, params))
+        self.down = False
+
+    def on(self, fragment, rows):
+        self.responses.insert(0, (fragment, rows))
+
+    def respond(self, sql, params):
+        for fragment, rows in self.responses:
+            if fragment in sql:
+                return rows(sql, params) if callable(rows) else rows
+        return []
+
+    def statements(self, fragment=""):
+        return [sql for sql, _ in self.log if fragment in sql]
+
+
+class FakeMySQL:
+    """
+    Stands in for MySQLConnectionPool: every (host, database) is a FakeServer.
+    """
+
+    def __init__(self):
+        self.servers = {}
+
+    def server(self, host, database=None):
+        key = (host, database or os.environ["DB_NAME"])
+        if key not in self.servers:
+            self.servers[key] = FakeServer(f"{host}/{key[1]}")
+        return self.servers[key]
+
+    def pool(self, pool_name=None, pool_size=None, pool_reset_session=None, **config):
+        from mysql.connector import Error
+        server = self.server(config["host"], config.get("database"))
+        if server.down:
+            raise Error("Can't connect to MySQL server")
+        return FakePool(server)
+
+
+class FakePool:
+    def __init__(self, server):
+        self.server = server
+
+    def get_connection(self):
+        from mysql.connector import Error
+        if self.server.down:
+            raise Error("Lost connection to MySQL server")
+        return FakeConnection(self.server)
+
+
+@pytest.fixture
+def fake_mysql(monkeypatch):
+    """
+    Fresh pools against fake servers; the primary is fake_mysql.primary. Use
+    configure(shards=[...], replicas=[...]) before the first checkout.
+    """
+    fake = FakeMySQL()
+    monkeypatch.setattr(database.pooling, "MySQLConnectionPool", fake.pool)
+    monkeypatch.setattr(database, "db_connection_pool", None)
+    monkeypatch.setattr(database, "db_replica_pools", [])
+    monkeypatch.setattr(database, "db_shard_pools", {})
+    monkeypatch.setattr(database, "_recent_writes", {})
+    monkeypatch.setattr(database, "_pool_retry_at", 0.0)
+    monkeypatch.setattr(database, "DB_PREPARED_STATEMENTS", False)
+    monkeypatch.setattr(sharding, "_shard_map", {})
+    monkeypatch.setattr(sharding, "_shard_map_loaded_at", None)
+    monkeypatch.setattr(sharding, "SHARD_MAP_REFRESH_SECONDS", 0)
+
+    def configure(shards=(), replicas=()):
+        shards = list(shards)
+        monkeypatch.setattr(database, "DB_SHARDS", shards)
+        monkeypatch.setattr(sharding, "DB_SHARDS", shards)
+        monkeypatch.setattr(shard_services, "DB_SHARDS", shards)
+        monkeypatch.setattr(database, "DB_REPLICA_HOSTS", list(replicas))
+
+    configure()
+    fake.configure = configure
+    fake.primary = fake.server(os.environ["DB_HOST"])
+    return fake
@@ -0,0 +1,95 @@
+import threading
+import time
+from flask import Flask, Response
+from app.utils import admission
+from app.utils.admission import AdmissionController, lane_for_endpoint
+
+LANES = {
+    "fast": (2, 1, 0),
+    "slow": (2, 1, 1),
+    "document_stream": (5, 0, 0),
+}
+
+
+def waiter(controller, lane, results):
+    thread = threading.Thread(target=lambda: results.append((lane, controller.acquire(lane))))
+    thread.start()
+    return thread
+
+
+def wait_for_queue(controller, size):
+    deadline = time.monotonic() + 2
+    while len(controller._queue) < size and time.monotonic() < deadline:
+        time.sleep(0.001)
+    assert len(controller._queue) == size
+
+
+def test_downloads_use_the_uncounted_stream_lane():
+    assert lane_for_endpoint("document_routes.download_document_route") == "document_stream"
+    assert lane_for_endpoint("document_routes.download_zip_route") == "document_stream"
+    assert lane_for_endpoint("document_routes.list_documents_route") == "document_read"
+    assert lane_for_endpoint("document_routes.upload_file_route") == "document_write"
+    assert lane_for_endpoint("admin_routes.admin_metrics") is None
+    assert "document_stream" in admission.UNCOUNTED_LANES
+
+
+def test_uncounted_lane_does_not_use_global_slots():
+    controller = AdmissionController(2, LANES, queue_timeout=0.05)
+    assert all(controller.acquire("document_stream") for _ in range(5))
+    assert not controller.acquire("document_stream")  # Its own limit still applies
+    assert controller.acquire("fast") and controller.acquire("slow")
+    assert controller._active == 2
+
+
+def test_full_queue_and_timeout_shed_requests():
+    controller = AdmissionController(1, LANES, queue_timeout=0.05)
+    assert controller.acquire("fast")
+    results = []
+    thread = waiter(controller, "fast", results)
+    wait_for_queue(controller, 1)
+    assert not controller.acquire("fast")  # Queue cap of 1 is taken
+    thread.join()
+    assert results == [("fast", False)]  # Timed out waiting
+    assert controller.lanes["fast"].waiting == 0 and controller._queue == []
+
+
+def test_freed_slot_goes_to_the_highest_priority_waiter():
+    controller = AdmissionController(1, LANES, queue_timeout=2)
+    assert controller.acquire("fast")
+    results = []
+    threads = [waiter(controller, "slow", results)]
+    wait_for_queue(controller, 1)
+    threads.append(waiter(controller, "fast", results))
+    wait_for_queue(controller, 2)
+
+    controller.release("fast")
+    threads[1].join()
+    assert results == [("fast", True)]
+    controller.release("fast")
+    threads[0].join()
+    assert results == [("fast", True), ("slow", True)]
+
+
+def test_streamed_response_holds_its_slot_until_closed(monkeypatch):
+    monkeypatch.setattr(admission, "DEFAULT_LANES", {"document_stream": (1, 0, 0)})
+    monkeypatch.setattr(admission, "ENDPOINT_LANES", {"download": "document_stream"})
+    app = Flask(__name__)
+    controller = admission.init_admission_control(app)
+
+    @app.route("/download")
+    def download():
+        return Response(iter([b"a", b"b"]))
+
+    client = app.test_client()
+    first = client.get("/download", buffered=False)
+    assert controller.lanes["document_stream"].active == 1
+    shed = client.get("/download")
+    assert shed.status_code == 503
+    assert shed.headers["Retry-After"] == str(admission.ADMISSION_RETRY_AFTER_SECONDS)
+    assert shed.get_json()["responseStatus"] == "error"
+
+    assert first.get_data() == b"ab"
+    first.close()
+    assert controller.lanes["document_stream"].active == 0
+    assert controller._active == 0
+    assert client.get("/download").status_code == 200
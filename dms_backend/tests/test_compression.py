@@ -0,0 +1,77 @@
+import os
+import gzip
+import pytest
+from mysql.connector import Error
+from app.services import compression_services
+from app.services.preview_services import thumbnail_path
+
+
+@pytest.fixture
+def documents(fake_mysql, tmp_path):
+    fake_mysql.primary.on("FROM ds_document_master", [
+        {"env_id": 1, "module_id": 2, "type": "doc", "compression_policy": "always", "compression_min_savings": 0}
+    ])
+    rows = []
+    for document_id in (1, 2, 3):
+        path = tmp_path / f"file-{document_id}.txt"
+        path.write_bytes(b"hello world " * 100)
+        rows.append({"id": document_id, "filepath": str(path), "env_id": 1, "module_id": 2, "type": "doc",
+                     "filesize": 1200, "stored_size": 1200})
+    fake_mysql.primary.on("FROM ds_document d", lambda sql, params: [dict(row) for row in rows] if params[0] == 0 else [])
+    fake_mysql.rows = rows
+    return fake_mysql
+
+
+def test_recompress_replaces_files_and_moves_previews(documents):
+    with open(thumbnail_path(documents.rows[0]["filepath"]), "wb") as f:
+        f.write(b"jpeg")
+
+    stats = compression_services.recompress_documents(workers=2)
+
+    assert stats == {"compressed": 3, "kept": 0, "skipped": 0, "failed": 0}
+    for row in documents.rows:
+        with gzip.open(row["filepath"] + ".gz") as f:
+            assert f.read() == b"hello world " * 100
+        assert not os.path.exists(row["filepath"])
+    assert open(thumbnail_path(documents.rows[0]["filepath"] + ".gz"), "rb").read() == b"jpeg"
+    updates = [params for sql, params in documents.primary.log if sql.startswith("UPDATE ds_document SET filepath")]
+    assert [params[3] for params in updates] == [1, 2, 3]
+    assert all("AND deleted = 0" in sql for sql in documents.primary.statements("UPDATE ds_document SET filepath"))
+
+
+def test_rows_changed_meanwhile_are_skipped_without_aborting(documents):
+    moved, deleted = documents.rows[1], documents.rows[2]
+
+    def update(sql, params):
+        # A reshard moved document 2 and a delete removed document 3 after they were read
+        if params[3] == moved["id"]:
+            os.remove(moved["filepath"])
+            return 0
+        if params[3] == deleted["id"]:
+            return 0
+        return 1
+
+    documents.primary.on("UPDATE ds_document SET filepath", update)
+
+    stats = compression_services.recompress_documents(workers=2)
+
+    assert stats == {"compressed": 1, "kept": 0, "skipped": 2, "failed": 0}
+    assert os.path.exists(documents.rows[0]["filepath"] + ".gz")
+    assert not os.path.exists(moved["filepath"] + ".gz")
+    assert not os.path.exists(deleted["filepath"] + ".gz")
+    # The file of the deleted row is not touched by the job; its owner removes it
+    assert os.path.exists(deleted["filepath"])
+    stats_updates = documents.primary.statements("ds_document_stats")
+    assert len(stats_updates) == 1
+
+
+def test_failed_batch_removes_the_compressed_copies(documents):
+    def update(sql, params):
+        raise Error("Deadlock found")
+
+    documents.primary.on("UPDATE ds_document SET filepath", update)
+    stats = compression_services.recompress_documents(workers=2)
+    assert stats["failed"] == 3
+    for row in documents.rows:
+        assert os.path.exists(row["filepath"])
+        assert not os.path.exists(row["filepath"] + ".gz")
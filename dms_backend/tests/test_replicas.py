@@ -0,0 +1,73 @@
+import pytest
+from app import database
+from app.services import admin_services
+
+REPLICAS = ["replica1.invalid", "replica2.invalid:3307"]
+
+
+@pytest.fixture
+def replicated(fake_mysql, monkeypatch):
+    fake_mysql.configure(replicas=REPLICAS)
+    monkeypatch.setattr(database, "_replica_cursor", 0)
+    fake_mysql.replica1 = fake_mysql.server("replica1.invalid")
+    fake_mysql.replica2 = fake_mysql.server("replica2.invalid")
+    return fake_mysql
+
+
+def test_reads_use_replicas_in_turn_and_writes_use_the_primary(replicated):
+    servers = [database.get_db_connection(read_only=True).server for _ in range(4)]
+    assert servers == [replicated.replica1, replicated.replica2, replicated.replica1, replicated.replica2]
+    assert database.get_db_connection().server is replicated.primary
+
+
+def test_recent_writer_reads_from_the_primary(replicated, monkeypatch):
+    database.get_db_connection()  # The write that precedes mark_primary_write
+    database.mark_primary_write("user-1")
+    assert database.get_db_connection(read_only=True, sticky_key="user-1").server is replicated.primary
+    assert database.get_db_connection(read_only=True, sticky_key="user-2").server is not replicated.primary
+    assert database.get_db_connection(read_only=True).server is not replicated.primary
+
+    monkeypatch.setattr(database, "DB_REPLICA_STICKY_SECONDS", 0)
+    assert database.get_db_connection(read_only=True, sticky_key="user-1").server is not replicated.primary
+
+
+def test_stickiness_is_not_recorded_without_replicas(fake_mysql):
+    database.mark_primary_write("user-1")
+    assert database._recent_writes == {}
+
+
+def test_reads_fall_back_to_the_primary_while_replicas_are_down(replicated):
+    replicated.replica1.down = True
+    replicated.replica2.down = True
+    assert database.get_db_connection(read_only=True).server is replicated.primary
+    assert all(replica["pool"] is None for replica in database.db_replica_pools)
+
+
+def test_failed_replica_is_skipped_until_its_retry_time(replicated, monkeypatch):
+    database.get_db_connection(read_only=True)  # Opens the pools
+    replicated.replica1.down = True
+    servers = [database.get_db_connection(read_only=True).server for _ in range(3)]
+    assert servers == [replicated.replica2] * 3
+    assert database.db_replica_pools[0]["down_until"] > 0
+
+    replicated.replica1.down = False
+    database.db_replica_pools[0]["down_until"] = 0.0
+    servers = {database.get_db_connection(read_only=True).server for _ in range(2)}
+    assert servers == {replicated.replica1, replicated.replica2}
+
+
+def test_replica_down_at_boot_is_opened_on_first_use(replicated, monkeypatch):
+    monkeypatch.setattr(database, "DB_REPLICA_RETRY_SECONDS", 0)
+    replicated.replica1.down = True
+    replicated.replica2.down = True
+    assert database.get_db_connection(read_only=True).server is replicated.primary
+
+    replicated.replica1.down = False
+    assert database.get_db_connection(read_only=True).server is replicated.replica1
+
+
+def test_admin_reads_are_served_by_a_replica(replicated):
+    replicated.replica1.on("FROM ds_user", [{"id": 1}])
+    assert admin_services.execute_query("SELECT id FROM ds_user", fetch_one=True) == {"id": 1}
+    assert replicated.replica1.statements("FROM ds_user")
+    assert not replicated.primary.statements("FROM ds_user")
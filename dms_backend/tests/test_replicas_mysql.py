@@ -0,0 +1,46 @@
+"""
+Replica routing against real servers: TEST_DB_HOST is the primary and TEST_DB_REPLICA_HOST
+(host[:port]) a replica of it, for example two local MySQL instances on ports 3306 and 3307
+with replication set up between them.
+"""
+import pytest
+from app import database
+from conftest import requires_mysql, TEST_DB_REPLICA_HOST
+
+pytestmark = [
+    requires_mysql,
+    pytest.mark.skipif(not TEST_DB_REPLICA_HOST, reason="TEST_DB_REPLICA_HOST is not set")
+]
+
+
+def _server_uuid(conn):
+    cursor = database.get_db_cursor(conn)
+    try:
+        cursor.execute("SELECT @@server_uuid AS uuid")
+        return cursor.fetchone()['uuid']
+    finally:
+        database.close_db_connection(conn, cursor)
+
+
+@pytest.fixture
+def primary_uuid():
+    return _server_uuid(database.get_db_connection())
+
+
+def test_reads_are_served_by_the_replica(primary_uuid):
+    assert database.db_replica_pools
+    assert _server_uuid(database.get_db_connection(read_only=True)) != primary_uuid
+
+
+def test_recent_writer_reads_from_the_primary(primary_uuid, monkeypatch):
+    database.mark_primary_write("replica-test-user")
+    assert _server_uuid(database.get_db_connection(read_only=True, sticky_key="replica-test-user")) == primary_uuid
+    assert _server_uuid(database.get_db_connection(read_only=True, sticky_key="other-user")) != primary_uuid
+    monkeypatch.setattr(database, "DB_REPLICA_STICKY_SECONDS", 0)
+    assert _server_uuid(database.get_db_connection(read_only=True, sticky_key="replica-test-user")) != primary_uuid
+
+
+def test_reads_fall_back_to_the_primary_when_the_replica_is_unreachable(primary_uuid, monkeypatch):
+    replica = database.db_replica_pools[0]
+    monkeypatch.setitem(replica, 'down_until', float('inf'))
+    assert _server_uuid(database.get_db_connection(read_only=True)) == primary_uuid
@@ -0,0 +1,139 @@
+import pytest
+from app import database, sharding
+from app.services import shard_services
+
+SHARDS = ["s1=shard1.invalid/dms_s1", "s2=shard2.invalid:3307/dms_s2"]
+
+
+@pytest.fixture
+def sharded(fake_mysql):
+    fake_mysql.configure(shards=SHARDS)
+    fake_mysql.s1 = fake_mysql.server("shard1.invalid", "dms_s1")
+    fake_mysql.s2 = fake_mysql.server("shard2.invalid", "dms_s2")
+    fake_mysql.shard_map = []
+    fake_mysql.primary.on("FROM ds_shard_map", lambda sql, params: list(fake_mysql.shard_map))
+    return fake_mysql
+
+
+def _server_of(conn):
+    return conn.server
+
+
+def test_without_shards_every_application_uses_the_primary(fake_mysql):
+    conn = sharding.get_env_connection(7)
+    assert _server_of(conn) is fake_mysql.primary
+    assert sharding.shards_for_query(7) == [database.DEFAULT_SHARD]
+    assert sharding.ownership_filter(database.DEFAULT_SHARD) == ("", [])
+    assert not fake_mysql.primary.statements("SET SESSION")
+
+
+def test_mapped_application_is_routed_to_its_shard(sharded):
+    sharded.shard_map = [{"env_id": 7, "shard": "s1", "state": "active", "target": None}]
+    assert sharding.shard_for_env(7) == "s1"
+    assert sharding.shard_for_env(8) == database.DEFAULT_SHARD
+    assert _server_of(sharding.get_env_connection(7)) is sharded.s1
+    assert _server_of(sharding.get_env_connection(8)) is sharded.primary
+    assert sharding.shards_for_query(7) == ["s1"]
+    assert sharding.shards_for_query() == ["default", "s1", "s2"]
+
+
+def test_shards_interleave_auto_increment_ids(sharded):
+    sharding.get_env_connection(1)
+    database.get_db_connection(shard="s1")
+    database.get_db_connection(shard="s2")
+    set_session = "SET SESSION auto_increment_increment"
+    assert {params for sql, params in sharded.primary.log if set_session in sql} == {(8, 1)}
+    assert {params for sql, params in sharded.s1.log if set_session in sql} == {(8, 2)}
+    assert {params for sql, params in sharded.s2.log if set_session in sql} == {(8, 3)}
+
+
+def test_frozen_application_refuses_writes_but_serves_reads(sharded):
+    sharded.shard_map = [{"env_id": 7, "shard": "s1", "state": "frozen", "target": "s2"}]
+    assert sharding.get_env_connection(7) is None
+    assert _server_of(sharding.get_env_connection(7, read_only=True)) is sharded.s1
+
+
+def test_unreadable_shard_map_routes_nothing(sharded):
+    sharded.primary.down = True
+    assert sharding.shard_for_env(7) is None
+    assert sharding.get_env_connection(7) is None
+
+
+def test_ownership_filter_excludes_applications_owned_elsewhere(sharded):
+    sharded.shard_map = [
+        {"env_id": 7, "shard": "s1", "state": "active", "target": None},
+        {"env_id": 3, "shard": "s2", "state": "copying", "target": "s1"}
+    ]
+    assert sharding.ownership_filter("s1") == ("(env_id IS NULL OR env_id NOT IN (%s))", [3])
+    assert sharding.ownership_filter("default", column="d.env_id") == \
+        ("(d.env_id IS NULL OR d.env_id NOT IN (%s, %s))", [3, 7])
+
+
+@pytest.fixture
+def move(sharded, monkeypatch):
+    """
+    Runs move_application against the fake map; records the map states it passes through
+    and stubs the copying, which is covered by the MySQL tests.
+    """
+    sharded.primary.on("GET_LOCK", [{"acquired": 1}])
+    sharded.states = []
+    sharded.sync_results = []
+    sharded.cleaned = []
+
+    def set_map_entry(cursor, conn, env_id, shard, state, target):
+        sharded.states.append((shard, state, target))
+        sharded.shard_map = [{"env_id": env_id, "shard": shard, "state": state, "target": target}]
+
+    def sync_env(env_id, source, target, batch_size, pause_seconds):
+        return sharded.sync_results.pop(0) if sharded.sync_results else 0
+
+    monkeypatch.setattr(shard_services, "_set_map_entry", set_map_entry)
+    monkeypatch.setattr(shard_services, "_sync_env", sync_env)
+    monkeypatch.setattr(shard_services, "_wait_for_map_refresh", lambda: None)
+    monkeypatch.setattr(shard_services, "cleanup_env", sharded.cleaned.append)
+    return sharded
+
+
+def test_move_switches_the_map_after_a_frozen_final_pass(move):
+    move.sync_results = [5, 0, 2, 0]
+    result = shard_services.move_application(7, "s1")
+    assert result == {"source": "default", "target": "s1", "copied": 7}
+    assert move.states == [
+        ("default", "copying", "s1"),
+        ("default", "frozen", "s1"),
+        ("s1", "active", None)
+    ]
+    assert move.cleaned == [7]
+    assert move.primary.statements("RELEASE_LOCK")
+
+
+def test_move_is_abandoned_when_the_source_changes_while_frozen(move):
+    move.sync_results = [0, 0, 1]
+    with pytest.raises(RuntimeError, match="changed on 'default' while frozen"):
+        shard_services.move_application(7, "s1")
+    assert move.states[-1] == ("default", "active", None)
+    assert move.cleaned == []
+    assert move.primary.statements("RELEASE_LOCK")
+
+
+def test_move_refuses_unknown_shards_and_moves_in_progress(move):
+    with pytest.raises(ValueError):
+        shard_services.move_application(7, "s9")
+    move.shard_map = [{"env_id": 7, "shard": "default", "state": "copying", "target": "s2"}]
+    with pytest.raises(RuntimeError, match="already being moved"):
+        shard_services.move_application(7, "s1")
+
+
+def test_move_returns_none_while_another_move_holds_the_lock(move):
+    move.primary.on("GET_LOCK", [{"acquired": 0}])
+    assert shard_services.move_application(7, "s1") is None
+    assert move.states == []
+
+
+def test_cleanup_deletes_from_every_shard_but_the_owner(sharded):
+    sharded.shard_map = [{"env_id": 7, "shard": "s1", "state": "active", "target": None}]
+    shard_services.cleanup_env(7)
+    assert not sharded.s1.statements("DELETE")
+    for server in (sharded.primary, sharded.s2):
+        tables = {sql.split()[2] for sql in server.statements("DELETE FROM")}
+        assert tables == set(shard_services.ID_TABLES + shard_services.SCOPE_TABLES)
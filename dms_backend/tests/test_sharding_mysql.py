@@ -0,0 +1,124 @@
+"""
+Shard routing and 'flask shards move' against a real MySQL server, using the schemas
+dms_test (default shard), dms_test_s1 and dms_test_s2. Set TEST_DB_HOST (and TEST_DB_PORT,
+TEST_DB_USER, TEST_DB_PASSWORD) to run them; the schemas are dropped and recreated.
+"""
+import pytest
+import mysql.connector
+from app import database, sharding
+from app.schema import apply_migrations
+from app.services import shard_services
+from conftest import requires_mysql, TEST_DB_HOST, TEST_DB_PORT, TEST_SHARDS
+
+pytestmark = requires_mysql
+
+SCHEMAS = ["dms_test"] + [f"dms_test_{name}" for name in TEST_SHARDS]
+
+
+@pytest.fixture(scope="module")
+def mysql_shards():
+    config = database.get_db_config()
+    conn = mysql.connector.connect(host=TEST_DB_HOST, port=int(TEST_DB_PORT), user=config['user'], password=config['password'])
+    cursor = conn.cursor()
+    for schema in SCHEMAS:
+        cursor.execute(f"DROP DATABASE IF EXISTS {schema}")
+        cursor.execute(f"CREATE DATABASE {schema} CHARACTER SET utf8mb4")
+    cursor.close()
+    conn.close()
+    for shard in database.shard_names():
+        apply_migrations(shard=shard)
+    shard_services.init_shard_ids()
+
+
+def _query(shard, sql, params=()):
+    conn = database.get_db_connection(shard=shard)
+    cursor = database.get_db_cursor(conn)
+    try:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall() if cursor.with_rows else []
+        conn.commit()
+        return rows
+    finally:
+        database.close_db_connection(conn, cursor)
+
+
+def _insert_documents(env_id, count):
+    conn = sharding.get_env_connection(env_id)
+    cursor = database.get_db_cursor(conn)
+    try:
+        cursor.executemany("""
+            INSERT INTO ds_document (env_id, ref_id, module_id, type, filename, original_filename, filepath, filesize)
+            VALUES (%s, %s, 1, 'doc', %s, %s, %s, 10)
+        """, [(env_id, f"ref-{n}", f"file-{n}.txt", f"file-{n}.txt", f"uploads/{env_id}/file-{n}.txt") for n in range(count)])
+        conn.commit()
+    finally:
+        database.close_db_connection(conn, cursor)
+
+
+def _document_ids(shard, env_id):
+    return [row['id'] for row in _query(shard, "SELECT id FROM ds_document WHERE env_id = %s ORDER BY id", (env_id,))]
+
+
+@pytest.fixture
+def fresh_map(mysql_shards, monkeypatch):
+    monkeypatch.setattr(sharding, "SHARD_MAP_REFRESH_SECONDS", 0)
+    monkeypatch.setattr(shard_services, "_wait_for_map_refresh", lambda: None)
+    _query("default", "DELETE FROM ds_shard_map")
+    for shard in database.shard_names():
+        for table in shard_services.ID_TABLES + shard_services.SCOPE_TABLES:
+            _query(shard, f"DELETE FROM {table}")
+
+
+def test_shards_issue_interleaved_ids(fresh_map):
+    _query("default", "INSERT INTO ds_shard_map (env_id, shard) VALUES (21, 's1')")
+    _insert_documents(20, 3)
+    _insert_documents(21, 3)
+    assert {i % database.DB_SHARD_ID_STRIDE for i in _document_ids("default", 20)} == {1}
+    assert {i % database.DB_SHARD_ID_STRIDE for i in _document_ids("s1", 21)} == {2}
+
+
+def test_move_copies_the_application_and_switches_routing(fresh_map):
+    _insert_documents(30, 25)
+    _insert_documents(31, 2)
+    ids = _document_ids("default", 30)
+    stages = []
+
+    result = shard_services.move_application(30, "s1", batch_size=10, progress=lambda stage, rows: stages.append(stage))
+
+    assert result['source'] == "default" and result['target'] == "s1" and result['copied'] >= 25
+    assert stages[0] == "pass 1" and stages[-1] == "final pass"
+    assert _document_ids("s1", 30) == ids
+    assert _document_ids("default", 30) == []
+    assert len(_document_ids("default", 31)) == 2
+    assert sharding.shard_for_env(30) == "s1"
+    assert shard_services.list_shard_map() == [{'env_id': 30, 'shard': 's1', 'state': 'active', 'target': None}]
+
+
+def test_sync_recopies_only_ranges_that_differ(fresh_map):
+    _insert_documents(40, 30)
+    assert shard_services._sync_env(40, "default", "s2", 10, 0) == 30
+    assert shard_services._sync_env(40, "default", "s2", 10, 0) == 0
+    changed = _document_ids("default", 40)[15]
+    _query("default", "UPDATE ds_document SET filename = 'renamed.txt' WHERE id = %s", (changed,))
+    _query("s2", "INSERT INTO ds_document (env_id, ref_id, module_id, type, filename, original_filename, filepath) "
+                 "VALUES (40, 'stray', 1, 'doc', 'stray', 'stray', 'stray')")
+    # Only the changed range is copied again; the open-ended last range drops the stray row
+    assert shard_services._sync_env(40, "default", "s2", 10, 0) == 10
+    assert _document_ids("s2", 40) == _document_ids("default", 40)
+
+
+def test_aborted_move_leaves_the_source_in_service(fresh_map):
+    _insert_documents(50, 5)
+    _query("default", "INSERT INTO ds_shard_map (env_id, shard, state, target) VALUES (50, 'default', 'frozen', 's2')")
+    sharding.load_shard_map(force=True)
+    assert sharding.get_env_connection(50) is None
+
+    assert shard_services.abort_move(50)
+    sharding.load_shard_map(force=True)
+    conn = sharding.get_env_connection(50)
+    assert conn is not None
+    database.close_db_connection(conn)
+    shard_services._sync_env(50, "default", "s2", 100, 0)
+    assert shard_services.cleanup_env(50) == 5
+    assert _document_ids("s2", 50) == []
+    assert len(_document_ids("default", 50)) == 5
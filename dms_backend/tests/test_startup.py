@@ -0,0 +1,36 @@
+from app import startup
+
+
+def test_readiness_reuses_recent_database_checks(fake_mysql, monkeypatch):
+    monkeypatch.setattr(startup, "_database_checks", {})
+    monkeypatch.setattr(startup, "READINESS_DB_CACHE_SECONDS", 60)
+    for _ in range(3):
+        ready, checks = startup.readiness_checks()
+        assert checks["database"] == {"ok": True, "detail": None}
+    assert len(fake_mysql.primary.statements("SELECT 1")) == 1
+
+    monkeypatch.setattr(startup, "READINESS_DB_CACHE_SECONDS", 0)
+    startup.readiness_checks()
+    assert len(fake_mysql.primary.statements("SELECT 1")) == 2
+
+
+def test_readiness_checks_every_shard(fake_mysql, monkeypatch):
+    fake_mysql.configure(shards=["s1=shard1.invalid/dms_s1"])
+    monkeypatch.setattr(startup, "_database_checks", {})
+    fake_mysql.server("shard1.invalid", "dms_s1").down = True
+    ready, checks = startup.readiness_checks()
+    assert not ready
+    assert checks["database"]["ok"]
+    assert not checks["database.s1"]["ok"]
+
+
+def test_cli_commands_do_not_start_startup_tasks(monkeypatch):
+    from app import app
+    started = []
+    monkeypatch.setattr(startup, "start_background_startup", lambda: started.append(True))
+    app.test_cli_runner().invoke(args=["--help"])
+    assert started == []
+
+    monkeypatch.setattr(startup, "STARTUP_TASKS", "background")
+    startup.start_server_startup()
+    assert started == [True]
@@ -0,0 +1,58 @@
+import os
+import pytest
+from mysql.connector import Error
+from app.services import storage_services
+from app.services.preview_services import thumbnail_path
+
+
+@pytest.fixture
+def documents(fake_mysql, tmp_path):
+    day = tmp_path / "2024" / "05" / "17"
+    day.mkdir(parents=True)
+    rows = []
+    for document_id in (1, 2, 3):
+        path = day / f"file-{document_id}.pdf"
+        path.write_bytes(b"pdf")
+        rows.append({"id": document_id, "filepath": str(path).replace("\\", "/")})
+    fake_mysql.primary.on("FROM ds_document", lambda sql, params: [dict(row) for row in rows] if params[0] == 0 else [])
+    fake_mysql.rows = rows
+    return fake_mysql
+
+
+def test_reshard_moves_files_and_their_previews(documents):
+    with open(thumbnail_path(documents.rows[0]["filepath"]), "wb") as f:
+        f.write(b"jpeg")
+
+    stats = storage_services.reshard_local_documents(workers=2)
+
+    assert stats == {"moved": 3, "unchanged": 0, "missing": 0, "skipped": 0, "failed": 0}
+    for row in documents.rows:
+        target = storage_services.reshard_target(row["filepath"])
+        assert not os.path.exists(row["filepath"])
+        assert open(target, "rb").read() == b"pdf"
+    target = storage_services.reshard_target(documents.rows[0]["filepath"])
+    assert open(thumbnail_path(target), "rb").read() == b"jpeg"
+
+
+def test_rows_changed_meanwhile_get_their_files_back(documents):
+    changed = documents.rows[1]
+    documents.primary.on("UPDATE ds_document SET filepath",
+                         lambda sql, params: 0 if params[1] == changed["id"] else 1)
+
+    stats = storage_services.reshard_local_documents(workers=2)
+
+    assert stats == {"moved": 2, "unchanged": 0, "missing": 0, "skipped": 1, "failed": 0}
+    assert os.path.exists(changed["filepath"])
+    assert not os.path.exists(storage_services.reshard_target(changed["filepath"]))
+    assert os.path.exists(storage_services.reshard_target(documents.rows[0]["filepath"]))
+
+
+def test_failed_batch_moves_files_back(documents):
+    def update(sql, params):
+        raise Error("Deadlock found")
+
+    documents.primary.on("UPDATE ds_document SET filepath", update)
+    stats = storage_services.reshard_local_documents(workers=2)
+    assert stats["failed"] == 3 and stats["moved"] == 0
+    for row in documents.rows:
+        assert os.path.exists(row["filepath"])
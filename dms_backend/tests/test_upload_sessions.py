@@ -0,0 +1,59 @@
+import io
+import os
+import time
+import uuid
+import pytest
+from app.services import upload_session_services as sessions
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    monkeypatch.setattr(sessions, "UPLOAD_STAGING_FOLDER", str(tmp_path))
+    monkeypatch.setattr(sessions, "_held_locks", set())
+    state = {"id": uuid.uuid4().hex, "user_id": 7, "length": 10, "filename": "a.txt",
+             "metadata": {}, "expiresAt": time.time() + 60}
+    sessions._write_session_state(state)
+    open(sessions._session_paths(state["id"])[1], "wb").close()
+    return state
+
+
+def test_chunks_append_at_the_current_offset(session):
+    first = sessions.append_upload_chunk(session["id"], 0, io.BytesIO(b"hello"), 7)
+    assert first["responseData"]["offset"] == 5
+
+    stale = sessions.append_upload_chunk(session["id"], 0, io.BytesIO(b"again"), 7)
+    assert stale["responseCode"] == 409
+    assert stale["responseData"]["offset"] == 5
+
+    overflow = sessions.append_upload_chunk(session["id"], 5, io.BytesIO(b"world!"), 7)
+    assert overflow["responseCode"] == 400
+    assert overflow["responseData"]["offset"] == 10
+    assert open(sessions._session_paths(session["id"])[1], "rb").read() == b"helloworld"
+
+
+def test_locked_session_rejects_a_second_writer(session):
+    lock_path = sessions._session_paths(session["id"])[2]
+    assert sessions._acquire_lock(lock_path)
+    response = sessions.append_upload_chunk(session["id"], 0, io.BytesIO(b"hello"), 7)
+    assert response["responseCode"] == 423
+    sessions._release_lock(lock_path)
+    assert not os.path.exists(lock_path)
+    assert sessions.append_upload_chunk(session["id"], 0, io.BytesIO(b"hello"), 7)["responseCode"] == 200
+
+
+def test_heartbeat_keeps_a_slow_writer_from_being_taken_over(session):
+    lock_path = sessions._session_paths(session["id"])[2]
+    assert sessions._acquire_lock(lock_path)
+    old = time.time() - sessions.UPLOAD_LOCK_STALE_SECONDS - 1
+    os.utime(lock_path, (old, old))
+    sessions._refresh_held_locks()
+    assert not sessions._acquire_lock(lock_path)
+
+
+def test_lock_of_a_dead_writer_is_taken_over(session):
+    lock_path = sessions._session_paths(session["id"])[2]
+    open(lock_path, "w").close()  # Left behind by another process; nothing refreshes it
+    old = time.time() - sessions.UPLOAD_LOCK_STALE_SECONDS - 1
+    os.utime(lock_path, (old, old))
+    sessions._refresh_held_locks()
+    assert sessions._acquire_lock(lock_path)
@@ -0,0 +1,10 @@
+from dotenv import load_dotenv
+
+# WSGI entry point for production servers, e.g. `gunicorn wsgi:app`
+load_dotenv()
+
+from app import app
+from app.startup import start_server_startup
+
+# Starts the pool, warmup and background workers in each worker process that loads this module
+start_server_startup()
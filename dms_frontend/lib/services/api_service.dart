@@ -9,6 +9,10 @@ class ApiService {
   
   ApiService._();
 
+  // Last response per admin request, revalidated with If-None-Match on the next poll
+  static const int _maxValidatedResponses = 100;
+  final Map<String, http.Response> _validatedResponses = {};
+
   // Environment configuration
   String get baseUrl => dotenv.env['API_BASE_URL'] ?? 'http://localhost:5000';
   int get timeout => int.tryParse(dotenv.env['API_TIMEOUT'] ?? '30000') ?? 30000;
@@ -116,6 +120,12 @@ class ApiService {
   }) async {
     final url = endpoint.startsWith('http') ? endpoint : '$baseUrl$endpoint';
     final headers = await getHeaders(includeAuth: includeAuth);
+    final cacheKey = '$url ${jsonEncode(body)}';
+    final cached = _validatedResponses[cacheKey];
+    final etag = cached?.headers['etag'];
+    if (etag != null) {
+      headers['If-None-Match'] = etag;
+    }
     
     if (debugMode) {
       print('POST Request to: $url');
@@ -123,11 +133,24 @@ class ApiService {
       print('Body: ${jsonEncode(body)}');
     }
 
-    return await http.post(
+    final response = await http.post(
       Uri.parse(url),
       headers: headers,
       body: body != null ? jsonEncode(body) : null,
     ).timeout(Duration(milliseconds: timeout));
+
+    // Nothing changed on the server: reuse the body we already have
+    if (response.statusCode == 304 && cached != null) {
+      return cached;
+    }
+    if (response.statusCode == 200 && response.headers['etag'] != null) {
+      _validatedResponses.remove(cacheKey);
+      if (_validatedResponses.length >= _maxValidatedResponses) {
+        _validatedResponses.remove(_validatedResponses.keys.first);
+      }
+      _validatedResponses[cacheKey] = response;
+    }
+    return response;
   }
 
   // Generic PUT request